@@ -29,8 +29,10 @@ from ezdxf.addons import Importer
 from ezdxf.lldxf.const import DXFTableEntryError
 import networkx as nx
 import math
+import numpy as np
 from pillarplus.blocks import place_block_at_location
 import pillarplus.math
+import pillarplus.batch_math
 from pillarplus.data import create_size_mapping_dict
 import pillarplus.boq.drainage_boq as boq
 from texting import add_text_to_chamber,add_text_to_connection,add_text_to_location
@@ -161,22 +163,22 @@ def get_room_wall_id(location, walls_dict, units_conversion_factor):
                     room_id: Associated Room number
                     wall_id: Associated Wall number            
     """
-    wall_dist_dict = {}
-    for wall_id, wall in walls_dict.items():
-        corners = wall['corners']
-        # Find perpendicular point and lies on it
-        per_point = pillarplus.math.find_perpendicular_point(location, corners[0], corners[1])
-
-        if pillarplus.math.is_between(per_point, corners[0], corners[1]):
-            dist = pillarplus.math.find_distance(location, per_point)
-            wall_dist_dict[dist] = wall
+    walls = list(walls_dict.values())
+    if len(walls) == 0:
+        return None,None
+    wall_segments = pillarplus.batch_math.as_segments([wall['corners'][:2] for wall in walls])
+    # Find perpendicular points of all the walls at once and check if they lie on them
+    per_points = pillarplus.batch_math.find_perpendicular_points(location, wall_segments)
+    on_wall = pillarplus.batch_math.are_between(per_points, wall_segments)
 
-    if len(wall_dist_dict.keys()) == 0:
+    if not on_wall.any():
         return None,None
-    min_dist = min(wall_dist_dict.keys())
+    dists = pillarplus.batch_math.find_distances(location, per_points)
+    min_dist = dists[on_wall].min()
     if (min_dist > 1800*units_conversion_factor):
         return None,None
-    wall = wall_dist_dict[min_dist]
+    # Last wall at the minimum distance wins (same as overwriting a dict keyed on distance)
+    wall = walls[np.flatnonzero(on_wall & (dists == min_dist))[-1]]
 
     wall_id = wall['number']
     room_id = wall['room_number']
@@ -1,6 +1,9 @@
-from typing import List, Dict
+from typing import List, Dict, Tuple
 import math
-from pillarplus.math import is_line_decreasing_on_x_2d, is_polyline_closed, are_lines_overlapping, get_length_of_line_segment, get_distance_between_two_parallel_lines, find_perpendicular_point, is_between, get_mid_points_between_points, get_line_points_2d, find_slope
+import numpy as np
+from pillarplus.math import is_line_decreasing_on_x_2d, is_polyline_closed, get_length_of_line_segment, get_distance_between_two_parallel_lines, find_perpendicular_point, is_between, get_mid_points_between_points, get_line_points_2d, find_slope
+from pillarplus.parallel_lines import ANGLE_BIN_WIDTH, PAIR_CHUNK_SIZE, DirectionIndex, are_parallel_lines_overlapping, get_candidate_line_pairs, map_in_processes, split_candidate_pairs
+from pillarplus.segment_store import CLOSING_FLAG, NO_POLYLINE, REVERSED_FLAG, SegmentStore
 
 
 class Beam:
@@ -33,22 +36,21 @@ class Beam:
 #CONSTANTS:
 MAXIMUM_DISTANCE_BETWEEN_BEAMS = 500 #It is needed to be decided
 
-line_meta = {}
-def get_lines(msp, dwg, layer_name) -> List[tuple]:
+def get_lines(msp, dwg, layer_name) -> SegmentStore:
     """This function returns all the lines contained in the layer "PP-BEAM"
     of the dxf file provided.
 
+    NOTE: Every segment keeps the id of its own polyline (or NO_POLYLINE for a LINE), also when
+    another segment has the same coordinates.
+
     Returns:
-        List[tuple]: Returns an 'unsorted' list of lines.
+        SegmentStore: Returns the lines sorted on their coordinates.
     """
-    lines = []
+    segments = SegmentStore()
     
-    def get_lines_from_polylines(msp) -> List[tuple]:
-        """This function returns all the lines contained in polylines of the layer "PP-BEAM"
-        of the dxf file provided.
-
-        Returns:
-            List[tuple]: Returns an 'unsorted' list of lines.
+    def get_lines_from_polylines(msp):
+        """This function adds all the lines contained in polylines of the layer "PP-BEAM"
+        of the dxf file provided to the segments.
         """
         #fetching all the polylines from the layer PP-BEAM
         polylines = msp.query(f'LWPOLYLINE[layer=="{layer_name}"]')
@@ -59,8 +61,7 @@ def get_lines(msp, dwg, layer_name) -> List[tuple]:
 
         #Convert polylines into lines:
         print('Converting polylines into lines.')
-        lines = []
-        for polyline in polylines:
+        for polyline_id, polyline in enumerate(polylines):
             line = []
             
             for point in polyline:
@@ -69,14 +70,15 @@ def get_lines(msp, dwg, layer_name) -> List[tuple]:
                 
                 #if the line has two points:
                 if len(line) == 2:
+                    flags = 0
                     #Check if the line is decreasing or not:
                     if is_line_decreasing_on_x_2d(line):
                         #Swap the points if the line is decreasing:
                         line.reverse()
+                        flags = REVERSED_FLAG
                     
-                    #Append the line into lines
-                    lines.append(line)
-                    line_meta[str(line)] = {'polyline' : polyline}
+                    #Append the line into segments
+                    segments.add(line[0], line[1], polyline_id, layer_name, flags)
                     
                     #clear the line
                     line = [(x, y)]
@@ -88,21 +90,12 @@ def get_lines(msp, dwg, layer_name) -> List[tuple]:
                 x1, y1 = p1[0], p1[1]
                 p2 = polyline[0]
                 x2, y2 = p2[0], p2[1]
-                line = [(x1, y1), (x2, y2)]
-                line_meta[str(line)] = {'polyline' : polyline}
-                lines.append(line)
-                
-        
-        return lines
+                segments.add((x1, y1), (x2, y2), polyline_id, layer_name, CLOSING_FLAG)
         
     def get_lines_from_lines(msp):
-        """This function returns all the lines contained in lines of the layer "PP-BEAM"
-        of the dxf file provided.
-
-        Returns:
-            List[tuple]: Returns an 'unsorted' list of lines.
+        """This function adds all the lines contained in lines of the layer "PP-BEAM"
+        of the dxf file provided to the segments.
         """
-        lines = []
         #fetching all the lines from the layer PP-BEAM
         Lines = msp.query(f'LINE[layer=="{layer_name}"]')
         
@@ -115,95 +108,47 @@ def get_lines(msp, dwg, layer_name) -> List[tuple]:
             
             line = [(x1, y1), (x2, y2)]
             
+            flags = 0
             if is_line_decreasing_on_x_2d(line):
                 #Swap the points if the line is decreasing:
                 line.reverse()
+                flags = REVERSED_FLAG
                 
-            line_meta[str(line)] = {'polyline' : False}
-            
-            lines.append(line)
-            
-            
-            # for point in Line:
-            #     x, y = point[0], point[1]
-            #     line.append((x, y))
-                
-            #     #if the line has two points:
-            #     if len(line) == 2:
-            #         #Check if the line is decreasing or not:
-            #         if is_line_decreasing_on_x_2d(line):
-            #             #Swap the points if the line is decreasing:
-            #             line.reverse()
-                    
-            #         #Append the line into lines
-            #         lines.append(line)
-                    
-            #         line_meta[str(line)] = {'polyline' : False}
-                    
-            #         #clear the line
-            #         line = [(x, y)]
-        
-        return lines
+            segments.add(line[0], line[1], NO_POLYLINE, layer_name, flags)
         
         
-    polyline_lines = get_lines_from_polylines(msp)
-    line_lines = get_lines_from_lines(msp)
-    lines.extend(polyline_lines)
-    lines.extend(line_lines)
+    get_lines_from_polylines(msp)
+    get_lines_from_lines(msp)
     
     # Sorting the lines before returning
-    lines.sort()
+    segments.sort()
     
-    return lines
+    return segments
 
-def get_slope_bucket(lines: List[List[tuple]]) -> Dict[int, List[List[tuple]]]:    
-    """Returns a slope bucket with key slope and values to a be all the lines lying in that slope.
+def get_direction_index(segments: SegmentStore, bin_width: float = ANGLE_BIN_WIDTH) -> DirectionIndex:
+    """Returns a direction index which groups the lines on their angle in [0, 180) degrees.
     
     Args:
-        lines: (List[List[tuple]]): List of lines fetched from the layer "PP-BEAM".
+        segments (SegmentStore): Lines fetched from the layer "PP-BEAM".
+        bin_width (float, optional): Width of a direction bin in degrees. Defaults to ANGLE_BIN_WIDTH.
 
     Returns:
-        Dict[int, List[List[tuple]]]: Returns a slope_bucket (dict) with key slope and values to a be all the lines lying in that slope.
+        DirectionIndex: Returns the index with the ids of the lines of every direction bin.
     """
-    def get_slope(x1, y1, x2, y2): 
-        try:
-            slope = (float)(y2-y1)/(float)(round(x2-x1))
-        except ZeroDivisionError:
-            print(f'Zerodivisionerror:: Variables are: {(x1, y1), (x2, y2)}')
-            return math.inf
-        return slope
-    
-    slopes = dict()
-    #Finding slopes of every line:
-    for line in lines:
-        p1, p2 = line[0], line[1]
-        slope = get_slope(p1[0], p1[1], p2[0], p2[1])# slope = find_slope(p1, p2)
-        
-        #Rounding slope for 3 decimal:
-        if slope != math.inf:
-            slope = round(slope, 1) #slope = round(slope, ndigits = 5)
-        
-        # Check if the slope exists in the slope_dict
-        if slope in slopes.keys():
-            slopes[slope].append(line)
-        else:
-            slopes[slope] = [line]
-    
-    return slopes
+    return DirectionIndex(segments.coordinates, bin_width)
 
-def does_lines_belong_to_same_polyline(line1, line2) -> bool:
+def does_lines_belong_to_same_polyline(segments: SegmentStore, line1_id: int, line2_id: int) -> bool:
     """Function to find that the lines belong to the same polyline or not.
 
     Args:
-        line1 (List[List[tuple]]): List of lines fetched from the layer "PP-BEAM".
-        line2 (List[List[tuple]]): List of lines fetched from the layer "PP-BEAM".
+        segments (SegmentStore): Lines fetched from the layer "PP-BEAM".
+        line1_id (int): Id of the first line in the segments.
+        line2_id (int): Id of the second line in the segments.
 
     Returns:
         bool: Returns True is they belong to the same polyline otherwise False.
     """
-    if line_meta[str(line1)]['polyline'] == False or line_meta[str(line2)]['polyline'] == False:
-        return False
-    return line_meta[str(line1)]['polyline'] == line_meta[str(line2)]['polyline']
+    return segments.are_from_same_polyline(line1_id, line2_id)
 
 
 def is_almost_parallel(line1: List[tuple], line2: List[tuple],permissible_angle: int = 1) -> bool:
@@ -230,102 +175,127 @@ def is_almost_parallel(line1: List[tuple], line2: List[tuple],permissible_angle:
         return False
 
 
-parallel_line_pair_meta = {}
-def get_parallel_line_pairs(slope_bucket : Dict[int, List[List[tuple]]]) -> List[List[tuple]]:
+def check_parallel_line_pairs(segments: SegmentStore, first_ids: np.ndarray, second_ids: np.ndarray,
+                              slope: float, maximum_distance: float) -> List[Tuple[int, int, float]]:
+    """This function checks which candidate pairs of lines are valid parallel pairs.
+
+    It only depends on its arguments, so it can run in a worker process.
+
+    Args:
+        segments (SegmentStore): Lines of the candidate pairs.
+        first_ids (np.ndarray): Ids of the first lines of the candidate pairs.
+        second_ids (np.ndarray): Ids of the second lines of the candidate pairs.
+        slope (float): Slope of the direction bin of the lines (only printed).
+        maximum_distance (float): Maximum distance between the lines of a pair.
+
+    Returns:
+        List[Tuple[int, int, float]]: Returns a list of pairs (line1_id, line2_id, width).
+    """
+    parallel_line_pairs = []
+    for line1_id, line2_id in zip(first_ids.tolist(), second_ids.tolist()):
+        line1, line2 = segments.get_line(line1_id), segments.get_line(line2_id)
+        distance = get_distance_between_two_parallel_lines(line1, line2)
+        print(f'Dist: {distance} for {line1, line2}')
+        
+        #edge cases:
+        # Lines should not fall into each other
+        if round(distance) == 0: 
+            print('REJECTED: round(distance) == 0')
+            continue
+        
+        # Lines should be overlapping (on their own slope buckets, not on the slope of the bin)
+        if not are_parallel_lines_overlapping(line1, line2):
+            print('REJECTED: not are_lines_overlapping(line1, line2, slope)')
+            continue                
+        
+        # Lines should be inside a threshold
+        if distance > maximum_distance: 
+            print('REJECTED: distance > MAXIMUM_DISTANCE_BETWEEN_BEAMS')
+            continue                
+        
+        if does_lines_belong_to_same_polyline(segments, line1_id, line2_id):
+            print('REJECTED: does_lines_belong_to_same_polyline(line1, line2)')
+            continue                                
+
+        if not is_almost_parallel(line1, line2):
+            print('REJECTED: is_almost_parallel(line1, line2)')
+            continue                                
+        
+        print(f'Forming a pair b/w {line1, line2}, slope: {slope}\n')
+        #Make pair of these lines along with their width
+        parallel_line_pairs.append((line1_id, line2_id, distance))
+    
+    return parallel_line_pairs
+
+
+def get_parallel_line_pairs(direction_index: DirectionIndex, segments: SegmentStore,
+                            workers: int = 1, chunk_size: int = PAIR_CHUNK_SIZE) -> List[Tuple[int, int, float]]:
     """This function returns the pairs of parallel lines that are chosen
     
+    The lines of every direction bin are paired with the lines of the same bin and of the
+    next bin, so almost parallel lines on both sides of a bin boundary are paired as well.
+    Only the candidate pairs found by get_candidate_line_pairs (a sweep over the offsets
+    of the lines) are checked.
+    
     The following factors makes a valid parallel pair:
         - Lines should be having a distance less then or equal to threshold value. (MAXIMUM_DISTANCE_BETWEEN_BEAMS)
         
         - Lines should have a distance in between greater than zero.
         
-        - Lines should be overlapping. (are_lines_overlapping).
+        - Lines should be overlapping. (are_parallel_lines_overlapping).
+
+    The checks of the candidates can run in a process pool (workers > 1). Large bins are
+    split into chunks of chunk_size candidate pairs and the pairs are merged in the same
+    order as when they are checked in this process.
 
     Args:
-        slope_bucket (Dict[int, List[List[tuple]]]): Slope bucket which pairs the lines according to the slope.
+        direction_index (DirectionIndex): Direction index which groups the line ids according to the angle.
+        segments (SegmentStore): Lines of the direction index.
+        workers (int, optional): Number of worker processes. Defaults to 1 (no process pool).
+        chunk_size (int, optional): Maximum number of candidate pairs checked by one task. Defaults to PAIR_CHUNK_SIZE.
 
     Returns:
-        List[List[tuple]]: Returns a list of lines.
+        List[Tuple[int, int, float]]: Returns a list of pairs (line1_id, line2_id, width).
     """
-    parallel_line_pairs = []
-    for slope, lines in slope_bucket.items():
-        print(f'Looping for slope : {slope}:\n')
+    tasks, chunk_ids = [], []
+    for bin_id, line_ids, is_own in direction_index.get_bin_groups():
+        slope = direction_index.get_bin_slope(bin_id)
+        print(f'Looping for angle : {direction_index.get_bin_angle(bin_id)}:\n')
         
-        # fetch points in pair of two and form their pairs:
-        index, i = 0, 0
-        while (i < len(lines)):
-            index = i #  index = 2 * i
-            line1 = lines[index]
-            print(f'Now making pairs for line1: {line1}:-')
-            
-            def _get_line2(index, counter):
-                return lines[index + counter] if (index + counter < len(lines)) else None
-            
-            counter = 1
-            line2 = _get_line2(index, counter)
-            
-            # Looping to form the maximum possible pairs with line1.
-            while (line2):
-                distance = get_distance_between_two_parallel_lines(line1, line2)
-                print(f'Dist: {distance} for {line1, line2}')
-                
-                #edge cases:
-                # Lines should not fall into each other
-                if round(distance) == 0: 
-                    print('REJECTED: round(distance) == 0')
-                    counter += 1
-                    line2 = _get_line2(index, counter)
-                    continue
-                
-                # Lines should be overlapping
-                if not are_lines_overlapping(line1, line2, slope):
-                    print('REJECTED: not are_lines_overlapping(line1, line2, slope)')
-                    counter += 1
-                    line2 = _get_line2(index, counter)
-                    continue                
-                
-                # Lines should be inside a threshold
-                if distance > MAXIMUM_DISTANCE_BETWEEN_BEAMS: 
-                    print('REJECTED: distance > MAXIMUM_DISTANCE_BETWEEN_BEAMS')
-                    # break            
-                    counter += 1
-                    line2 = _get_line2(index, counter)
-                    continue                
-                
-                if does_lines_belong_to_same_polyline(line1, line2):
-                    print('REJECTED: does_lines_belong_to_same_polyline(line1, line2)')
-                    counter += 1
-                    line2 = _get_line2(index, counter)
-                    continue                                
-
-                if not is_almost_parallel(line1, line2):
-                    print('REJECTED: is_almost_parallel(line1, line2)')
-                    counter += 1
-                    line2 = _get_line2(index, counter)
-                    continue                                
-                
-                print(f'Forming a pair b/w {line1, line2}, slope: {slope}\n')
-                #Make pair of these lines
-                parallel_line_pairs.append((line1, line2))
-                
-                # Storing the width
-                parallel_line_pair_meta[str((line1, line2))] = distance
-                
-                counter += 1
-                line2 = _get_line2(index, counter)
-                
-            i +=1
-            
+        # Only the pairs within the distance window which are overlapping are checked:
+        first_indices, second_indices = get_candidate_line_pairs(
+            segments.coordinates[line_ids], slope, MAXIMUM_DISTANCE_BETWEEN_BEAMS)
+        # The pairs within the next bin are formed by the group of the next bin.
+        is_pair_of_bin = is_own[first_indices] | is_own[second_indices]
+        first_ids, second_ids = line_ids[first_indices[is_pair_of_bin]], line_ids[second_indices[is_pair_of_bin]]
+        
+        for first_chunk, second_chunk in split_candidate_pairs(first_ids, second_ids, chunk_size):
+            if workers > 1:
+                # Only the lines of the chunk are sent to the worker process.
+                ids = np.unique(np.concatenate((first_chunk, second_chunk)))
+                tasks.append((segments.subset(ids), np.searchsorted(ids, first_chunk),
+                              np.searchsorted(ids, second_chunk), slope, MAXIMUM_DISTANCE_BETWEEN_BEAMS))
+                chunk_ids.append(ids)
+            else:
+                tasks.append((segments, first_chunk, second_chunk, slope, MAXIMUM_DISTANCE_BETWEEN_BEAMS))
+                chunk_ids.append(None)
+    
+    parallel_line_pairs = []
+    for pairs, ids in zip(map_in_processes(check_parallel_line_pairs, tasks, workers), chunk_ids):
+        if ids is not None:
+            pairs = [(int(ids[line1_id]), int(ids[line2_id]), width) for line1_id, line2_id, width in pairs]
+        parallel_line_pairs.extend(pairs)
     
     return parallel_line_pairs
     
 
 
-def get_beams_from_pairs(parallel_line_pairs : List[List[tuple]]) -> List[Beam]:
+def get_beams_from_pairs(parallel_line_pairs : List[Tuple[int, int, float]], segments: SegmentStore) -> List[Beam]:
     """This function returns the Beam objects that are needed.
 
     Args:
-        parallel_line_pairs (List[List[tuple]]): These are the valid pairs of parallel lines between which a beam can be constructed.
+        parallel_line_pairs (List[Tuple[int, int, float]]): These are the valid pairs (line1_id, line2_id, width) of parallel lines between which a beam can be constructed.
+        segments (SegmentStore): Lines referred to by the pairs.
 
     Returns:
         List[Beam]: A list of Beam objects for the 
@@ -388,8 +358,8 @@ def get_beams_from_pairs(parallel_line_pairs : List[List[tuple]]) -> List[Beam]:
     
     beams = []
     number = 1
-    for pair in parallel_line_pairs:
-        line1, line2 = pair
+    for line1_id, line2_id, width in parallel_line_pairs:
+        line1, line2 = segments.get_line(line1_id), segments.get_line(line2_id)
         
         if line2:
             x1, y1, x2, y2 = get_line_points_2d(line1)
@@ -404,7 +374,6 @@ def get_beams_from_pairs(parallel_line_pairs : List[List[tuple]]) -> List[Beam]:
                 line_segment: {line_segment}\n\n
                 """)
             
-            width = parallel_line_pair_meta[str(pair)]
             beam = Beam(number, line_segment[0], line_segment[1], line_segment[0], line_segment[1], width)
             
             beams.append(beam)
@@ -423,19 +392,23 @@ def draw_beams(beams, msp, dwg, output_file):
         dwg.saveas(output_file)
         print(f'File {output_file} save success.')
 
-def get_beams(msp, dwg, layer_name, conversion_factor, output_file = None) -> List[Beam]:
+def get_beams(msp, dwg, layer_name, conversion_factor, output_file = None, angle_bin_width: float = ANGLE_BIN_WIDTH,
+              workers: int = 1) -> List[Beam]:
     """This function returns beams from polylines present in the layer "PP-BEAM"
     in the dxf file.
 
+    Lines are paired within direction bins of angle_bin_width degrees (and the adjacent bins),
+    in a pool of worker processes when workers > 1.
+
     Returns:
         List[Beam]: Returns a list of beam line segments.
     """
     global MAXIMUM_DISTANCE_BETWEEN_BEAMS
     MAXIMUM_DISTANCE_BETWEEN_BEAMS = MAXIMUM_DISTANCE_BETWEEN_BEAMS * conversion_factor
     lines = get_lines(msp, dwg, layer_name)
-    slope_bucket = get_slope_bucket(lines)
-    print(f'Found the folloing slopes: {slope_bucket.keys()}')
-    parallel_line_pairs = get_parallel_line_pairs(slope_bucket)
-    beams = get_beams_from_pairs(parallel_line_pairs)
+    direction_index = get_direction_index(lines, angle_bin_width)
+    print(f'Found the folloing angles: {[direction_index.get_bin_angle(bin_id) for bin_id in direction_index.bins]}')
+    parallel_line_pairs = get_parallel_line_pairs(direction_index, lines, workers)
+    beams = get_beams_from_pairs(parallel_line_pairs, lines)
     draw_beams(beams, msp, dwg, output_file)
     return beams
\ No newline at end of file
@@ -0,0 +1,304 @@
+"""Candidate search for pairs of parallel lines.
+
+Lines are grouped on their direction by a DirectionIndex: the angle of every line in
+[0, 180) degrees is quantized into bins of a configurable width. Almost parallel lines may
+fall on both sides of a bin boundary, so a bin is always looked up together with its
+neighbouring bins. Every bin holds only lines of about the same direction, independent of
+how steep they are (unlike keying on a rounded slope, which puts steep lines into
+thousands of tiny buckets).
+
+Within a group of bins, get_candidate_line_pairs returns only the pairs which can pass
+the exact checks of get_parallel_line_pairs, so those run on O(k) pairs instead of O(n^2):
+
+    1. The start points of the lines are projected on the normal of the bucket direction
+       and sorted on that offset.
+    2. Only the lines within the distance window of a line (a sweep over the sorted
+       offsets) are candidates.
+    3. The candidates should overlap in the same way are_lines_overlapping checks them
+       (x and y ranges, or x or y ranges for two horizontal or two vertical lines).
+
+The exact overlap check of a pair does not depend on the bin: are_parallel_lines_overlapping
+keeps the rounded slope the lines used to be bucketed on, so only the lines which were in the
+horizontal or vertical buckets before (a slope or a run which rounds to 0) are checked on the
+x or the y range alone. A whole bin near an axis is not, as collinear but disjoint lines a
+few degrees off the axis would be paired then.
+
+The bin groups are independent of each other, so the exact checks of the candidates can be
+split into chunks (split_candidate_pairs) and run in a process pool (map_in_processes).
+
+The lines of a bucket are only almost parallel to the bucket direction, so the window is
+widened by the largest possible error of the projection: the angle between a line and the
+bucket direction times the size of the bucket. This keeps the candidates a superset of the
+pairs accepted by the exact checks.
+"""
+import math
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from pillarplus.math import are_lines_overlapping
+
+# Relative tolerance added to the distance window for floating point errors.
+WINDOW_TOLERANCE: float = 1e-6
+
+# Maximum number of candidate pairs checked by one task of a process pool.
+PAIR_CHUNK_SIZE: int = 20000
+
+# Default width of a direction bin in degrees (same as the permissible angle of is_almost_parallel).
+ANGLE_BIN_WIDTH: float = 1.0
+
+# Slope on which are_lines_overlapping checks both the x and the y ranges of the lines of
+# different slope buckets (any slope other than 0 and inf).
+SKEW_OVERLAP_SLOPE: float = 1.0
+
+
+def get_line_angles(coordinates: np.ndarray) -> np.ndarray:
+    """This function returns the direction of every line in degrees in the range [0, 180)."""
+    angles = np.degrees(np.arctan2(coordinates[:, 3] - coordinates[:, 1],
+                                   coordinates[:, 2] - coordinates[:, 0]))
+    angles = np.mod(angles, 180.0)
+    # np.mod can round tiny negative angles up to 180 itself.
+    return np.where(angles >= 180.0, 0.0, angles)
+
+
+class DirectionIndex:
+    """This class groups lines into bins of their (quantized) direction.
+
+    Bin b holds the lines with an angle within half a bin width of b * bin_width, so the
+    horizontal lines are in bin 0 and the vertical ones in the bin of 90 degrees (when the
+    bin width divides 90). The bins wrap around: lines at 0.2 and 179.8 degrees share bin 0.
+
+    Attributes:
+        bin_width (float): Width of a bin in degrees. It is adjusted so that it divides 180.
+        number_of_bins (int): Number of bins in [0, 180).
+        bin_ids (np.ndarray): Bin of every line.
+        bins (Dict[int, np.ndarray]): Ids of the lines (sorted) of every non-empty bin.
+    """
+
+    def __init__(self, coordinates: np.ndarray, bin_width: float = ANGLE_BIN_WIDTH):
+        if bin_width <= 0:
+            raise ValueError(f'bin_width should be positive but got: {bin_width}.')
+        self.number_of_bins = max(int(round(180.0 / bin_width)), 1)
+        self.bin_width = 180.0 / self.number_of_bins
+        self.bin_ids = self.get_bins(get_line_angles(coordinates))
+
+        order = np.argsort(self.bin_ids, kind='stable')
+        bin_ids, starts = np.unique(self.bin_ids[order], return_index=True)
+        self.bins: Dict[int, np.ndarray] = {
+            int(bin_id): ids for bin_id, ids in zip(bin_ids, np.split(order, starts[1:]))}
+
+    def __len__(self) -> int:
+        return len(self.bin_ids)
+
+    def get_bins(self, angles) -> np.ndarray:
+        """This function returns the bins of the angles (in degrees)."""
+        return np.round(np.asarray(angles) / self.bin_width).astype(np.int64) % self.number_of_bins
+
+    def get_bin_angle(self, bin_id: int) -> float:
+        """This function returns the angle (in degrees) at the centre of the bin."""
+        return bin_id * self.bin_width
+
+    def get_bin_slope(self, bin_id: int) -> float:
+        """This function returns the slope of the centre of the bin (inf for the bin of 90 degrees)."""
+        angle = self.get_bin_angle(bin_id)
+        if angle == 90.0:
+            return math.inf
+        return math.tan(math.radians(angle))
+
+    def get_neighbour_bins(self, bin_id: int) -> List[int]:
+        """This function returns the bin and its adjacent bins (without duplicates)."""
+        neighbour_bins = [(bin_id + offset) % self.number_of_bins for offset in (-1, 0, 1)]
+        return sorted(set(neighbour_bins))
+
+    def get_candidate_ids(self, angle: float) -> np.ndarray:
+        """This function returns the ids of the lines in the bin of the angle and its adjacent bins."""
+        bin_id = int(self.get_bins(angle))
+        ids = [self.bins[neighbour] for neighbour in self.get_neighbour_bins(bin_id) if neighbour in self.bins]
+        return np.sort(np.concatenate(ids)) if ids else np.empty(0, dtype=np.int64)
+
+    def get_bin_groups(self) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+        """This generator yields every non-empty bin together with its next bin.
+
+        Pairing the lines of every group covers the pairs within a bin and the pairs of
+        adjacent bins exactly once, as long as only the pairs with at least one line of
+        the bin itself are taken from a group.
+
+        Yields:
+            Tuple[int, np.ndarray, np.ndarray]: The bin, the (sorted) ids of the lines of the
+                bin and its next bin and a mask of the ids which belong to the bin itself.
+        """
+        for bin_id in sorted(self.bins):
+            ids = self.bins[bin_id]
+            next_bin_id = (bin_id + 1) % self.number_of_bins
+            # With one or two bins the next bin is reached from both sides (or is the bin itself).
+            has_next_bin = next_bin_id in self.bins and (self.number_of_bins > 2 or next_bin_id > bin_id)
+            if has_next_bin:
+                ids = np.concatenate((ids, self.bins[next_bin_id]))
+            order = np.argsort(ids, kind='stable')
+            is_own = np.arange(len(ids)) < len(self.bins[bin_id])
+            yield bin_id, ids[order], is_own[order]
+
+
+def get_bucket_direction(slope: float) -> np.ndarray:
+    """This function returns the unit direction (dx, dy) of a slope bucket."""
+    if slope == math.inf or slope == -math.inf:
+        return np.array([0.0, 1.0])
+    direction = np.array([1.0, slope])
+    return direction / np.hypot(1.0, slope)
+
+
+def get_angles_from_direction(coordinates: np.ndarray, direction: np.ndarray) -> np.ndarray:
+    """This function returns the angle (in radians, in [0, pi/2]) between every line and the direction."""
+    dx = coordinates[:, 2] - coordinates[:, 0]
+    dy = coordinates[:, 3] - coordinates[:, 1]
+    cross = np.abs(direction[0] * dy - direction[1] * dx)
+    dot = np.abs(direction[0] * dx + direction[1] * dy)
+    return np.arctan2(cross, dot)
+
+
+def get_overlap_slope(line) -> float:
+    """This function returns the slope which are_lines_overlapping checks a single line on.
+
+    It is the key of the slope buckets the lines used to be grouped on: the rise over the
+    rounded run, rounded to 1 decimal, and inf when the run rounds to 0.
+    """
+    (x1, y1), (x2, y2) = line[0][:2], line[1][:2]
+    run = round(x2 - x1)
+    if run == 0:
+        return math.inf
+    return round((y2 - y1) / run, 1)
+
+
+def get_projection_overlap(line1, line2) -> float:
+    """This function returns the length of the overlap of the lines projected on their mean direction."""
+    (x11, y11), (x12, y12) = line1[0][:2], line1[1][:2]
+    (x21, y21), (x22, y22) = line2[0][:2], line2[1][:2]
+    dx1, dy1, dx2, dy2 = x12 - x11, y12 - y11, x22 - x21, y22 - y21
+    if dx1 * dx2 + dy1 * dy2 < 0:
+        dx2, dy2 = -dx2, -dy2
+    length1, length2 = math.hypot(dx1, dy1), math.hypot(dx2, dy2)
+    if length1 == 0 or length2 == 0:
+        return 0.0
+    dx, dy = dx1 / length1 + dx2 / length2, dy1 / length1 + dy2 / length2
+    norm = math.hypot(dx, dy)
+    dx, dy = dx / norm, dy / norm
+    offsets1 = sorted((x11 * dx + y11 * dy, x12 * dx + y12 * dy))
+    offsets2 = sorted((x21 * dx + y21 * dy, x22 * dx + y22 * dy))
+    return min(offsets1[1], offsets2[1]) - max(offsets1[0], offsets2[0])
+
+
+def are_parallel_lines_overlapping(line1, line2) -> bool:
+    """This function checks whether two almost parallel lines of a bin group are overlapping.
+
+    Lines of the same slope bucket (get_overlap_slope) are checked by are_lines_overlapping on
+    their common slope, exactly as before the direction bins. Lines of different buckets were
+    never compared before: they should also overlap along their direction by more than a
+    rounding error, so that collinear lines which only touch at an end are not paired.
+    """
+    slope1, slope2 = get_overlap_slope(line1), get_overlap_slope(line2)
+    if slope1 == slope2:
+        return are_lines_overlapping(line1, line2, slope1)
+    if not are_lines_overlapping(line1, line2, SKEW_OVERLAP_SLOPE):
+        return False
+    scale = max(abs(value) for point in (*line1, *line2) for value in point[:2])
+    return get_projection_overlap(line1, line2) > WINDOW_TOLERANCE * (1.0 + scale)
+
+
+def get_axis_lines(coordinates: np.ndarray) -> np.ndarray:
+    """This function returns a mask of the lines whose get_overlap_slope can be 0 or inf.
+
+    The bound on the slope is inclusive, so the mask is never stricter than get_overlap_slope.
+    """
+    runs = np.round(coordinates[:, 2] - coordinates[:, 0])
+    rises = coordinates[:, 3] - coordinates[:, 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = np.abs(rises / runs)
+    return (runs == 0) | (slopes <= 0.05 * (1.0 + WINDOW_TOLERANCE))
+
+
+def get_candidate_line_pairs(coordinates: np.ndarray, slope: float, maximum_distance: float
+                             ) -> Tuple[np.ndarray, np.ndarray]:
+    """This function returns the pairs of lines of a slope bucket which can form a parallel pair.
+
+    Args:
+        coordinates (np.ndarray): Lines of the bucket as an array of shape (N, 4) (x1, y1, x2, y2).
+        slope (float): Slope of the bucket direction (see DirectionIndex.get_bin_slope).
+        maximum_distance (float): Maximum distance between the lines of a pair.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Indices (i, j) with i < j of the candidate pairs, sorted on (i, j).
+    """
+    empty = np.empty(0, dtype=np.int64)
+    if len(coordinates) < 2:
+        return empty, empty
+
+    direction = get_bucket_direction(slope)
+    normal = np.array([-direction[1], direction[0]])
+
+    # 1. Offsets of the start points along the normal of the bucket:
+    offsets = coordinates[:, 0] * normal[0] + coordinates[:, 1] * normal[1]
+
+    # The projection error is at most |p1 - p2| * angle, where |p1 - p2| is bounded by the
+    # diagonal of the bucket.
+    xs, ys = coordinates[:, [0, 2]], coordinates[:, [1, 3]]
+    diagonal = math.hypot(xs.max() - xs.min(), ys.max() - ys.min())
+    angles = get_angles_from_direction(coordinates, direction)
+    windows = maximum_distance + diagonal * angles
+    windows += WINDOW_TOLERANCE * (1.0 + maximum_distance + diagonal + np.abs(offsets).max())
+
+    # 2. Sweep: every line is paired with the lines within its own window. A pair is found at
+    # least from the line with the larger window, which is the one the error bound needs.
+    order = np.argsort(offsets, kind='stable')
+    sorted_offsets = offsets[order]
+    starts = np.searchsorted(sorted_offsets, offsets - windows, side='left')
+    ends = np.searchsorted(sorted_offsets, offsets + windows, side='right')
+    counts = ends - starts
+    first = np.repeat(np.arange(len(coordinates)), counts)
+    positions = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    second = order[np.repeat(starts, counts) + positions]
+
+    first, second = np.minimum(first, second), np.maximum(first, second)
+    keep = first != second
+    keys = np.unique(first[keep] * len(coordinates) + second[keep])
+    first, second = keys // len(coordinates), keys % len(coordinates)
+
+    # 3. The lines should overlap (a necessary condition of are_lines_overlapping):
+    minimum_x, maximum_x = xs.min(axis=1), xs.max(axis=1)
+    minimum_y, maximum_y = ys.min(axis=1), ys.max(axis=1)
+    overlap_x = (minimum_x[first] <= maximum_x[second]) & (minimum_x[second] <= maximum_x[first])
+    overlap_y = (minimum_y[first] <= maximum_y[second]) & (minimum_y[second] <= maximum_y[first])
+    # Only two horizontal or vertical lines may overlap on one of the ranges (are_parallel_lines_overlapping):
+    is_axis_line = get_axis_lines(coordinates)
+    is_axis_pair = is_axis_line[first] & is_axis_line[second]
+    overlapping = (overlap_x & overlap_y) | (is_axis_pair & (overlap_x | overlap_y))
+
+    return first[overlapping], second[overlapping]
+
+
+def split_candidate_pairs(first: np.ndarray, second: np.ndarray, chunk_size: int = PAIR_CHUNK_SIZE
+                          ) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """This function splits candidate pairs into chunks of at most chunk_size pairs (keeping their order)."""
+    if len(first) == 0:
+        return []
+    chunk_size = max(int(chunk_size), 1)
+    return [(first[start:start + chunk_size], second[start:start + chunk_size])
+            for start in range(0, len(first), chunk_size)]
+
+
+def map_in_processes(function: Callable, tasks: List[tuple], workers: int = 1) -> list:
+    """This function returns function(*task) for every task, in the order of the tasks.
+
+    Args:
+        function (Callable): A module level function (so that it can be pickled).
+        tasks (List[tuple]): Arguments of every call.
+        workers (int, optional): Number of worker processes. The tasks run in this
+            process when it is 1 or less. Defaults to 1.
+
+    Returns:
+        list: Results of the calls in the order of the tasks.
+    """
+    if workers <= 1 or len(tasks) <= 1:
+        return [function(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, *zip(*tasks)))
@@ -1,12 +1,22 @@
 import math
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
-from pillarplus.math import (are_lines_overlapping, find_distance,
+import numpy as np
+
+from pillarplus.dxf_stream import read_layers
+from pillarplus.geometry_cache import GeometryCache
+from pillarplus.math import (find_distance,
                              find_perpendicular_point, find_slope,
                              get_distance_between_two_parallel_lines,
                              get_length_of_line_segment, get_line_points_2d,
-                             get_mid_points_between_points, is_between,
-                             is_line_decreasing_on_x_2d, is_polyline_closed)
+                             get_mid_points_between_points, is_between)
+from pillarplus.modelspace_harvest import ModelspaceHarvest
+from pillarplus.parallel_lines import (ANGLE_BIN_WIDTH, PAIR_CHUNK_SIZE,
+                                      DirectionIndex, are_parallel_lines_overlapping,
+                                      get_candidate_line_pairs, map_in_processes,
+                                      split_candidate_pairs)
+from pillarplus.segment_cleaning import merge_collinear_segment_store
+from pillarplus.segment_store import SegmentStore
 
 
 class CentreLine:
@@ -46,178 +56,74 @@ class CentreLine:
 #CONSTANTS:
 MAXIMUM_DISTANCE_BETWEEN_CENTRE_LINES = 500 #It is needed to be decided
 
-line_meta = {}
-def get_lines(msp, dwg, layer_name) -> List[tuple]:
+def get_lines(msp, dwg, layer_name, harvest: ModelspaceHarvest = None) -> SegmentStore:
     """This function returns all the lines contained in the layer "PP-Centre_line"
     of the dxf file provided.
 
+    The LWPOLYLINEs are converted into lines (with the closing line of a closed polyline)
+    and the lines decreasing on x are reversed. The lines are taken from the harvest of the
+    modelspace if one is given, so the stages of a run share a single walk of the modelspace.
+
     Returns:
-        List[tuple]: Returns an 'unsorted' list of lines.
+        SegmentStore: Returns the lines sorted on their coordinates.
     """
-    lines = []
-    
-    def get_lines_from_polylines(msp) -> List[tuple]:
-        """This function returns all the lines contained in polylines of the layer "PP-Centre_line"
-        of the dxf file provided.
+    if harvest is None:
+        harvest = ModelspaceHarvest(msp, layers=[layer_name], types=('LINE', 'LWPOLYLINE'))
+    print('Converting polylines into lines.')
+    return harvest.get_segments(layer_name)
 
-        Returns:
-            List[tuple]: Returns an 'unsorted' list of lines.
-        """
-        #fetching all the polylines from the layer PP-Centre_line
-        polylines = msp.query(f'LWPOLYLINE[layer=="{layer_name}"]')
-            
-        def is_closed(polyline):
-            CLOSED = 1
-            return CLOSED == polyline.dxf.flags
-
-        #Convert polylines into lines:
-        print('Converting polylines into lines.')
-        lines = []
-        for polyline in polylines:
-            line = []
-            
-            for point in polyline:
-                x, y = point[0], point[1]
-                line.append((x, y))
-                
-                #if the line has two points:
-                if len(line) == 2:
-                    #Check if the line is decreasing or not:
-                    if is_line_decreasing_on_x_2d(line):
-                        #Swap the points if the line is decreasing:
-                        line.reverse()
-                    
-                    #Append the line into lines
-                    lines.append(line)
-                    line_meta[str(line)] = {'polyline' : polyline}
-                    
-                    #clear the line
-                    line = [(x, y)]
-            
-            # if the polyline is closed 
-            if is_polyline_closed(polyline):
-                #Connecting the first and last points also:
-                p1 = polyline[-1]
-                x1, y1 = p1[0], p1[1]
-                p2 = polyline[0]
-                x2, y2 = p2[0], p2[1]
-                line = [(x1, y1), (x2, y2)]
-                line_meta[str(line)] = {'polyline' : polyline}
-                lines.append(line)
-                
-        
-        return lines
-        
-    def get_lines_from_lines(msp):
-        """This function returns all the lines contained in lines of the layer "PP-Centre_line"
-        of the dxf file provided.
 
-        Returns:
-            List[tuple]: Returns an 'unsorted' list of lines.
-        """
-        lines = []
-        #fetching all the lines from the layer PP-Centre_line
-        Lines = msp.query(f'LINE[layer=="{layer_name}"]')
-        
-        for Line in Lines:
-            try:
-                x1, y1, z1 = Line.dxf.start
-                x2, y2, z2 = Line.dxf.end
-            except Exception as e:
-                print(f'Exception occured while reading line: {e}')
-            
-            line = [(x1, y1), (x2, y2)]
-            
-            if is_line_decreasing_on_x_2d(line):
-                #Swap the points if the line is decreasing:
-                line.reverse()
-                
-            line_meta[str(line)] = {'polyline' : False}
-            
-            lines.append(line)
-                    
-        return lines
-        
-        
-    polyline_lines = get_lines_from_polylines(msp)
-    line_lines = get_lines_from_lines(msp)
-    lines.extend(polyline_lines)
-    lines.extend(line_lines)
-    
-    # Sorting the lines before returning
-    lines.sort()
-    
-    return lines
+def get_lines_from_dxf_file(filename: str, layer_name: str) -> SegmentStore:
+    """This function returns the lines of the LWPOLYLINEs and the LINEs of the layer, streamed from
+    the DXF file without loading the drawing (the same segments as get_lines of the loaded drawing).
 
+    Returns:
+        SegmentStore: Returns the lines sorted on their coordinates.
+    """
+    layer_geometry = read_layers(filename, [layer_name], types=('LINE', 'LWPOLYLINE'))[layer_name]
+    print(f'Streamed {layer_geometry} from {filename}.')
+    return layer_geometry.get_segment_store(layer_name)
 
 
-def preprocess_lines(lines: List[tuple]) -> List[tuple]:
+def preprocess_lines(lines: List[tuple]) -> SegmentStore:
     """This function preprocesses the lines from that are directly sent as input.
 
     Args:
         lines (List[tuple]): The lines directly given in the input.
 
     Returns:
-        List[tuple]: lines.
+        SegmentStore: lines.
     """
-    Lines = []
-    for Line in lines:
-        line = [Line[0], Line[1]]
-        if is_line_decreasing_on_x_2d(line): line.reverse()
-        line_meta[str(line)] = {'polyline': False}
-        Lines.append(line)
+    segments = SegmentStore.from_lines(lines)
+    segments.orient_on_x()
     # Now sorting lines:
-    Lines.sort()
-    return Lines
+    segments.sort()
+    return segments
 
-def get_slope_bucket(lines: List[List[tuple]]) -> Dict[int, List[List[tuple]]]:    
-    """Returns a slope bucket with key slope and values to a be all the lines lying in that slope.
+def get_direction_index(segments: SegmentStore, bin_width: float = ANGLE_BIN_WIDTH) -> DirectionIndex:
+    """Returns a direction index which groups the lines on their angle in [0, 180) degrees.
     
     Args:
-        lines: (List[List[tuple]]): List of lines fetched from the layer "PP-Centre_line".
+        segments (SegmentStore): Lines fetched from the layer "PP-Centre_line".
+        bin_width (float, optional): Width of a direction bin in degrees. Defaults to ANGLE_BIN_WIDTH.
 
     Returns:
-        Dict[int, List[List[tuple]]]: Returns a slope_bucket (dict) with key slope and values to a be all the lines lying in that slope.
+        DirectionIndex: Returns the index with the ids of the lines of every direction bin.
     """
-    def get_slope(x1, y1, x2, y2): 
-        try:
-            slope = (float)(y2-y1)/(float)(round(x2-x1))
-        except ZeroDivisionError:
-            print(f'Zerodivisionerror:: Variables are: {(x1, y1), (x2, y2)}')
-            return math.inf
-        return slope
-    
-    slopes = dict()
-    #Finding slopes of every line:
-    for line in lines:
-        p1, p2 = line[0], line[1]
-        slope = get_slope(p1[0], p1[1], p2[0], p2[1])# slope = find_slope(p1, p2)
-        
-        #Rounding slope for 3 decimal:
-        if slope != math.inf:
-            slope = round(slope, 1) #slope = round(slope, ndigits = 5)
-        
-        # Check if the slope exists in the slope_dict
-        if slope in slopes.keys():
-            slopes[slope].append(line)
-        else:
-            slopes[slope] = [line]
-    
-    return slopes
+    return DirectionIndex(segments.coordinates, bin_width)
 
-def does_lines_belong_to_same_polyline(line1, line2) -> bool:
+def does_lines_belong_to_same_polyline(segments: SegmentStore, line1_id: int, line2_id: int) -> bool:
     """Function to find that the lines belong to the same polyline or not.
 
     Args:
-        line1 (List[List[tuple]]): List of lines fetched from the layer "PP-Centre_line".
-        line2 (List[List[tuple]]): List of lines fetched from the layer "PP-Centre_line".
+        segments (SegmentStore): Lines fetched from the layer "PP-Centre_line".
+        line1_id (int): Id of the first line in the segments.
+        line2_id (int): Id of the second line in the segments.
 
     Returns:
         bool: Returns True is they belong to the same polyline otherwise False.
     """
-    if line_meta[str(line1)]['polyline'] == False or line_meta[str(line2)]['polyline'] == False:
-        return False
-    return line_meta[str(line1)]['polyline'] == line_meta[str(line2)]['polyline']
+    return segments.are_from_same_polyline(line1_id, line2_id)
 
 
 def is_almost_parallel(line1: List[tuple], line2: List[tuple],permissible_angle: int = 1) -> bool:
@@ -244,102 +150,129 @@ def is_almost_parallel(line1: List[tuple], line2: List[tuple],permissible_angle:
         return False
 
 
-parallel_line_pair_meta = {}
-def get_parallel_line_pairs(slope_bucket : Dict[int, List[List[tuple]]]) -> List[List[tuple]]:
+def check_parallel_line_pairs(segments: SegmentStore, first_ids: np.ndarray, second_ids: np.ndarray,
+                              slope: float, maximum_distance: float) -> List[Tuple[int, int, float]]:
+    """This function checks which candidate pairs of lines are valid parallel pairs.
+
+    It only depends on its arguments, so it can run in a worker process.
+
+    Args:
+        segments (SegmentStore): Lines of the candidate pairs.
+        first_ids (np.ndarray): Ids of the first lines of the candidate pairs.
+        second_ids (np.ndarray): Ids of the second lines of the candidate pairs.
+        slope (float): Slope of the direction bin of the lines (only printed).
+        maximum_distance (float): Maximum distance between the lines of a pair.
+
+    Returns:
+        List[Tuple[int, int, float]]: Returns a list of pairs (line1_id, line2_id, width).
+    """
+    parallel_line_pairs = []
+    for line1_id, line2_id in zip(first_ids.tolist(), second_ids.tolist()):
+        line1, line2 = segments.get_line(line1_id), segments.get_line(line2_id)
+        distance = get_distance_between_two_parallel_lines(line1, line2)
+        print(f'Dist: {distance} for {line1, line2}')
+        
+        #edge cases:
+        # Lines should not fall into each other
+        if round(distance) == 0: 
+            print('REJECTED: round(distance) == 0')
+            continue
+        
+        # Lines should be overlapping (on their own slope buckets, not on the slope of the bin)
+        if not are_parallel_lines_overlapping(line1, line2):
+            print('REJECTED: not are_lines_overlapping(line1, line2, slope)')
+            continue                
+        
+        # Lines should be inside a threshold
+        if distance > maximum_distance: 
+            print('REJECTED: distance > MAXIMUM_DISTANCE_BETWEEN_CENTRE_LINES')
+            continue                
+        
+        if does_lines_belong_to_same_polyline(segments, line1_id, line2_id):
+            print('REJECTED: does_lines_belong_to_same_polyline(line1, line2)')
+            continue                                
+
+        if not is_almost_parallel(line1, line2):
+            print('REJECTED: is_almost_parallel(line1, line2)')
+            continue                                
+        
+        print(f'Forming a pair b/w {line1, line2}, slope: {slope}\n')
+        #Make pair of these lines along with their width
+        parallel_line_pairs.append((line1_id, line2_id, distance))
+    
+    return parallel_line_pairs
+
+
+def get_parallel_line_pairs(direction_index: DirectionIndex, segments: SegmentStore,
+                            workers: int = 1, chunk_size: int = PAIR_CHUNK_SIZE,
+                            maximum_distance: float = MAXIMUM_DISTANCE_BETWEEN_CENTRE_LINES) -> List[Tuple[int, int, float]]:
     """This function returns the pairs of parallel lines that are chosen
     
+    The lines of every direction bin are paired with the lines of the same bin and of the
+    next bin, so almost parallel lines on both sides of a bin boundary are paired as well.
+    Only the candidate pairs found by get_candidate_line_pairs (a sweep over the offsets
+    of the lines) are checked.
+    
     The following factors makes a valid parallel pair:
         - Lines should be having a distance less then or equal to threshold value. (MAXIMUM_DISTANCE_BETWEEN_Centre_lineS)
         
         - Lines should have a distance in between greater than zero.
         
-        - Lines should be overlapping. (are_lines_overlapping).
+        - Lines should be overlapping. (are_parallel_lines_overlapping).
+
+    The checks of the candidates can run in a process pool (workers > 1). Large bins are
+    split into chunks of chunk_size candidate pairs and the pairs are merged in the same
+    order as when they are checked in this process.
 
     Args:
-        slope_bucket (Dict[int, List[List[tuple]]]): Slope bucket which pairs the lines according to the slope.
+        direction_index (DirectionIndex): Direction index which groups the line ids according to the angle.
+        segments (SegmentStore): Lines of the direction index.
+        workers (int, optional): Number of worker processes. Defaults to 1 (no process pool).
+        chunk_size (int, optional): Maximum number of candidate pairs checked by one task. Defaults to PAIR_CHUNK_SIZE.
+        maximum_distance (float, optional): Maximum distance between the lines of a pair. Defaults to MAXIMUM_DISTANCE_BETWEEN_CENTRE_LINES.
 
     Returns:
-        List[List[tuple]]: Returns a list of lines.
+        List[Tuple[int, int, float]]: Returns a list of pairs (line1_id, line2_id, width).
     """
-    parallel_line_pairs = []
-    for slope, lines in slope_bucket.items():
-        print(f'Looping for slope : {slope}:\n')
+    tasks, chunk_ids = [], []
+    for bin_id, line_ids, is_own in direction_index.get_bin_groups():
+        slope = direction_index.get_bin_slope(bin_id)
+        print(f'Looping for angle : {direction_index.get_bin_angle(bin_id)}:\n')
         
-        # fetch points in pair of two and form their pairs:
-        index, i = 0, 0
-        while (i < len(lines)):
-            index = i #  index = 2 * i
-            line1 = lines[index]
-            print(f'Now making pairs for line1: {line1}:-')
-            
-            def _get_line2(index, counter):
-                return lines[index + counter] if (index + counter < len(lines)) else None
-            
-            counter = 1
-            line2 = _get_line2(index, counter)
-            
-            # Looping to form the maximum possible pairs with line1.
-            while (line2):
-                distance = get_distance_between_two_parallel_lines(line1, line2)
-                print(f'Dist: {distance} for {line1, line2}')
-                
-                #edge cases:
-                # Lines should not fall into each other
-                if round(distance) == 0: 
-                    print('REJECTED: round(distance) == 0')
-                    counter += 1
-                    line2 = _get_line2(index, counter)
-                    continue
-                
-                # Lines should be overlapping
-                if not are_lines_overlapping(line1, line2, slope):
-                    print('REJECTED: not are_lines_overlapping(line1, line2, slope)')
-                    counter += 1
-                    line2 = _get_line2(index, counter)
-                    continue                
-                
-                # Lines should be inside a threshold
-                if distance > MAXIMUM_DISTANCE_BETWEEN_CENTRE_LINES: 
-                    print('REJECTED: distance > MAXIMUM_DISTANCE_BETWEEN_CENTRE_LINES')
-                    # break            
-                    counter += 1
-                    line2 = _get_line2(index, counter)
-                    continue                
-                
-                if does_lines_belong_to_same_polyline(line1, line2):
-                    print('REJECTED: does_lines_belong_to_same_polyline(line1, line2)')
-                    counter += 1
-                    line2 = _get_line2(index, counter)
-                    continue                                
-
-                if not is_almost_parallel(line1, line2):
-                    print('REJECTED: is_almost_parallel(line1, line2)')
-                    counter += 1
-                    line2 = _get_line2(index, counter)
-                    continue                                
-                
-                print(f'Forming a pair b/w {line1, line2}, slope: {slope}\n')
-                #Make pair of these lines
-                parallel_line_pairs.append((line1, line2))
-                
-                # Storing the width
-                parallel_line_pair_meta[str((line1, line2))] = distance
-                
-                counter += 1
-                line2 = _get_line2(index, counter)
-                
-            i +=1
-            
+        # Only the pairs within the distance window which are overlapping are checked:
+        first_indices, second_indices = get_candidate_line_pairs(
+            segments.coordinates[line_ids], slope, maximum_distance)
+        # The pairs within the next bin are formed by the group of the next bin.
+        is_pair_of_bin = is_own[first_indices] | is_own[second_indices]
+        first_ids, second_ids = line_ids[first_indices[is_pair_of_bin]], line_ids[second_indices[is_pair_of_bin]]
+        
+        for first_chunk, second_chunk in split_candidate_pairs(first_ids, second_ids, chunk_size):
+            if workers > 1:
+                # Only the lines of the chunk are sent to the worker process.
+                ids = np.unique(np.concatenate((first_chunk, second_chunk)))
+                tasks.append((segments.subset(ids), np.searchsorted(ids, first_chunk),
+                              np.searchsorted(ids, second_chunk), slope, maximum_distance))
+                chunk_ids.append(ids)
+            else:
+                tasks.append((segments, first_chunk, second_chunk, slope, maximum_distance))
+                chunk_ids.append(None)
+    
+    parallel_line_pairs = []
+    for pairs, ids in zip(map_in_processes(check_parallel_line_pairs, tasks, workers), chunk_ids):
+        if ids is not None:
+            pairs = [(int(ids[line1_id]), int(ids[line2_id]), width) for line1_id, line2_id, width in pairs]
+        parallel_line_pairs.extend(pairs)
     
     return parallel_line_pairs
     
 
 
-def get_centre_lines_from_pairs(parallel_line_pairs : List[List[tuple]]) -> List["CentreLine"]:
+def get_centre_lines_from_pairs(parallel_line_pairs : List[Tuple[int, int, float]], segments: SegmentStore) -> List["CentreLine"]:
     """This function returns the CentreLine objects that are needed.
 
     Args:
-        parallel_line_pairs (List[List[tuple]]): These are the valid pairs of parallel lines between which a CentreLine can be constructed.
+        parallel_line_pairs (List[Tuple[int, int, float]]): These are the valid pairs (line1_id, line2_id, width) of parallel lines between which a CentreLine can be constructed.
+        segments (SegmentStore): Lines referred to by the pairs.
 
     Returns:
         List[CentreLine]: A list of CentreLine objects for the 
@@ -402,8 +335,8 @@ def get_centre_lines_from_pairs(parallel_line_pairs : List[List[tuple]]) -> List
     
     centre_lines = []
     number = 1
-    for pair in parallel_line_pairs:
-        line1, line2 = pair
+    for line1_id, line2_id, width in parallel_line_pairs:
+        line1, line2 = segments.get_line(line1_id), segments.get_line(line2_id)
         
         if line2:
             x1, y1, x2, y2 = get_line_points_2d(line1)
@@ -418,7 +351,6 @@ def get_centre_lines_from_pairs(parallel_line_pairs : List[List[tuple]]) -> List
                 line_segment: {line_segment}\n\n
                 """)
             
-            width = parallel_line_pair_meta[str(pair)]
             if find_distance(line_segment[0], line_segment[1]) >= 5:
                     centre_line = CentreLine(number, line_segment[0], line_segment[1], line_segment[0], line_segment[1], width)
                     
@@ -429,6 +361,34 @@ def get_centre_lines_from_pairs(parallel_line_pairs : List[List[tuple]]) -> List
     return centre_lines
 
 
+def encode_centre_lines(centre_lines: List[CentreLine]) -> Dict[str, np.ndarray]:
+    """This function returns the numbers, the points and the widths of the centre lines as arrays."""
+    def get_points(name: str) -> np.ndarray:
+        return np.array([getattr(centre_line, name) for centre_line in centre_lines], dtype=np.float64).reshape(len(centre_lines), -1)
+
+    return {
+        'numbers': np.array([centre_line.number for centre_line in centre_lines], dtype=np.int64),
+        'start_points': get_points('start_point'),
+        'end_points': get_points('end_point'),
+        'screen_start_points': get_points('screen_start_point'),
+        'screen_end_points': get_points('screen_end_point'),
+        'widths': np.array([centre_line.width for centre_line in centre_lines], dtype=np.float64),
+    }
+
+
+def decode_centre_lines(arrays: Dict[str, np.ndarray]) -> List[CentreLine]:
+    """This function returns the centre lines of encode_centre_lines."""
+    centre_lines = []
+    for number, start_point, end_point, screen_start_point, screen_end_point, width in zip(
+            arrays['numbers'].tolist(), arrays['start_points'].tolist(), arrays['end_points'].tolist(),
+            arrays['screen_start_points'].tolist(), arrays['screen_end_points'].tolist(), arrays['widths'].tolist()):
+        centre_line = CentreLine(number, tuple(start_point), tuple(end_point), tuple(screen_start_point),
+                                 tuple(screen_end_point), width)
+        centre_line.screen_start_point = tuple(screen_start_point)
+        centre_lines.append(centre_line)
+    return centre_lines
+
+
 def draw_Centre_lines(Centre_lines, msp, dwg, output_file):
     def __debug_location(point, name: str = 'debug', radius = 2, color:int = 2):
         msp.add_circle(point, radius, dxfattribs={'color': color, 'layer': 'debug'})
@@ -441,27 +401,127 @@ def draw_Centre_lines(Centre_lines, msp, dwg, output_file):
         __debug_location(point=Centre_line.end_point, name='EP', radius=1, color=2)
         
     if output_file:
-        dwg.layers.new(name='CenterLines', dxfattribs={'linetype': 'DASHED', 'color': 7})
+        if not dwg.layers.has_entry('CenterLines'):
+            dwg.layers.new(name='CenterLines', dxfattribs={'linetype': 'DASHED', 'color': 7})
         dwg.saveas(output_file)
         print(f'File {output_file} save success.')
 
+class CentreLineDetector:
+    """This class detects the centre lines between pairs of parallel lines.
+
+    A detector holds its own configuration and keeps the state of a run (the lines, the
+    direction index and the pairs) local to that run, so one detector can process many
+    drawings, also concurrently from several threads.
+
+    Attributes:
+        conversion_factor (float): Conversion factor of the units of the drawings to mm.
+        maximum_distance (float): Maximum distance between parallel lines in the units of the drawings.
+        angle_bin_width (float): Width of the direction bins in degrees.
+        workers (int): Number of worker processes to check the pairs in (1 for no process pool).
+        chunk_size (int): Maximum number of candidate pairs checked by one task.
+        collinear_tolerance (float): If not None, the lines which overlap or touch on the same carrier line
+            (within this normal distance in the units of the drawings) are merged before they are paired.
+    """
+
+    def __init__(self, conversion_factor: float = 1.0,
+                 maximum_distance: float = MAXIMUM_DISTANCE_BETWEEN_CENTRE_LINES,
+                 angle_bin_width: float = ANGLE_BIN_WIDTH, workers: int = 1,
+                 chunk_size: int = PAIR_CHUNK_SIZE, collinear_tolerance: float = None):
+        self.conversion_factor = conversion_factor
+        self.maximum_distance = maximum_distance * conversion_factor
+        self.angle_bin_width = angle_bin_width
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.collinear_tolerance = None if collinear_tolerance is None else collinear_tolerance * conversion_factor
+
+    def __repr__(self):
+        return f'CentreLineDetector<conversion_factor:{self.conversion_factor}, maximum_distance:{self.maximum_distance}, angle_bin_width:{self.angle_bin_width}, workers:{self.workers}>'
+
+    def get_segments(self, msp, dwg, layer_name, lines: List[tuple] = None, filename: str = None,
+                     harvest: ModelspaceHarvest = None) -> SegmentStore:
+        """This function returns the lines given as input or else the lines of the layer, streamed from the
+        DXF file if a filename is given or else queried from the drawing (with the overlapping lines merged,
+        if the collinear_tolerance is set)."""
+        if lines is not None:
+            segments = preprocess_lines(lines)
+        elif filename is not None:
+            segments = get_lines_from_dxf_file(filename, layer_name)
+        else:
+            segments = get_lines(msp, dwg, layer_name, harvest)
+        if self.collinear_tolerance is not None:
+            segments, merged_line_count = merge_collinear_segment_store(segments, self.collinear_tolerance)
+            segments.sort()
+            print(f'{merged_line_count} overlapping lines merged.')
+        return segments
+
+    def get_cache_key(self, cache: GeometryCache, segments: SegmentStore) -> str:
+        """This function returns the cache key of the centre lines of the segments with the configuration of the detector."""
+        arrays = {'coordinates': segments.coordinates, 'polyline_ids': segments.polyline_ids, 'flags': segments.flags}
+        parameters = {'maximum_distance': self.maximum_distance, 'angle_bin_width': self.angle_bin_width}
+        return cache.get_key('centre_lines', arrays, parameters)
+
+    def get_parallel_line_pairs(self, segments: SegmentStore) -> List[Tuple[int, int, float]]:
+        """This function returns the pairs (line1_id, line2_id, width) of parallel lines of the segments."""
+        direction_index = get_direction_index(segments, self.angle_bin_width)
+        return get_parallel_line_pairs(direction_index, segments, self.workers, self.chunk_size, self.maximum_distance)
+
+    def detect(self, msp, dwg, layer_name, lines: List[tuple] = None, output_file = None,
+               filename: str = None, harvest: ModelspaceHarvest = None, cache: GeometryCache = None) -> List[CentreLine]:
+        """This function returns the centre lines of a drawing.
+
+        Args:
+            msp: Modelspace of the drawing (None, if the lines are streamed from the file).
+            dwg: The drawing (None, if the lines are streamed from the file).
+            layer_name (str): Layer of the lines (not used when lines are given).
+            lines (List[tuple], optional): Lines to use instead of the lines of the layer. Defaults to None.
+            output_file (str, optional): File to save the drawing with the centre lines to. Defaults to None.
+            filename (str, optional): DXF file to stream the lines of the layer from, instead of querying
+                the modelspace. Defaults to None.
+            harvest (ModelspaceHarvest, optional): Harvest of the modelspace to take the lines of the layer
+                from, instead of querying the modelspace. Defaults to None.
+            cache (GeometryCache, optional): Cache to load the centre lines of the same lines and configuration
+                from (and to store new centre lines in). Defaults to None.
+
+        Returns:
+            List[CentreLine]: Returns a list of CentreLine line segments.
+        """
+        segments = self.get_segments(msp, dwg, layer_name, lines, filename, harvest)
+        arrays = None
+        if cache is not None:
+            cache_key = self.get_cache_key(cache, segments)
+            arrays = cache.load(cache_key)
+        if arrays is not None:
+            centre_lines = decode_centre_lines(arrays)
+            print(f'{len(centre_lines)} centre lines loaded from the cache.')
+        else:
+            parallel_line_pairs = self.get_parallel_line_pairs(segments)
+            centre_lines = get_centre_lines_from_pairs(parallel_line_pairs, segments)
+            if cache is not None:
+                cache.save(cache_key, encode_centre_lines(centre_lines))
+        if msp is not None:
+            draw_Centre_lines(centre_lines, msp, dwg, output_file)
+        return centre_lines
+
+
 def get_centre_lines(
     msp, dwg, layer_name, conversion_factor, 
         output_file = 'detected_centrelines.dxf', *args, **kwargs) -> List[CentreLine]:
     """This function returns Centre_lines from polylines present in the layer "PP-Centre_line"
     in the dxf file.
 
+    It runs a new CentreLineDetector, so the calls do not affect each other. The collinear_tolerance
+    (in mm, None by default) merges the overlapping lines before they are paired. With a filename
+    (and msp and dwg set to None) the lines of the layer are streamed from the DXF file without
+    loading the drawing, and nothing is drawn. A harvest (ModelspaceHarvest) of the modelspace
+    is used instead of querying the modelspace again, and a cache (GeometryCache) keeps the centre
+    lines of the same lines and configuration.
+
     Returns:
         List[Centre_line]: Returns a list of Centre_line line segments.
     """
-    global MAXIMUM_DISTANCE_BETWEEN_CENTRE_LINES
-    MAXIMUM_DISTANCE_BETWEEN_CENTRE_LINES = MAXIMUM_DISTANCE_BETWEEN_CENTRE_LINES * conversion_factor
-    if "lines" in kwargs.keys() and kwargs['lines'] is not None:
-        lines = preprocess_lines(kwargs['lines'])
-    else:
-        lines = get_lines(msp, dwg, layer_name)
-    slope_bucket = get_slope_bucket(lines)
-    parallel_line_pairs = get_parallel_line_pairs(slope_bucket)
-    centre_lines = get_centre_lines_from_pairs(parallel_line_pairs)
-    draw_Centre_lines(centre_lines, msp, dwg, output_file)
-    return centre_lines
+    detector = CentreLineDetector(
+        conversion_factor, angle_bin_width=kwargs.get('angle_bin_width', ANGLE_BIN_WIDTH),
+        workers=kwargs.get('workers', 1), chunk_size=kwargs.get('chunk_size', PAIR_CHUNK_SIZE),
+        collinear_tolerance=kwargs.get('collinear_tolerance'))
+    return detector.detect(msp, dwg, layer_name, lines=kwargs.get('lines'), output_file=output_file,
+                           filename=kwargs.get('filename'), harvest=kwargs.get('harvest'), cache=kwargs.get('cache'))
@@ -5,13 +5,21 @@ Aim: Cleaning the dxf file's walls is really important because due to irregulari
 """
 # IMPORTS:
 import networkx as nx
+import numpy as np
 import logging
-from pillarplus.math import (
-    get_nearest_points_from_a_point, is_between, find_angle)
-from typing import List, Union
+from pillarplus.math import is_between, find_distance
+from pillarplus.debug_recorder import DebugRecorder, wait_for_debug_files
+from pillarplus.degree_index import DegreeIndex
+from pillarplus.geometry_cache import (GeometryCache, decode_graph, encode_graph, get_coordinate_arrays,
+                                       get_coordinates)
+from pillarplus.parallel_lines import map_in_processes
+from pillarplus.planar_graph import PlanarGraph
+from pillarplus.segment_cleaning import get_snap_tolerance, merge_collinear_segments, snap_end_points
+from pillarplus.spatial_index import PointIndex
+from pillarplus.wall_groups import GroupResult, WallGroups
+from typing import Dict, Iterator, List, Tuple, Union
 import sys
 # import matplotlib.pyplot as plt
-import ezdxf
 import math
 
 # Declarations:
@@ -20,18 +28,29 @@ logger.setLevel(logging.DEBUG)
 
 
 # DEBUGGING:
-# Through EZDXF:
-dwg = ezdxf.new('R2010')
-dwg.layers.new('WALL')
-msp = dwg.modelspace()
+# Through EZDXF (see pillarplus.debug_recorder), disabled unless get_cleaned_wall_lines is called with debug = True:
+# The wall_lines and the debug locations, saved as debug_wall_{debug_counter}.dxf:
+wall_recorder = DebugRecorder()
+# The graph wall_lines and the debug locations, saved as debug_graph_wall_{debug_counter}.dxf:
+graph_recorder = DebugRecorder()
 import os
 filepath = f'dxfFilesOut/debug_dxf/'
+# Counts the saved debug_wall files (also when the recorders are disabled).
 debug_counter = 0
+# The cleaning terminates after the cycle at which the debug_counter goes above this:
+MAXIMUM_DEBUG_COUNTER = 5
 
-# FURTHER DEBUG:
-_dwg = ezdxf.new('R2010')
-_dwg.layers.new('WALL_DEBUG')
-_msp = _dwg.modelspace()
+
+# Nearest node of another group of components: node -> (distance, nearest node of another group).
+ForeignNodes = Dict[tuple, Tuple[float, tuple]]
+
+
+class ComponentsTouchingError(Exception):
+    """Raised when a group of components, cleaned on its own, would have reached a node of another group."""
+
+    def __init__(self, node: tuple):
+        super().__init__(f'The cleaning reached the node of another group: {node}.')
+        self.node = node
 
 
 NODE_COLOR = {
@@ -45,75 +64,74 @@ NODE_COLOR = {
 }
 
 
+def set_up_debug_recorders(debug: bool = False):
+    """This function starts the debug drawings of a new run (they are only recorded when debug is True)."""
+    global wall_recorder, graph_recorder
+    wall_recorder, graph_recorder = DebugRecorder(debug), DebugRecorder(debug)
+
 def __debug_location(point, name: str = 'debug', radius = 2, color:int = 2):
-    msp.add_circle(point, radius, dxfattribs={'color': color, 'layer': 'debug'})
-    msp.add_mtext(name, dxfattribs = {'layer': 'debug'}).set_location(point)
-    
-    _msp.add_circle(point, radius, dxfattribs={'color': color, 'layer': 'debug'})
-    _msp.add_mtext(name, dxfattribs = {'layer': 'debug'}).set_location(point)
+    wall_recorder.add_location(point, name, radius, color)
+    graph_recorder.add_location(point, name, radius, color)
     
-def __label_all_the_nodes_in_graphs_according_to_their_degree(graph, **kwargs):
-    __dwg = ezdxf.new('R2010')
-    __dwg.layers.new('WALL_DEBUG')
-    __msp = __dwg.modelspace()
-    
-    def __debug_label_location(point, name: str = 'debug', radius = 2, color:int = 2):
-        __msp.add_circle(point, radius, dxfattribs={'color': color, 'layer': 'debug'})
-        __msp.add_mtext(name, dxfattribs = {'layer': 'debug'}).set_location(point)
-        
-    for edge in graph.edges:
-        __msp.add_line(edge[0], edge[1])
+def __label_all_the_nodes_in_graphs_according_to_their_degree(graph: PlanarGraph, **kwargs):
+    if not graph_recorder.enabled:
+        return
+    degree_recorder = DebugRecorder(enabled = True)
+    degree_recorder.add_lines(graph.get_lines())
 
-    for node in graph.nodes:
-        degree = graph.degree(node)
-        __debug_label_location(
+    for node_id, node in enumerate(graph.nodes):
+        degree = graph.degree(node_id)
+        degree_recorder.add_location(
             point=node,
-            name = f'{graph.degree(node)}',
+            name = f'{degree}',
             radius=1 if degree == 2 else degree,
             color = 5 if degree == 2 else NODE_COLOR[degree]
         )
         
-    __dwg.saveas(filepath+f'debug_degree_{debug_counter}_{kwargs.get("checkpoint", "")}.dxf')
+    degree_recorder.save(filepath+f'debug_degree_{debug_counter}_{kwargs.get("checkpoint", "")}.dxf')
     print('saved', filepath+f'debug_degree_{debug_counter}_{kwargs.get("checkpoint", "")}.dxf')
 
 
     
 def __save_debug_dxf_file():
     global debug_counter
-    dwg.saveas(filepath + f'debug_wall_{debug_counter}.dxf')
-    print('saved dxf file for debug_no: ', debug_counter)
+    if wall_recorder.enabled:
+        wall_recorder.save(filepath + f'debug_wall_{debug_counter}.dxf')
+        print('saved dxf file for debug_no: ', debug_counter)
+    # The counter is also the cycle limit of the cleaning, so it counts even when nothing is saved.
     debug_counter += 1
     
 def __save_graph_debug_dxf_file(wall_lines, graph=None):
-    global debug_counter
-    for wall_line in wall_lines:
-        _msp.add_line(wall_line[0], wall_line[1], dxfattribs = {'layer': 'WALL_DEBUG'})
+    if not graph_recorder.enabled:
+        return
+    graph_recorder.add_lines(wall_lines, layer = 'WALL_DEBUG')
 
-    _dwg.saveas(filepath + f'debug_graph_wall_{debug_counter}.dxf')
+    graph_recorder.save(filepath + f'debug_graph_wall_{debug_counter}.dxf')
     print('saved dxf GRAPH file for debug_no: ', debug_counter)
     if graph:
         __label_all_the_nodes_in_graphs_according_to_their_degree(graph)
 
     
 def __add_wall_lines(wall_lines):
-    for wall_line in wall_lines:
-        msp.add_line(wall_line[0], wall_line[1], dxfattribs = {'layer': 'WALL'})
+    wall_recorder.add_lines(wall_lines, layer = 'WALL')
     __save_debug_dxf_file()
     
 def __add_graph_wall_lines(wall_lines):
     # REMOVING PREVIOUS LAYERS:
     # TODO: REMOVE
     # for wall_line in wall_lines:
-    #     _msp.add_line(wall_line[0], wall_line[1], dxfattribs = {'layer': 'WALL_DEBUG'})
+    #     graph_recorder.add_line(wall_line[0], wall_line[1], layer = 'WALL_DEBUG')
     __save_graph_debug_dxf_file(wall_lines)
     
     
 
-def label_component_edges(__msp, edges, component_number):
+def label_component_edges(recorder: DebugRecorder, edges, component_number):
+    if not recorder.enabled:
+        return
     import pillarplus
     for edge in edges:
         edge_mid_point = pillarplus.math.find_mid_point(edge[0], edge[1])
-        __msp.add_mtext(f'{component_number}', dxfattribs = {'layer' : 'comp_debug_text'}).set_location(edge_mid_point)
+        recorder.add_text(f'{component_number}', edge_mid_point, layer = 'comp_debug_text')
 
 
 # Through MATPLOTLIB:
@@ -148,28 +166,99 @@ def get_connected_graph_components(graph):
     return [graph.subgraph(component_set) for component_set in nx.connected_components(graph)]
 
 
+def get_component_node_order(graph: PlanarGraph, component_set: set, graph_size: int = None) -> List[int]:
+    """This function returns the ids of the nodes of a component in the order of nx.Graph(graph.subgraph(component_set)).
+
+    A subgraph view of networkx iterates the nodes of the component set (of node keys, see
+    PlanarGraph.connected_components) when the component is smaller than half of the graph, otherwise it
+    iterates the graph. graph_size (len(graph) by default) lets a group of components cleaned on its own
+    get the order it would have in the whole graph.
+    """
+    if graph_size is None:
+        graph_size = len(graph)
+    nodes = {node for node in component_set if node in graph}
+    if 2 * len(nodes) < graph_size:
+        return [graph.get_node_id(node) for node in nodes]
+    return [node_id for node_id, node in enumerate(graph.nodes) if node in nodes]
+
 def remove_self_edges_from_the_graph(graph: nx.Graph):
     """Removes self-edges from the graph"""
     graph.remove_edges_from(nx.selfloop_edges(graph))
     print('self-loop edges deleted')
 
-def get_nearest_nodes(node, graph) -> List[tuple]:
+def iter_nearest_nodes(node: int, graph: PlanarGraph, point_index: PointIndex = None) -> Iterator[int]:
+    """Function to lazily get the nearest nodes from node in the graph.
+
+    Args:
+        node (int): id of the current node
+        graph (PlanarGraph): graph
+        point_index (PointIndex, optional): index of the graph nodes (their keys). It is built from the graph if not given.
+
+    Yields:
+        int: ids of the nearest nodes in increasing order of the distance.
+    """
+    nodes = graph.nodes
+    if point_index is None:
+        point_index = PointIndex(nodes)
+    neighbour = graph.adjacency[node][0]
+    # Skipping the points of node edges so that do not get repeated.
+    return map(graph.get_node_id, point_index.iter_nearest(nodes[node], exclude = (nodes[node], nodes[neighbour])))
+
+def iter_nearest_nodes_of_group(node: int, nearest_nodes: Iterator[int], graph: PlanarGraph,
+                                foreign_nodes: ForeignNodes = None, reach: Dict[tuple, float] = None) -> Iterator[int]:
+    """Function to lazily get the nearest nodes of the group of components of the node.
+
+    Args:
+        node (int): id of the current node
+        nearest_nodes (Iterator[int]): nearest nodes of the node within its group (see iter_nearest_nodes).
+        graph (PlanarGraph): graph of the group
+        foreign_nodes (ForeignNodes, optional): the nearest node of another group for every node of the group.
+        reach (Dict[tuple, float], optional): how far every node looked for a node to connect to, which is
+            updated for the node (a node of another group this near would have changed the cleaning).
+
+    Raises:
+        ComponentsTouchingError: When the nearest node of another group would have been reached (a tie included).
+
+    Yields:
+        int: ids of the nearest nodes in increasing order of the distance.
+    """
+    if foreign_nodes is None:
+        yield from nearest_nodes
+        return
+    nodes = graph.nodes
+    foreign_distance, foreign_node = foreign_nodes.get(nodes[node], (math.inf, None))
+    for nearest_node in nearest_nodes:
+        distance = find_distance(nodes[node], nodes[nearest_node])
+        if distance >= foreign_distance:
+            break
+        if reach is not None:
+            reach[nodes[node]] = max(reach.get(nodes[node], 0.0), distance)
+        yield nearest_node
+    if foreign_node is not None:
+        if reach is not None:
+            reach[nodes[node]] = max(reach.get(nodes[node], 0.0), foreign_distance)
+        raise ComponentsTouchingError(foreign_node)
+
+def get_nearest_nodes(node: int, graph: PlanarGraph, point_index: PointIndex = None) -> List[int]:
     """Function to get the nearest nodes from node in the graph.
 
     Args:
-        node (nx.Node): current node
-        graph (nx.Graph): graph
+        node (int): id of the current node
+        graph (PlanarGraph): graph
+        point_index (PointIndex, optional): index of the graph nodes (their keys). It is built from the graph if not given.
 
     Returns:
-        List[tuple]: list of nearest nodes in decreasing order.
+        List[int]: ids of the nearest nodes in increasing order of the distance.
     """
-    points = list(graph.nodes(data = False))
-    point = node
-    node_edge = list(graph.edges(node))[0]
-    # Removing the points of node edges so that do not get repeated.
-    points.remove(node_edge[0]); points.remove(node_edge[1])
-    nearest_points = get_nearest_points_from_a_point(point, points)
-    return nearest_points
+    return list(iter_nearest_nodes(node, graph, point_index))
+
+def update_point_index(point_index: PointIndex, nodes):
+    """Inserts the nodes which are new to the graph into the point_index, so that it stays in sync with the graph."""
+    if point_index is None:
+        return
+    for node in nodes:
+        if node not in point_index:
+            point_index.insert(node)
 
 def intersection(line: List[tuple], point: tuple) -> bool:
     """Function to find whether a point lies on a line or not.
@@ -183,35 +272,46 @@ def intersection(line: List[tuple], point: tuple) -> bool:
     """
     return is_between(point, line[0], line[1])
 
-def break_edge_into_two_edges(edge, node, graph):
+def break_edge_into_two_edges(edge, node: int, graph: PlanarGraph, point_index: PointIndex = None,
+                              degree_index: DegreeIndex = None):
     # Fetch points from edge
     p1, p2 = edge
     # Create new edges
     new_edges = [(p1, node), (node, p2)]
-    graph.add_edges_from(new_edges)
-    # Delete the current edge
-    graph.remove_edge(edge[0], edge[1])
+    update_the_graph_and_node_edge_count(
+        graph, degree_index, edges_to_be_added = new_edges, edges_to_be_removed = [(edge[0], edge[1])])
+    update_point_index(point_index, (graph.nodes[node],))
     return
 
-def update_the_graph_and_node_edge_count(*args, **kwargs):
-    # TODO: complete this function in the most optimized way:
-    return
+def update_the_graph_and_node_edge_count(graph, degree_index: DegreeIndex = None,
+                                         edges_to_be_added = (), edges_to_be_removed = ()):
+    """Adds and then removes the edges from the graph, through the degree_index (if given) so that
+    the degrees of the nodes stay up to date."""
+    graph_or_index = degree_index if degree_index is not None else graph
+    graph_or_index.add_edges_from(edges_to_be_added)
+    graph_or_index.remove_edges_from(edges_to_be_removed)
 
-def connect_to_nearest_node(node, graph):
-    nearest_node = get_nearest_nodes(node, graph)[0]
+def connect_to_nearest_node(node: int, graph: PlanarGraph, point_index: PointIndex = None,
+                            degree_index: DegreeIndex = None, foreign_nodes: ForeignNodes = None,
+                            reach: Dict[tuple, float] = None):
+    nearest_node = next(iter_nearest_nodes_of_group(
+        node, iter_nearest_nodes(node, graph, point_index), graph, foreign_nodes, reach))
     new_edge = (node, nearest_node)
-    graph.add_edge(new_edge[0], new_edge[1])
+    update_the_graph_and_node_edge_count(graph, degree_index, edges_to_be_added = [new_edge])
+    update_point_index(point_index, (graph.nodes[node], graph.nodes[nearest_node]))
     return
 
-def delete_nodes_with_edge_count_greater_than_two(base_node, edges, graph):    
+def delete_nodes_with_edge_count_greater_than_two(base_node: int, edges, graph: PlanarGraph,
+                                                  degree_index: DegreeIndex = None):    
     # to handle problem:
     edges_to_be_removed = []
+    base_point = graph.nodes[base_node]
     
     # DEBUG:
-    print('base_node: ', base_node, 'degree: ', graph.degree(base_node))
+    print('base_node: ', base_point, 'degree: ', graph.degree(base_node))
     if debug_counter >= 2:
         debug_mode = True
-        if base_node == (315820.1279, 6131.6141):
+        if base_point == (315820.1279, 6131.6141):
             fishy_mode = True
             
     if graph.degree(base_node) == 2:
@@ -225,13 +325,14 @@ def delete_nodes_with_edge_count_greater_than_two(base_node, edges, graph):
         if graph.degree(node) > 2:
             edges_to_be_removed.append((edge[0], edge[1]))
             
-    graph.remove_edges_from(edges_to_be_removed)
-    logger.debug(f'Edges with (edge_count > 2) successfully deleted for base_node:{base_node}')
+    update_the_graph_and_node_edge_count(graph, degree_index, edges_to_be_removed = edges_to_be_removed)
+    logger.debug(f'Edges with (edge_count > 2) successfully deleted for base_node:{base_point}')
     # DEBUG:
-    print(f'Edges with (edge_count > 2) successfully deleted for base_node:{base_node}')
-    print(f'for edges_to_be_removed:{edges_to_be_removed if edges_to_be_removed != [] else "NONE"}')
-    __debug_location(base_node)
-    print('after deletion of edges: ', 'base_node: ', base_node, 'degree: ', graph.degree(base_node))
+    removed_lines = [(graph.nodes[u], graph.nodes[v]) for u, v in edges_to_be_removed]
+    print(f'Edges with (edge_count > 2) successfully deleted for base_node:{base_point}')
+    print(f'for edges_to_be_removed:{removed_lines if removed_lines != [] else "NONE"}')
+    __debug_location(base_point)
+    print('after deletion of edges: ', 'base_node: ', base_point, 'degree: ', graph.degree(base_node))
     
     return
 
@@ -244,26 +345,18 @@ def get_node_edge_count(graph: nx.Graph) -> dict:
     """Function to get the node_edge_count.
 
     Args:
-        graph ([type]): [description]
+        graph (nx.Graph): Graph containing wall_lines end-points as node and wall lines as edges.
 
     Returns:
-        [type]: [description]
+        dict: set of the nodes for every edge_count (degree).
     """
-    # Edge count dictionary for track_record:
-    node_edge_count = {}
-
-    # 2. Now preprocess the graph by finding out that for how many edges is a node connected with:
-    # - To find this we need to iterate the graph from all the nodes.
-    # - Keep filling the edge_count of all the node in the dictionary to keep a track-record.
-    for node in graph.nodes:
-        edge_count = len(list(graph.edges(node)))
-        node_set = node_edge_count.get(edge_count, set())
-        node_set.insert(node)
-    return node_edge_count
+    # 2. Now preprocess the graph by finding out that for how many edges is a node connected with.
+    # The DegreeIndex keeps this track-record up to date while the graph is modified through it.
+    return DegreeIndex(graph).get_node_edge_count()
 
 
 # CODE:
-def merge_too_close_edges(graph: nx.Graph):
+def merge_too_close_edges(graph: PlanarGraph, degree_index: DegreeIndex = None, graph_size: int = None):
     """This function merges the edges which are too close to each other.
     
     Procedure:
@@ -277,12 +370,27 @@ def merge_too_close_edges(graph: nx.Graph):
             and corresponding to them make add new edge (from parent-to-succesor) to the edges_to_be_added.
         3. now remove the edges to be edges to be removed and repeat the same procedure with the next graph_component.
     
+    Worklist:
+        Whether an edge (source, target) is merged only depends on the nodes connected to its target,
+        and every edge which is merged is removed at the end of its pass. So after the first pass
+        (which checks every edge) a pass only checks the edges whose target node got an edge
+        added or removed in the previous pass, instead of rescanning the whole component.
+        The merges of a pass are still applied in the order of graph_component.edges, so the
+        merged graph is exactly the same as with rescanning. The directions (atan2) of the node
+        pairs are cached, as long collinear chains check the same pairs pass after pass.
+        graph_component is a PlanarGraph copy of the component with the node and adjacency order
+        of nx.Graph(graph.subgraph(component_set)), so its edges come in the same order.
+    
     Example: if graph has following edges: A -- B and C -- D.
             and if A is too close to C, then:
             C = A and => edges will be: A -- B, A -- D.
     Args:
-        graph (nx.Graph): Networkx Graph.
+        graph (PlanarGraph): Graph of the wall lines.
+        degree_index (DegreeIndex, optional): degree index of the graph which is kept in sync with the graph.
+        graph_size (int, optional): number of nodes of the whole graph, when graph is only a group of its components
+            (see get_component_node_order). Defaults to len(graph).
     """
+    nodes = graph.nodes
         
     def is_angle_is_180_or_0_degrees(angle: Union[float, int]) -> bool:
         from math import pi
@@ -294,42 +402,93 @@ def merge_too_close_edges(graph: nx.Graph):
                                            component_counter = ''):
         new_edge = (source_node, child_node)
         # DEBUG:
-        print(f'target_node: {target_node} DISCARDED. from edge: {(source_node, target_node)}.')
-        print(f'new_edge: {new_edge}.')
+        print(f'target_node: {nodes[target_node]} DISCARDED. from edge: {(nodes[source_node], nodes[target_node])}.')
+        print(f'new_edge: {(nodes[source_node], nodes[child_node])}.')
         __debug_location(
-            point = target_node,
+            point = nodes[target_node],
             color = 4,
             radius = 1,
             name = f'discarded {component_counter}'
         )
         return new_edge
     
+    # Direction (atan2) of every pair of nodes (from, to) which has been checked:
+    directions = {}
+    
+    def get_direction(from_node, to_node) -> float:
+        direction = directions.get((from_node, to_node))
+        if direction is None:
+            (from_x, from_y), (to_x, to_y) = nodes[from_node][:2], nodes[to_node][:2]
+            direction = math.atan2(to_y - from_y, to_x - from_x)
+            directions[(from_node, to_node)] = direction
+        return direction
+    
+    def get_rotation(source_node, target_node, child_node) -> float:
+        # same as find_angle(source_node, target_node, child_node) (in radian):
+        rotation = get_direction(target_node, child_node) - get_direction(target_node, source_node)
+        if rotation < 0:
+            rotation += 2 * math.pi
+        return rotation
+    
+    def get_straight_child_nodes(source_node, target_node) -> list:
+        """Returns the child nodes to merge the edge into (in the order of graph.adjacency[target_node]),
+        or an empty list if the edge is not to be merged."""
+        # find the nodes connected to the target node (except for the source node).
+        child_nodes = [node for node in graph.adjacency[target_node] if node != source_node]
+        # calculate the rotations for each node of the target edge
+        straight_child_nodes = []
+        for child_node in child_nodes:
+            # check if the rotation is around 0 or 180 degree.
+            if not is_angle_is_180_or_0_degrees(get_rotation(source_node, target_node, child_node)):
+                # the child_nodes are making other angles as well
+                return []
+            straight_child_nodes.append(child_node)
+        # if all the nodes are of 0 or 180 then the edge is to be merged:
+        return straight_child_nodes
+    
     # 1. First we fetch all the graph_components from the graph. (which are a subgraph of the graph itself)
-    graph_components = get_connected_graph_components(graph)
+    component_sets = list(graph.connected_components())
     
     # 2. iterate over the graph components and for each graph components find which node is to be merged:
-    for index, graph_component in enumerate(graph_components):
+    for index, component_set in enumerate(component_sets):
         # DEBUG:
         # print('Now labeling all the component edges for component_number:', index)
-        # label_component_edges(_msp, graph_component.edges, index)
+        # label_component_edges(graph_recorder, graph_component.edges, index)
         
         # PROCEDURE:
-        # 1. traverse the graph edge-by-edge
-        # 2. for edge in edges:
+        # 1. check the edges of the worklist (all the edges in the first pass)
+        # 2. for edge in worklist:
         #   2.1 find source and target nodes
         #   2.2 find the nodes connected to the target node (except for the source node).
         #   2.3 calculate the rotations for each node of the target edge
         #   2.4 check if the rotation is around 0 or 180 degree.
         #   2.5 if it 0 or 180 then check if the other rotations are at an angle except for 0 or 180
-        #   2.6 if all the nodes are of 0 or 180 then get new edges and discard the old edge:
-        #       2.6.1 new_edges, edge_to_be_discarded = merge_new_edges(edge), edge
-        # 3. remove the old edges and make the form new_one:
+        #   2.6 if all the nodes are of 0 or 180 then get new edges and discard the old edge.
+        # 3. remove the old edges and make the form new_one (in the order of graph_component.edges):
         #   3.1 graph.add_edges_from(edges_to_be_added)
-        #   3.2 graph.remove_edges_from(edges_to_be_removed)        
+        #   3.2 graph.remove_edges_from(edges_to_be_removed)
+        # 4. the next worklist is the edges whose target node has been changed.
         
-        # unfreezing the graph-component:
-        graph_component_copy = nx.Graph(graph_component)
+        # unfreezing the graph-component, like nx.Graph(graph.subgraph(component_set)): the nodes in the order of the
+        # subgraph and the edges connected from every node in that order (so a node first gets its earlier neighbours):
+        component_nodes = get_component_node_order(graph, component_set, graph_size)
+        node_ranks = {node: rank for rank, node in enumerate(component_nodes)}
+        graph_component_copy = PlanarGraph(graph.coordinates.shape[1], len(component_nodes))
+        for node in component_nodes:
+            graph_component_copy.add_node(nodes[node])
+        graph_component_copy.add_edges_from((node_ranks[u], node_ranks[v]) for u in component_nodes
+                                            for v in graph.adjacency[u])
         
+        # graph_component_copy.edges yields an edge (u, v) from the node u which comes first:
+        def orient_edge(u, v) -> tuple:
+            return (u, v) if node_ranks[u] <= node_ranks[v] else (v, u)
+        
+        def get_edge_position(edge) -> tuple:
+            # position of the edge in graph_component_copy.edges
+            source_node, target_node = edge
+            return node_ranks[source_node], graph_component_copy.adjacency[node_ranks[source_node]].index(node_ranks[target_node])
+        
+        worklist = [(component_nodes[u], component_nodes[v]) for u, v in graph_component_copy.edges()]
         counter = 0
         all_lines_merged = False
         while not all_lines_merged:
@@ -337,55 +496,47 @@ def merge_too_close_edges(graph: nx.Graph):
             print(f'Iterating ({counter} times) on merging lines for component{index}.')
             counter += 1
             
-            edges_to_be_added, edges_to_be_removed = [], []
-            # traverse the graph edge-by-edge
-            for edge in graph_component_copy.edges:
+            merges = []
+            for edge in worklist:
                 # find source and target nodes
-                source_node, target_node = edge[0], edge[1] 
-                # find the nodes connected to the target node (except for the source node).
-                child_nodes = [node for node in graph[target_node] if node != source_node]
-                # calculate the rotations for each node of the target edge
-                child_rotations = {child_node : find_angle(source_node, target_node, child_node) for child_node in child_nodes}
-                
-                # check if the rotation is around 0 or 180 degree.
-                # a flag to determine if the angle between them is forming a straight line or not
-                straight_line_flag = False 
-                # a flag to determine if the child_nodes are making other angles as well
-                other_angles_flag = False
-                for child_node, child_rotation in child_rotations.items():
-                    # if it 0 or 180 then check if the other rotations are at an angle except for 0 or 180
-                    # so if the straight_line_flag is True then check if it has other angles also]
-                    if is_angle_is_180_or_0_degrees(child_rotation):
-                        straight_line_flag = True
-                    else:
-                        other_angles_flag = True
-                        
-                # if all the nodes are of 0 or 180 then get new edges and discard the old edge:
-                if straight_line_flag == True and other_angles_flag == False:
-                    for child_node, child_rotation in child_rotations.items():
-                        if is_angle_is_180_or_0_degrees(child_rotation):
-                            # discard this edge and merge into parent_edge
-                            new_edge = merge_target_node_into_parent_edge(
-                                        source_node, target_node, child_node, graph, 
-                                        component_counter = index + 1)
-                            edges_to_be_added.append(new_edge)
-                            
-                            edge_to_be_discarded = edge # basically (source_node, target_node)
-                            edges_to_be_removed.append(edge_to_be_discarded)
+                source_node, target_node = edge[0], edge[1]
+                straight_child_nodes = get_straight_child_nodes(source_node, target_node)
+                if straight_child_nodes:
+                    merges.append((get_edge_position(edge), edge, straight_child_nodes))
+            merges.sort(key=lambda merge: merge[0])
+            
+            edges_to_be_added, edges_to_be_removed = [], []
+            for _, edge, straight_child_nodes in merges:
+                source_node, target_node = edge
+                for child_node in straight_child_nodes:
+                    # discard this edge and merge into parent_edge
+                    new_edge = merge_target_node_into_parent_edge(
+                                source_node, target_node, child_node, graph, 
+                                component_counter = index + 1)
+                    edges_to_be_added.append(new_edge)
+                    
+                    edge_to_be_discarded = edge # basically (source_node, target_node)
+                    edges_to_be_removed.append(edge_to_be_discarded)
             
             # DEBUG:
             print(f'len edges_to_be_removed: {len(edges_to_be_removed)}')              
             all_lines_merged = True if len(edges_to_be_removed) == 0 else False
 
             # now modifying graph:
-            graph.add_edges_from(edges_to_be_added)
-            graph.remove_edges_from(edges_to_be_removed)
+            update_the_graph_and_node_edge_count(graph, degree_index, edges_to_be_added, edges_to_be_removed)
             
             # now modifying graph_component:
-            graph_component_copy.add_edges_from(edges_to_be_added)
-            graph_component_copy.remove_edges_from(edges_to_be_removed)
+            graph_component_copy.add_edges_from((node_ranks[u], node_ranks[v]) for u, v in edges_to_be_added)
+            graph_component_copy.remove_edges_from((node_ranks[u], node_ranks[v]) for u, v in edges_to_be_removed)
+            
+            # the next worklist: the edges whose target node has been changed.
+            changed_nodes = {node for edge in edges_to_be_added + edges_to_be_removed for node in edge}
+            worklist = {orient_edge(node, component_nodes[neighbour]) for node in changed_nodes
+                        for neighbour in graph_component_copy.adjacency[node_ranks[node]]}
+            worklist = [edge for edge in worklist if edge[1] in changed_nodes]
 
-def clean_wall_lines_and_node_edge_count(graph: nx.Graph, wall_lines: list):
+def clean_wall_lines_and_node_edge_count(graph: PlanarGraph, wall_lines: list, point_index: PointIndex = None,
+                                         degree_index: DegreeIndex = None, graph_size: int = None):
     """This function cleans wall_lines and updates node's edge counts accordingly.
     
     Aim:
@@ -412,29 +563,38 @@ def clean_wall_lines_and_node_edge_count(graph: nx.Graph, wall_lines: list):
             C = A and => edges will be: A -- B, A -- D.
 
     Args:
-        graph (nx.Graph): Graph containing wall_lines end-points as node and wall lines as edges.
+        graph (PlanarGraph): Graph containing wall_lines end-points as node and wall lines as edges.
         wall_lines (list): List of wall_lines.
-        node_edge_count (dict): [description]
+        point_index (PointIndex, optional): index of the graph nodes which is kept in sync with the graph.
+        degree_index (DegreeIndex, optional): degree index of the graph which is kept in sync with the graph.
+        graph_size (int, optional): number of nodes of the whole graph, when graph is only a group of its components.
     """
+    nodes = graph.nodes
+    if point_index is None:
+        point_index = PointIndex(nodes)
+    if degree_index is None:
+        degree_index = DegreeIndex(graph)
+
     # 0. Fetch all the one_edge_count nodes.
-    one_edge_count_nodes = get_nodes_with_degree(1, graph)
+    one_edge_count_nodes = degree_index.get_nodes_with_degree(1)
     
     # 1. Then loops through all the one-edge-count nodes.
     for node in one_edge_count_nodes:
         # Exception Handling:
-        if graph.degree(node) != 1:
+        if degree_index.degree(node) != 1:
             continue
         
         # 1.1. then fetch its nearests node to the point:
-        nearest_nodes = get_nearest_nodes(node, graph)
+        nearest_nodes = iter_nearest_nodes(node, graph, point_index)
         # 1.2. loop through all the edges of the nearest_node:
         for nearest_node in nearest_nodes:
             intersection_flag = False
-            for edge in graph.edges(nearest_node):
+            for neighbour in graph.adjacency[nearest_node]:
+                edge = (nearest_node, neighbour)
                 # 1.2. check if node intersects the edge?
-                if (intersection(edge, node)):
+                if (intersection((nodes[nearest_node], nodes[neighbour]), nodes[node])):
                     # 1.2.1 If they intersects then break the edge into two parts:
-                    break_edge_into_two_edges(edge, node, graph)
+                    break_edge_into_two_edges(edge, node, graph, point_index, degree_index)
                     intersection_flag = True
                     break
                 
@@ -442,16 +602,20 @@ def clean_wall_lines_and_node_edge_count(graph: nx.Graph, wall_lines: list):
             
     # DEBUG:
     # Before labeling checking if any components are merged or not:
-    print('Now labelling before merging.')
-    for index, graph_component in enumerate(get_connected_graph_components(graph)):
-        label_component_edges(_msp, graph_component.edges, index + 1)
+    if graph_recorder.enabled:
+        print('Now labelling before merging.')
+        component_labels, component_edges = graph.get_component_labels(), {}
+        for u, v in graph.edges():
+            component_edges.setdefault(component_labels[u], []).append((nodes[u], nodes[v]))
+        for component_label in sorted(component_edges):
+            label_component_edges(graph_recorder, component_edges[component_label], component_label + 1)
             
     # 2. Remove the too close edges and coincide their nodes.
     #     Example: if graph has following edges: A -- B and C -- D.
     #     and if A is too close to C, then:
     #     C = A and => edges will be: A -- B, A -- D.
     print('Now merging too close edges.')
-    merge_too_close_edges(graph)
+    merge_too_close_edges(graph, degree_index, graph_size)
     
     return
 
@@ -461,8 +625,28 @@ def get_cleaned_wall_lines(wall_lines: list, *args, **kwargs) -> list:
 
     Args:
         wall_lines (list): The lines which has come after quering the msp with the wall_layer.
+        snap_tolerance (float, optional): If given, the end points within this distance (in mm) of each other
+            are snapped together before the graph is created (see pillarplus.segment_cleaning). Defaults to None.
+        collinear_tolerance (float, optional): If given, the wall lines which overlap on the same carrier line (within
+            this normal distance in mm) are merged before the graph is created. Defaults to None.
+        conversion_factor (float, optional): Conversion factor of the drawing for the snap_tolerance and the
+            collinear_tolerance. Defaults to 1.0.
+        workers (int, optional): If greater than 1, the connected components of the graph are cleaned in a pool
+            of that many processes (see clean_wall_graph_in_processes). Defaults to 1.
+        debug (bool, optional): Whether the debug dxf files are written into the filepath. Defaults to False.
+        incremental (bool, optional): Whether the graph is cleaned in groups of components (in this process when
+            workers is 1), so that update_cleaned_wall_lines does not have to clean it from scratch. Defaults to False.
+        previous_graph (nx.Graph, optional): The cleaned graph of the wall_lines before they were edited,
+            the groups of which are not cleaned again (see update_cleaned_wall_lines). Defaults to None.
+        cache (GeometryCache, optional): If given, the cleaned graph of the same wall_lines and tolerances is loaded
+            from the cache (unless debug is set, as the debug files are only written by a cleaning run) and a new
+            cleaned graph is stored in it. Defaults to None.
         
     Procedure:
+        0. (Optional) Snap the end points which are too close to each other. The point every moved end point
+            was snapped to is kept in graph.graph['snapped_points'].
+            (Optional) Merge the overlapping wall lines. The number of the removed wall lines is kept in
+            graph.graph['merged_line_count'].
         1. Create a networkx graph from the wall_lines in which individual end-points are the nodes
             and lines are represented as edges.
         2. Now preprocess the graph by finding out that for how many edges is a node connected with:
@@ -483,100 +667,620 @@ def get_cleaned_wall_lines(wall_lines: list, *args, **kwargs) -> list:
                 
         5. Finally form line pairs with final edges.
         6. Return the new_wall_lines.
+    
+    The wall_lines (before snapping) are kept in graph.graph['wall_lines'] for update_cleaned_wall_lines.
 
     Returns:
         list: Returns the list of proper wall lines.
     """
-    global filepath
+    global filepath, debug_counter
     filepath = kwargs.get('filepath', filepath)
+    # Every run gets the same number of cycles (the counter is the cycle limit):
+    debug_counter = 0
     
     logger.info('Now cleaning wall_lines.')
     print('Now cleaning wall_lines.')
     
     #DEBUG:
+    debug = kwargs.get('debug', False)
+    set_up_debug_recorders(debug)
     __add_wall_lines(wall_lines)
     
+    # The graph of a previous cleaning of the same wall_lines:
+    cache, cache_key = kwargs.get('cache'), None
+    if cache is not None and not debug:
+        cache_key = get_cleaned_wall_lines_cache_key(cache, wall_lines, kwargs.get('snap_tolerance'),
+                                                     kwargs.get('collinear_tolerance'), kwargs.get('conversion_factor', 1.0))
+        arrays = cache.load(cache_key)
+        if arrays is not None:
+            graph = decode_cleaned_wall_graph(arrays)
+            print('Cleaned wall_lines loaded from the cache.')
+            return get_wall_lines_from_graph_edges(graph), graph
+    
+    # 0. Snap the end points which are too close to each other:
+    original_wall_lines = list(wall_lines)
+    snapped_points = {}
+    if kwargs.get('snap_tolerance') is not None:
+        snap_tolerance = get_snap_tolerance(kwargs.get('conversion_factor', 1.0), kwargs['snap_tolerance'])
+        wall_lines, snapped_points = snap_end_points(wall_lines, snap_tolerance)
+        print(f'{len(snapped_points)} end points snapped.')
+    # Merge the overlapping wall lines:
+    merged_line_count = 0
+    if kwargs.get('collinear_tolerance') is not None:
+        collinear_tolerance = get_snap_tolerance(kwargs.get('conversion_factor', 1.0), kwargs['collinear_tolerance'])
+        # The wall lines which only touch are not merged, their common end point may be the junction of another wall:
+        wall_lines, merged_line_count = merge_collinear_segments(wall_lines, collinear_tolerance, merge_touching = False)
+        print(f'{merged_line_count} overlapping wall lines merged.')
+    
     # 1. Create a network x graph from the lines
-    graph = nx.Graph()
+    graph = nx.Graph(snapped_points = snapped_points, merged_line_count = merged_line_count,
+                     wall_lines = original_wall_lines)
     graph.add_edges_from(wall_lines)
     logger.debug('graph initialized.')
     print('graph initialized.')
+    
+    workers = kwargs.get('workers', 1)
+    previous_graph = kwargs.get('previous_graph')
+    if workers > 1 or kwargs.get('incremental', False) or previous_graph is not None:
+        graph = clean_wall_graph_in_processes(graph, wall_lines, workers, previous_graph)
+        if kwargs.get('snap_tolerance') is not None or kwargs.get('collinear_tolerance') is not None:
+            # The groups are of the snapped and merged wall_lines, which an edit can change anywhere:
+            del graph.graph['wall_groups']
+    else:
+        clean_wall_graph(graph, wall_lines)
+    
+    # DEBUG:
+    # from pprint import pprint
+    # graph_nodes = list(graph.nodes)
+    # graph_nodes.sort()
+    # print('Printing graph nodes')
+    # pprint(graph_nodes)
+    
+    new_wall_lines = get_wall_lines_from_graph_edges(graph)
+    if cache_key is not None:
+        cache.save(cache_key, encode_cleaned_wall_graph(graph))
+
+    # DEBUG:
+    if debug:
+        wait_for_debug_files()
+    return new_wall_lines, graph
+
+    return new_wall_lines
+
+
+def get_cleaned_wall_lines_cache_key(cache: GeometryCache, wall_lines: list, snap_tolerance: float = None,
+                                     collinear_tolerance: float = None, conversion_factor: float = 1.0) -> str:
+    """This function returns the cache key of the cleaning of the wall_lines with the tolerances (see get_cleaned_wall_lines).
+
+    The cleaning mode (workers, incremental) is not a part of the key: the cleaning in groups stitches the groups
+    into the node, adjacency and edge order of the sequential cleaning (see clean_wall_graph_in_processes), so
+    every mode gives the same graph.
+    """
+    line_values, line_integer_mask = get_coordinate_arrays([[tuple(start), tuple(end)] for start, end in wall_lines])
+    parameters = {'snap_tolerance': snap_tolerance, 'collinear_tolerance': collinear_tolerance,
+                  'conversion_factor': conversion_factor, 'maximum_debug_counter': MAXIMUM_DEBUG_COUNTER}
+    return cache.get_key('cleaned_wall_lines', {'wall_lines': line_values, 'wall_line_integer_mask': line_integer_mask},
+                         parameters)
+
+
+def encode_cleaned_wall_graph(graph: nx.Graph) -> Dict[str, np.ndarray]:
+    """This function returns the cleaned graph and its snapped_points, merged_line_count and wall_lines as arrays
+    (the wall_groups and the group_results are not kept, so update_cleaned_wall_lines of a decoded graph cleans
+    every group)."""
+    arrays = encode_graph(graph)
+    snapped_points = graph.graph.get('snapped_points', {})
+    point_values, point_integer_mask = get_coordinate_arrays([[tuple(point), tuple(snapped_point)]
+                                                              for point, snapped_point in snapped_points.items()])
+    line_values, line_integer_mask = get_coordinate_arrays([[tuple(start), tuple(end)]
+                                                            for start, end in graph.graph.get('wall_lines', [])])
+    arrays.update(snapped_points = point_values.reshape(-1, 2, 2), snapped_point_integer_mask = point_integer_mask.reshape(-1, 2, 2),
+                  wall_lines = line_values.reshape(-1, 2, 2), wall_line_integer_mask = line_integer_mask.reshape(-1, 2, 2),
+                  merged_line_count = np.array(graph.graph.get('merged_line_count', 0)))
+    return arrays
+
+
+def decode_cleaned_wall_graph(arrays: dict) -> nx.Graph:
+    """This function returns the cleaned graph of encode_cleaned_wall_graph."""
+    snapped_points = {tuple(point): tuple(snapped_point) for point, snapped_point in
+                      get_coordinates(arrays['snapped_points'], arrays['snapped_point_integer_mask'])}
+    wall_lines = [[tuple(start), tuple(end)] for start, end in
+                  get_coordinates(arrays['wall_lines'], arrays['wall_line_integer_mask'])]
+    return decode_graph(arrays, snapped_points = snapped_points, merged_line_count = int(arrays['merged_line_count']),
+                        wall_lines = wall_lines)
+
+
+def get_edited_wall_lines(wall_lines: list, added_wall_lines: list = (), removed_wall_lines: list = ()) -> list:
+    """This function returns the wall_lines after the removed_wall_lines are taken out and the added_wall_lines are added.
+
+    The remaining wall_lines keep their order and the added_wall_lines come after them, so cleaning the edited
+    wall_lines from scratch gives the same graph as update_cleaned_wall_lines.
+
+    Raises:
+        ValueError: When a removed line (in either direction) is not one of the wall_lines.
+    """
+    positions = {}
+    for position, (start, end) in enumerate(wall_lines):
+        positions.setdefault(frozenset((tuple(start), tuple(end))), []).append(position)
+    removed_positions = set()
+    for start, end in removed_wall_lines:
+        line_positions = positions.get(frozenset((tuple(start), tuple(end))))
+        if not line_positions:
+            raise ValueError(f'The removed line is not a wall line: {[start, end]}')
+        removed_positions.add(line_positions.pop(0))
+    return ([line for position, line in enumerate(wall_lines) if position not in removed_positions]
+            + [[tuple(start), tuple(end)] for start, end in added_wall_lines])
+
+
+def update_cleaned_wall_lines(graph: nx.Graph, added_wall_lines: list = (), removed_wall_lines: list = (),
+                              **kwargs) -> Tuple[list, nx.Graph]:
+    """This function updates the cleaned graph after a few of its wall_lines were edited, cleaning only the groups the edit reaches.
+    
+    When the graph was cleaned in groups (incremental or workers > 1, without the tolerances), it is updated in
+    place from its WallGroups (graph.graph['wall_groups'], see pillarplus.wall_groups):
+        1. The lines are edited. The nodes and edges of the graph (and their order) follow from its lines and its
+            node and edge indexes are updated, so nothing is built again from the wall_lines.
+        2. The groups which the edit reaches are removed from the cleaned graph: the groups of the end points of the
+            edited lines; the groups with a node which looked for a node to connect to at least as far as a new node
+            is from it (looked up in a PointIndex of those nodes); the groups which reached a deleted node; and when
+            the number of nodes changed, the groups which are at least half of the graph (see get_group_key).
+        3. Their nodes and the new nodes are cleaned in groups (clean_wall_groups). Another group is only cleaned
+            with them when they join it: when a one-edge-count node of one is on an edge of the other (looked up
+            in the PointIndex of the nodes and the LineIndex of the edges) or when they touch.
+        4. The cleaned groups are spliced into the graph at the cycle at which the whole graph is clean. If that
+            cycle changed, the other groups which are different at it are spliced again from their kept states. If
+            a node moved in the node order (the first of its lines was removed), the graph is rebuilt from the edges
+            of the groups.
+    No other group is cleaned again and the graph is the same as the graph of get_cleaned_wall_lines for the edited
+    wall_lines (see get_edited_wall_lines): a group is cleaned exactly like in the whole graph, as long as it does
+    not touch another group, and no node of another group is nearer to it than how far its nodes looked.
+    The graph must not have been changed since it was cleaned (like by extend_wall_lines_for_entity of test_shapely).
+    
+    Otherwise (the tolerances snap and merge the wall lines anywhere, a debug run writes the debug files of every
+    group) the edited wall_lines are cleaned by get_cleaned_wall_lines, which only cleans the groups which are not
+    the same as in the graph (see clean_wall_graph_in_processes), into a new graph.
+    
+    Example:
+        wall_lines, graph = get_cleaned_wall_lines(wall_lines, incremental = True)
+        wall_lines, graph = update_cleaned_wall_lines(graph, added_wall_lines = [[(0, 0), (0, 3000)]])
+
+    Args:
+        graph (nx.Graph): The graph returned by get_cleaned_wall_lines or update_cleaned_wall_lines. If it was
+            not cleaned in groups (incremental or workers > 1), all its groups are cleaned again (once).
+        added_wall_lines (list, optional): The wall lines [(x1, y1), (x2, y2)] which were added. Defaults to ().
+        removed_wall_lines (list, optional): The wall lines which were removed. Defaults to ().
+        **kwargs: The keyword arguments of get_cleaned_wall_lines (the same as for the graph).
+
+    Raises:
+        ValueError: When the graph does not come from get_cleaned_wall_lines or a removed line is not a wall line.
+
+    Returns:
+        Tuple[list, nx.Graph]: The cleaned wall_lines and the cleaned graph, like get_cleaned_wall_lines.
+    """
+    global filepath, debug_counter
+    if 'wall_lines' not in graph.graph:
+        raise ValueError('The graph does not keep its wall_lines, it was not cleaned by get_cleaned_wall_lines.')
+    # The update is a run of its own, like get_cleaned_wall_lines (after the debug file of its wall_lines):
+    filepath, debug_counter = kwargs.get('filepath', filepath), 1
+    set_up_debug_recorders(False)
+    wall_groups = graph.graph.get('wall_groups')
+    if (wall_groups is None or wall_groups.graph is not graph or kwargs.get('debug', False)
+            or kwargs.get('snap_tolerance') is not None or kwargs.get('collinear_tolerance') is not None
+            or wall_groups.maximum_cycles != max(MAXIMUM_DEBUG_COUNTER - debug_counter, 0)):
+        wall_lines = get_edited_wall_lines(graph.graph['wall_lines'], added_wall_lines, removed_wall_lines)
+        return get_cleaned_wall_lines(wall_lines, previous_graph = graph, **kwargs)
+    
+    logger.info('Now updating cleaned wall_lines.')
+    print('Now updating cleaned wall_lines.')
+    # 1. Edit the lines:
+    graph_size = len(wall_groups)
+    touched_nodes, new_nodes, deleted_nodes, new_edges, is_node_order_changed = wall_groups.edit(
+        added_wall_lines, removed_wall_lines)
+    
+    # 2. Remove the groups which the edit reaches:
+    groups = {wall_groups.group_ids[node] for node in touched_nodes if node in wall_groups.group_ids}
+    for node in new_nodes:
+        groups.update(wall_groups.get_groups_reaching(node))
+    for node in deleted_nodes:
+        groups.update(wall_groups.get_groups_touching(node))
+    if len(wall_groups) != graph_size:
+        groups.update(wall_groups.get_large_groups(min(graph_size, len(wall_groups))))
+    nodes = list(new_nodes)
+    for group in sorted(groups):
+        nodes.extend(node for node in wall_groups.remove_group(group) if node in wall_groups)
+    for node in deleted_nodes:
+        del wall_groups.group_ids[node]
+    graph.remove_nodes_from(deleted_nodes)
+    graph.add_nodes_from(new_nodes)
+    print(f'The edit reaches {len(groups)} of {len(groups) + len(wall_groups.group_results)} groups.')
+    
+    # 3. and 4. Clean them again and splice them into the graph:
+    clean_wall_groups(wall_groups, wall_groups.get_components(nodes), new_edges, kwargs.get('workers', 1))
+    if is_node_order_changed:
+        wall_groups.sort_graph_nodes()
+    graph.graph['wall_lines'] = wall_groups.wall_lines
+    
+    new_wall_lines = get_wall_lines_from_graph_edges(graph)
+    cache = kwargs.get('cache')
+    if cache is not None:
+        cache.save(get_cleaned_wall_lines_cache_key(cache, graph.graph['wall_lines'],
+                                                    conversion_factor = kwargs.get('conversion_factor', 1.0)),
+                   encode_cleaned_wall_graph(graph))
+    return new_wall_lines, graph
+
+
+def clean_wall_graph(graph: nx.Graph, wall_lines: list):
+    """This function cleans the graph of the wall_lines in place (steps 2. to 4. of get_cleaned_wall_lines).
+
+    The cleaning runs on a PlanarGraph of the graph, with the same node and adjacency order (the result depends
+    on them). The cleaned edges are put back into the graph in their insertion order, so the graph gets the node,
+    adjacency and edge order of the cleaning.
+
+    Args:
+        graph (nx.Graph): Graph containing wall_lines end-points as node and wall lines as edges.
+        wall_lines (list): List of wall_lines.
+    """
+    planar_graph = PlanarGraph.from_networkx(graph)
+    # Index of the nodes for the nearest node queries, kept in sync with the graph.
+    point_index = PointIndex(planar_graph.nodes)
+    # Nodes grouped by their degree, kept in sync with the graph.
+    degree_index = DegreeIndex(planar_graph)
         
-    __label_all_the_nodes_in_graphs_according_to_their_degree(graph, checkpoint = '01')
+    __label_all_the_nodes_in_graphs_according_to_their_degree(planar_graph, checkpoint = '01')
     # Clean the wall lines and the nodes:
-    clean_wall_lines_and_node_edge_count(graph, wall_lines)
-    __label_all_the_nodes_in_graphs_according_to_their_degree(graph, checkpoint = '02')
+    clean_wall_lines_and_node_edge_count(planar_graph, wall_lines, point_index, degree_index)
+    __label_all_the_nodes_in_graphs_according_to_their_degree(planar_graph, checkpoint = '02')
     
     
     # DEBUG:
-    c_wall_lines = get_wall_lines_from_graph_edges(graph)
-    __add_graph_wall_lines(c_wall_lines)
+    if graph_recorder.enabled:
+        c_wall_lines = planar_graph.get_lines()
+        __add_graph_wall_lines(c_wall_lines)
         
     #4. Loop infinitely until no edge remains of edge_count > 2:
-    def is_edge_count_greater_than_two_exists(graph) -> bool:
+    def is_edge_count_greater_than_two_exists(degree_index: DegreeIndex) -> bool:
         """Returns true if there exists keys > 2 in the node_edge_count dictionary"""
-        return len(list(filter(lambda node: graph.degree(node) > 2, graph.nodes))) > 0
-        
-    while (is_edge_count_greater_than_two_exists(graph)):
-        # DEBUG:
-        print('DEBUG_COUNTER:', debug_counter)
-        print('Current graph edges: ', len(graph.nodes))
-        print('current_wall_lines', len(graph.edges))
+        return degree_index.has_degree_greater_than(2)
         
-        # 4.1 Traverse the nodes with 1-edge connectivity and connect them with the nearest node.
-        for edge_count_1_node in get_nodes_with_degree(1, graph):
-            # Connect edge count 1 nodes with the nearest nodes
-            # 4.2 Update the connectivity of the node after that.
-            connect_to_nearest_node(node = edge_count_1_node, graph = graph)
-                            
-        # Now traverse of nodes with edge_count greater than 3:        
-        edge_counts_of_nodes_greater_than_two = {degree[1] for degree in graph.degree if degree[1] > 2}
+    while (is_edge_count_greater_than_two_exists(degree_index)):
+        run_cleaning_cycle(planar_graph, point_index, degree_index)
         
-        # DEBUG:
-        print('Now deleting nodes with edge_count > 2:')
-        print('edge_counts_of_nodes_greater_than_two', edge_counts_of_nodes_greater_than_two)
-        
-        for edge_count in edge_counts_of_nodes_greater_than_two:
-            print('\nedge_count:', edge_count)
-            node_set = get_nodes_with_degree(edge_count, graph)
-            # Traverse node by node and delete the edge with edge_count > 2:
-            for node in node_set:
-                graph_node = graph.nodes[node]
-                edges = graph.edges(node)
-                # Now loop through all the edges and delete the edge which has the node with edge_count > 2:
-                delete_nodes_with_edge_count_greater_than_two(
-                    base_node = node, edges = edges, graph = graph)
-                
-        print('Nodes with edge_count > 2 fixed for this cycle.')
-        # print('Now removing self-edges:')
-        # remove_self_edges_from_the_graph(graph)
-                                
-        print('One cycle complete', debug_counter, '\n')
         # DEBUG:
         __save_debug_dxf_file()
         
-        current_wall_lines = get_wall_lines_from_graph_edges(graph)
-        if debug_counter == 0:
-            __add_graph_wall_lines(current_wall_lines)
-        else:
-            __save_graph_debug_dxf_file(current_wall_lines, graph=graph)
-        if not debug_counter <= 5:
+        if graph_recorder.enabled:
+            current_wall_lines = planar_graph.get_lines()
+            if debug_counter == 0:
+                __add_graph_wall_lines(current_wall_lines)
+            else:
+                __save_graph_debug_dxf_file(current_wall_lines, graph=planar_graph)
+        if not debug_counter <= MAXIMUM_DEBUG_COUNTER:
             print('Now terminating')
             sys.exit(1)
             break 
         print()
         # draw_graph(graph)
-        
-    # DEBUG:
-    # from pprint import pprint
-    # graph_nodes = list(graph.nodes)
-    # graph_nodes.sort()
-    # print('Printing graph nodes')
-    # pprint(graph_nodes)
     
-    new_wall_lines = get_wall_lines_from_graph_edges(graph)
+    # The nodes are never created or deleted while cleaning, only the edges are put back:
+    graph.remove_edges_from(list(graph.edges))
+    graph.add_edges_from(get_edges_in_insertion_order(planar_graph))
+
+def run_cleaning_cycle(graph: PlanarGraph, point_index: PointIndex, degree_index: DegreeIndex,
+                       foreign_nodes: ForeignNodes = None, reach: Dict[tuple, float] = None):
+    """This function runs one cycle of the loop of get_cleaned_wall_lines (steps 4.1 to 4.3).
 
+    Args:
+        graph (PlanarGraph): Graph containing wall_lines end-points as node and wall lines as edges.
+        point_index (PointIndex): index of the graph nodes which is kept in sync with the graph.
+        degree_index (DegreeIndex): degree index of the graph which is kept in sync with the graph.
+        foreign_nodes (ForeignNodes, optional): When the graph is a group of components cleaned on its own:
+            the nearest node of another group for every node of the group.
+        reach (Dict[tuple, float], optional): How far every node looked for a node to connect to (see
+            iter_nearest_nodes_of_group), which is updated by the cycle.
+
+    Raises:
+        ComponentsTouchingError: When the group would have connected a node to another group.
+    """
     # DEBUG:
-    return new_wall_lines, graph
+    print('DEBUG_COUNTER:', debug_counter)
+    print('Current graph edges: ', len(graph.nodes))
+    print('current_wall_lines', graph.number_of_edges())
+    
+    # 4.1 Traverse the nodes with 1-edge connectivity and connect them with the nearest node.
+    for edge_count_1_node in degree_index.get_nodes_with_degree(1):
+        # Connect edge count 1 nodes with the nearest nodes
+        # 4.2 Update the connectivity of the node after that.
+        connect_to_nearest_node(node = edge_count_1_node, graph = graph, point_index = point_index,
+                                degree_index = degree_index, foreign_nodes = foreign_nodes, reach = reach)
+                        
+    # Now traverse of nodes with edge_count greater than 3:        
+    edge_counts_of_nodes_greater_than_two = {degree for degree in degree_index.degrees if degree > 2}
+    
+    # DEBUG:
+    print('Now deleting nodes with edge_count > 2:')
+    print('edge_counts_of_nodes_greater_than_two', edge_counts_of_nodes_greater_than_two)
+    
+    for edge_count in edge_counts_of_nodes_greater_than_two:
+        print('\nedge_count:', edge_count)
+        node_set = degree_index.get_nodes_with_degree(edge_count)
+        # Traverse node by node and delete the edge with edge_count > 2:
+        for node in node_set:
+            edges = [(node, neighbour) for neighbour in graph.adjacency[node]]
+            # Now loop through all the edges and delete the edge which has the node with edge_count > 2:
+            delete_nodes_with_edge_count_greater_than_two(
+                base_node = node, edges = edges, graph = graph, degree_index = degree_index)
+            
+    print('Nodes with edge_count > 2 fixed for this cycle.')
+    # print('Now removing self-edges:')
+    # remove_self_edges_from_the_graph(graph)
+                            
+    print('One cycle complete', debug_counter, '\n')
 
-    return new_wall_lines
+
+def clean_wall_line_group(group_graph: PlanarGraph, foreign_nodes: ForeignNodes, graph_size: int,
+                          maximum_cycles: int, group_filepath: str, debug: bool = False) -> GroupResult:
+    """This function cleans a group of graph components on its own (it is run in the worker processes).
+    
+    The sequential cleaning runs its cycles until no node of the whole graph has a degree > 2, so a group
+    runs as many cycles as it can (until nothing changes anymore or maximum_cycles) and returns its edges
+    after every cycle. clean_wall_graph_in_processes picks the cycle at which the whole graph is clean.
+
+    Args:
+        group_graph (PlanarGraph): The graph of the group (its nodes and adjacencies in their original order).
+        foreign_nodes (ForeignNodes): The nearest node of another group for every node of the group.
+        graph_size (int): Number of nodes of the whole graph.
+        maximum_cycles (int): Number of cycles after which the sequential cleaning terminates.
+        group_filepath (str): Prefix of the debug dxf files of the group.
+        debug (bool, optional): Whether the debug dxf files of the group are written. Defaults to False.
+
+    Returns:
+        GroupResult: Whether the group has no node with degree > 2 and its edges (in an order which gives
+            every node its neighbours in their order, see get_edges_in_insertion_order), before the first cycle
+            and after every cycle. The node of another group which the group would have reached in the next
+            cycle, or None. And how far every node looked for a node to connect to (see iter_nearest_nodes_of_group).
+    """
+    global filepath, debug_counter, wall_recorder, graph_recorder
+    # Every group is debugged like a separate run (a worker process cleans many groups). The groups can
+    # also be cleaned in this process, so the debug globals of the run are restored afterwards:
+    run_debug_globals = filepath, debug_counter, wall_recorder, graph_recorder
+    filepath, debug_counter = group_filepath, 0
+    try:
+        set_up_debug_recorders(debug)
+        wall_lines = group_graph.get_lines()
+        __add_wall_lines(wall_lines)
+        
+        graph = group_graph.copy()
+        point_index = PointIndex(graph.nodes)
+        degree_index = DegreeIndex(graph)
+        clean_wall_lines_and_node_edge_count(graph, wall_lines, point_index, degree_index, graph_size)
+        
+        states, touched_node, reach = [], None, {}
+        try:
+            while True:
+                is_clean = not degree_index.has_degree_greater_than(2)
+                states.append((is_clean, get_edges_in_insertion_order(graph)))
+                # Nothing changes anymore when no node has to be connected or deleted:
+                if is_clean and not degree_index.get_nodes_with_degree(1) or len(states) > maximum_cycles:
+                    break
+                run_cleaning_cycle(graph, point_index, degree_index, foreign_nodes, reach)
+                __save_debug_dxf_file()
+        except ComponentsTouchingError as e:
+            print(e)
+            touched_node = e.node
+        # DEBUG: the files are written before the worker process picks up another group:
+        if debug:
+            wait_for_debug_files()
+    finally:
+        filepath, debug_counter, wall_recorder, graph_recorder = run_debug_globals
+    return states, touched_node, reach
+
+def get_edges_in_insertion_order(graph: PlanarGraph) -> List[tuple]:
+    """This function returns the edges (of the node keys) of the graph in an order in which connecting them gives
+    every node its neighbours in the order they have in the graph (see PlanarGraph.get_edge_insertion_order)."""
+    nodes = graph.nodes
+    return [(nodes[u], nodes[v]) for u, v in graph.get_edge_insertion_order()]
+
+def get_foreign_nodes(nodes: list, group_ids: dict, point_index: PointIndex) -> ForeignNodes:
+    """This function finds the nearest node of another group for every node of a group.
+
+    Nodes are never created while cleaning, so they are looked up in the graph before cleaning.
+
+    Args:
+        nodes (list): Nodes of the group.
+        group_ids (dict): The group of every node of the graph.
+        point_index (PointIndex): Index of the nodes of the graph.
+
+    Returns:
+        ForeignNodes: The nearest node of another group (for every node, if there is another group).
+    """
+    foreign_nodes = {}
+    for node in nodes:
+        group_id = group_ids[node]
+        for nearest_node in point_index.iter_nearest(node):
+            if group_ids[nearest_node] != group_id:
+                foreign_nodes[node] = (find_distance(node, nearest_node), nearest_node)
+                break
+    return foreign_nodes
+
+def get_group_key(group_graph: PlanarGraph, graph_size: int, maximum_cycles: int) -> tuple:
+    """This function returns everything the cleaning of a group depends on, apart from its foreign nodes.
+
+    The size of the whole graph only changes the node order of the components which are at least half
+    of it (see get_component_node_order), so it is a part of the key of the large groups only.
+    """
+    return (tuple(group_graph.nodes), tuple(map(tuple, group_graph.adjacency)),
+            graph_size if 2 * len(group_graph) >= graph_size else None, maximum_cycles)
+
+def are_foreign_nodes_unchanged(nodes: list, foreign_nodes: ForeignNodes, graph: Union[nx.Graph, WallGroups],
+                                new_node_index: PointIndex) -> bool:
+    """This function checks whether the foreign nodes which a group had in the previous graph still hold.
+
+    The group itself is unchanged, so its foreign nodes only change when one of them was deleted or when
+    a node which is new to the graph is as near to a node of the group as its foreign node.
+
+    Args:
+        nodes (list): Nodes of the group.
+        foreign_nodes (ForeignNodes): The foreign nodes of the group in the previous graph.
+        graph (Union[nx.Graph, WallGroups]): The graph (only its nodes are looked up).
+        new_node_index (PointIndex): Index of the nodes which were not in the previous graph.
+    """
+    if any(foreign_node not in graph for _, foreign_node in foreign_nodes.values()):
+        return False
+    if len(new_node_index) == 0:
+        return True
+    for node in nodes:
+        foreign_distance = foreign_nodes.get(node, (math.inf, None))[0]
+        nearest_new_node = next(new_node_index.iter_nearest(node))
+        if find_distance(node, nearest_new_node) <= foreign_distance:
+            return False
+    return True
+
+def clean_wall_graph_in_processes(graph: nx.Graph, wall_lines: list, workers: int,
+                                  previous_graph: nx.Graph = None) -> nx.Graph:
+    """This function cleans the components of the graph in a process pool, with the same result as clean_wall_graph.
+    
+    Procedure:
+        1. Every connected component of the graph starts as a group of its own. Components are joined
+            in advance when a one-edge-count node of one is on an edge of the other (step 3. may break the edge).
+        2. Every group is cleaned on its own in the pool (clean_wall_line_group). It is sent as a PlanarGraph
+            (a coordinate array and integer adjacency lists) instead of a networkx graph keyed on tuples.
+            Its nodes and adjacencies keep the order they have in the whole graph, so it is cleaned exactly
+            like in the whole graph as long as it does not touch another group.
+        3. The cycle at which no node of any group has a degree > 2 is looked up. If before that cycle,
+            a node of a group would have been connected to a nearer node of another group (a tie included),
+            both the groups touch: they are joined and cleaned again (from the original graph).
+            In the worst case all the components end up in a single group, which is the sequential cleaning.
+        4. The cleaned groups (at that cycle) are stitched together. Nodes are never created or deleted while
+            cleaning and the groups do not share nodes, so every node gets the neighbours it gets in the sequential
+            cleaning, in the same order: the nodes are added in the order of the whole graph and the edges of
+            every group in their insertion order. The cleaned graph has the same node, adjacency and edge order
+            as the graph of clean_wall_graph.
+    
+    The groups are kept in a WallGroups, in graph.graph['wall_groups'] of the cleaned graph (and the result of
+    every group in graph.graph['group_results']), from which update_cleaned_wall_lines updates the cleaned graph
+    after an edit. When the graph is an edit of the previous_graph, a group which is the same as in the previous
+    graph and whose foreign nodes still hold (are_foreign_nodes_unchanged) is not cleaned again.
+
+    Args:
+        graph (nx.Graph): Graph containing wall_lines end-points as node and wall lines as edges.
+        wall_lines (list): The wall lines the graph was created from (in their order).
+        workers (int): Number of worker processes.
+        previous_graph (nx.Graph, optional): The cleaned graph of the wall_lines before the edit. Defaults to None.
+
+    Returns:
+        nx.Graph: The cleaned graph.
+    """
+    # The sequential cleaning terminates at the cycle after which the debug_counter is above its maximum:
+    maximum_cycles = max(MAXIMUM_DEBUG_COUNTER - debug_counter, 0)
+    cleaned_graph = nx.Graph(**graph.graph)
+    cleaned_graph.add_nodes_from(graph)
+    wall_groups = WallGroups(wall_lines, maximum_cycles, cleaned_graph)
+    cleaned_graph.graph.update(wall_groups = wall_groups, group_results = wall_groups.group_results)
+    
+    previous_group_results, new_node_index = None, None
+    # The groups cleaned before are not cleaned again, unless their debug files are to be written:
+    if previous_graph is not None and not wall_recorder.enabled:
+        previous_group_results = previous_graph.graph.get('group_results', {})
+        # Nodes are never created or deleted while cleaning, so the new nodes are those which are not in the previous graph:
+        new_node_index = PointIndex(node for node in graph if node not in previous_graph)
+    
+    clean_wall_groups(wall_groups, wall_groups.get_components(graph), (), workers, previous_group_results, new_node_index)
+    return cleaned_graph
+
+def clean_wall_groups(wall_groups: WallGroups, components: List[List[tuple]], new_edges: List[tuple], workers: int,
+                      previous_group_results: dict = None, new_node_index: PointIndex = None):
+    """This function cleans components of the graph in groups (steps 1. to 3. of clean_wall_graph_in_processes)
+    and splices them into the cleaned graph of the wall_groups (step 4.).
+
+    The other groups of the wall_groups are only cleaned again when they join the components: when a one-edge-count
+    node of theirs is on a new edge or on an edge of the components, when a one-edge-count node of the components
+    is on an edge of theirs, or when they touch. A group which is cleaned again is removed from the cleaned graph.
+
+    Args:
+        wall_groups (WallGroups): The groups of the graph, of which the components are not a part (yet).
+        components (List[List[tuple]]): The connected components which are to be cleaned.
+        new_edges (List[tuple]): The edges which are new to the graph, but not a part of the components.
+        workers (int): Number of worker processes.
+        previous_group_results (dict, optional): group key -> (foreign nodes, result) of the groups of the graph
+            before it was edited. Defaults to None.
+        new_node_index (PointIndex, optional): Index of the nodes which were not in the graph before it was edited.
+            Defaults to None.
+    """
+    # 1. Every component starts as a group of its own:
+    group_nodes, group_ids = {}, wall_groups.group_ids
+    for component in components:
+        group = wall_groups.get_new_group()
+        group_nodes[group] = component
+        for node in component:
+            group_ids[node] = group
+    joined_groups = set()
+    
+    def join_groups(node: tuple, other_node: tuple):
+        """Joins the groups of both the nodes (into the smaller group id), taking a cleaned group out of the wall_groups."""
+        group, other_group = sorted((group_ids[node], group_ids[other_node]))
+        if group == other_group:
+            return
+        joined_groups.update((group, other_group))
+        for joined_group in (group, other_group):
+            if joined_group not in group_nodes:
+                group_nodes[joined_group] = wall_groups.remove_group(joined_group)
+        nodes, other_nodes = group_nodes[group], group_nodes.pop(other_group)
+        for other_node in other_nodes:
+            group_ids[other_node] = group
+        if len(nodes) < len(other_nodes):
+            nodes, other_nodes = other_nodes, nodes
+            group_nodes[group] = nodes
+        nodes.extend(other_nodes)
+    
+    # Components are joined in advance when a one-edge-count node of one is on an edge of the other:
+    for component in components:
+        for node in component:
+            if wall_groups.get_degree(node) == 1:
+                for edge in wall_groups.get_edges_through(node):
+                    join_groups(node, edge[0])
+    for edge in new_edges:
+        for node in wall_groups.get_nodes_on(edge):
+            if wall_groups.get_degree(node) == 1:
+                join_groups(node, edge[0])
+    
+    graph_size, maximum_cycles = len(wall_groups), wall_groups.maximum_cycles
+    groups_to_be_cleaned = sorted(group_nodes)
+    while True:
+        # 2. Every group is cleaned on its own in the pool.
+        tasks, task_groups = [], []
+        for group in groups_to_be_cleaned:
+            nodes = group_nodes.pop(group)
+            group_graph = wall_groups.get_subgraph(nodes)
+            group_key = get_group_key(group_graph, graph_size, maximum_cycles)
+            previous_result = previous_group_results.get(group_key) if previous_group_results else None
+            if previous_result is not None and are_foreign_nodes_unchanged(
+                    group_graph.nodes, previous_result[0], wall_groups, new_node_index):
+                wall_groups.add_group(group, nodes, previous_result[1], group_key, previous_result[0])
+                continue
+            foreign_nodes = get_foreign_nodes(group_graph.nodes, group_ids, wall_groups.point_index)
+            tasks.append((group_graph, foreign_nodes, graph_size, maximum_cycles, f'{filepath}group_{group}_',
+                          wall_recorder.enabled))
+            task_groups.append((group, nodes, group_key, foreign_nodes))
+        if len(tasks) < len(groups_to_be_cleaned):
+            print(f'{len(groups_to_be_cleaned) - len(tasks)} groups are unchanged since the previous cleaning.')
+        print(f'Cleaning {len(tasks)} groups of components in {workers} processes.')
+        for (group, nodes, group_key, foreign_nodes), result in zip(task_groups, map_in_processes(clean_wall_line_group, tasks, workers)):
+            wall_groups.add_group(group, nodes, result, group_key, foreign_nodes)
+        
+        # 3. Look up the cycle at which the whole graph is clean:
+        clean_cycle, touching_groups = wall_groups.get_clean_cycle()
+        if not touching_groups:
+            break
+        # The groups which touch each other are joined and cleaned again:
+        joined_groups.clear()
+        for node, touched_node in [(wall_groups.get_group_nodes(group)[0], wall_groups.get_result(group)[1])
+                                   for group in touching_groups]:
+            join_groups(node, touched_node)
+        groups_to_be_cleaned = sorted(group_nodes)
+        print(f'{len(joined_groups)} groups touch each other, cleaning them again as {len(groups_to_be_cleaned)} groups.')
+    
+    if clean_cycle is None:
+        print('Now terminating')
+        sys.exit(1)
+    
+    # 4. Splice the cleaned groups into the cleaned graph:
+    wall_groups.set_clean_cycle(clean_cycle)
@@ -0,0 +1,203 @@
+"""Batch (vectorized) companions of the scalar helpers in pillarplus.math.
+
+The functions in pillarplus.math work on one tuple at a time, which is fine for a
+handful of calls but dominates the runtime when they are called millions of times
+from the hot loops (pairing lines, cleaning walls, finding walls of a location).
+Every function here takes NumPy arrays of points (N x 2) and segments (N x 4, in the
+order x1, y1, x2, y2) and returns the result for the whole array at once.
+
+The results follow the scalar versions within floating point tolerance:
+    find_distances              <-> find_distance
+    find_perpendicular_points   <-> find_perpendicular_point
+    are_between                 <-> is_between
+    find_angles                 <-> find_angle
+    find_intersection_points    <-> find_intersection_point
+
+Inputs are broadcast against each other, so a single point can be checked against
+many segments (and vice versa) without repeating it N times.
+"""
+import numpy as np
+
+# Same precision that is used by pillarplus.math.is_between
+BETWEEN_DECIMALS: int = 5
+
+
+def as_points(points) -> np.ndarray:
+    """This function converts points into a float64 array of shape (N, 2).
+
+    Args:
+        points: A point (x, y) or a list / array of points. Any z coordinate is dropped.
+
+    Returns:
+        np.ndarray: Array of shape (N, 2).
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if points.ndim == 1:
+        points = points[np.newaxis, :]
+    return points[:, :2]
+
+
+def as_segments(segments) -> np.ndarray:
+    """This function converts segments into a float64 array of shape (N, 4).
+
+    Args:
+        segments: A line [(x1, y1), (x2, y2)], a list of such lines or an array
+            which is already of shape (N, 4).
+
+    Returns:
+        np.ndarray: Array of shape (N, 4) in the order x1, y1, x2, y2.
+    """
+    segments = np.asarray(segments, dtype=np.float64)
+    if segments.ndim == 1:
+        return segments[np.newaxis, :4]
+    if segments.ndim == 2:
+        # A single line given as [(x1, y1), (x2, y2)]
+        if segments.shape == (2, 2) or segments.shape == (2, 3):
+            return segments[:, :2].reshape(1, 4)
+        return segments[:, :4]
+    # A list of lines given as [[(x1, y1), (x2, y2)], ...]
+    return segments[:, :2, :2].reshape(-1, 4)
+
+
+def find_distances(points1, points2) -> np.ndarray:
+    """Batch version of find_distance.
+
+    Args:
+        points1: Points of shape (N, 2) (or a single point).
+        points2: Points of shape (N, 2) (or a single point).
+
+    Returns:
+        np.ndarray: Euclidean distance between every pair of points, shape (N,).
+    """
+    points1, points2 = as_points(points1), as_points(points2)
+    return np.hypot(points1[:, 0] - points2[:, 0], points1[:, 1] - points2[:, 1])
+
+
+def find_perpendicular_points(points, segments) -> np.ndarray:
+    """Batch version of find_perpendicular_point.
+
+    The perpendicular point is the foot of the perpendicular from the point on the
+    (infinite) line through the segment. Just like the scalar version, the start point
+    of a zero-length segment is returned as its foot point.
+
+    Args:
+        points: Points of shape (N, 2) (or a single point).
+        segments: Segments of shape (N, 4) (or a single segment).
+
+    Returns:
+        np.ndarray: Foot points of shape (N, 2).
+    """
+    points, segments = as_points(points), as_segments(segments)
+    x1, y1, x2, y2 = segments[:, 0], segments[:, 1], segments[:, 2], segments[:, 3]
+    x3, y3 = points[:, 0], points[:, 1]
+    dx, dy = x2 - x1, y2 - y1
+    denominator = dy ** 2 + dx ** 2
+    degenerate = denominator == 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k = (dy * (x3 - x1) - dx * (y3 - y1)) / denominator
+    x4 = np.where(degenerate, x1, x3 - k * dy)
+    y4 = np.where(degenerate, y1, y3 + k * dx)
+    return np.stack((x4, y4), axis=1)
+
+
+def are_between(points, segments) -> np.ndarray:
+    """Batch version of is_between.
+
+    A point is between the end points of a segment when the sum of its distances to
+    both end points equals the length of the segment (rounded to BETWEEN_DECIMALS).
+
+    Args:
+        points: Points of shape (N, 2) (or a single point).
+        segments: Segments of shape (N, 4) (or a single segment).
+
+    Returns:
+        np.ndarray: Boolean mask of shape (N,).
+    """
+    points, segments = as_points(points), as_segments(segments)
+    starts, ends = segments[:, :2], segments[:, 2:]
+    distance_sum = find_distances(starts, points) + find_distances(points, ends)
+    length = find_distances(starts, ends)
+    return np.round(distance_sum, BETWEEN_DECIMALS) == np.round(length, BETWEEN_DECIMALS)
+
+
+def find_angles(points1, points2, points3) -> np.ndarray:
+    """Batch version of find_angle.
+
+    Args:
+        points1: Points of shape (N, 2).
+        points2: Points of shape (N, 2), the vertices of the angles.
+        points3: Points of shape (N, 2).
+
+    Returns:
+        np.ndarray: Anti-clockwise angle from (p2 -> p1) to (p2 -> p3) in radians, in the range [0, 2 pi).
+    """
+    points1, points2, points3 = as_points(points1), as_points(points2), as_points(points3)
+    angle1 = np.arctan2(points3[:, 1] - points2[:, 1], points3[:, 0] - points2[:, 0])
+    angle2 = np.arctan2(points1[:, 1] - points2[:, 1], points1[:, 0] - points2[:, 0])
+    angles = angle1 - angle2
+    return np.where(angles < 0, angles + 2 * np.pi, angles)
+
+
+def find_distances_to_segments(points, segments) -> np.ndarray:
+    """This function returns the shortest distance from every point to its segment.
+
+    Unlike the perpendicular distance, the distance is measured to the closest point
+    which lies on the segment (so it matches shapely's Point.distance(LineString)).
+
+    Args:
+        points: Points of shape (N, 2) (or a single point).
+        segments: Segments of shape (N, 4) (or a single segment).
+
+    Returns:
+        np.ndarray: Distances of shape (N,).
+    """
+    points, segments = as_points(points), as_segments(segments)
+    starts, ends = segments[:, :2], segments[:, 2:]
+    directions = ends - starts
+    length_squared = np.sum(directions * directions, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.sum((points - starts) * directions, axis=1) / length_squared
+    t = np.where(length_squared == 0, 0.0, np.clip(t, 0.0, 1.0))
+    closest_points = starts + t[:, np.newaxis] * directions
+    return find_distances(points, closest_points)
+
+
+def find_intersection_points(start, end, segments, within_segments: bool = False) -> np.ndarray:
+    """Batch version of find_intersection_point which intersects one line with many.
+
+    Args:
+        start (tuple): Start point of the line.
+        end (tuple): End point of the line.
+        segments: Segments of shape (N, 4) to intersect the line with.
+        within_segments (bool, optional): Only keep the intersection points that lie on
+            both the segment start-end and the other segment. Defaults to False.
+
+    Returns:
+        np.ndarray: Intersection points of shape (N, 2). Rows are NaN where the lines are
+            parallel (or, with within_segments, where the segments do not cross).
+    """
+    segments = as_segments(segments)
+    x1, y1 = float(start[0]), float(start[1])
+    x2, y2 = float(end[0]), float(end[1])
+    x3, y3, x4, y4 = segments[:, 0], segments[:, 1], segments[:, 2], segments[:, 3]
+    xdiff1, ydiff1 = x1 - x2, y1 - y2
+    xdiff2, ydiff2 = x3 - x4, y3 - y4
+    div = xdiff1 * ydiff2 - ydiff1 * xdiff2
+
+    d1 = x1 * y2 - y1 * x2
+    d2 = x3 * y4 - y3 * x4
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = (d1 * xdiff2 - xdiff1 * d2) / div
+        y = (d1 * ydiff2 - ydiff1 * d2) / div
+    invalid = div == 0
+
+    if within_segments:
+        # Parameters of the intersection point along both the segments (0 <= t, u <= 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = ((x1 - x3) * ydiff2 - (y1 - y3) * xdiff2) / div
+            u = ((x1 - x3) * ydiff1 - (y1 - y3) * xdiff1) / div
+        invalid |= (t < 0) | (t > 1) | (u < 0) | (u > 1)
+
+    points = np.stack((x, y), axis=1)
+    points[invalid] = np.nan
+    return points
@@ -0,0 +1,66 @@
+"""Connected component index of a networkx graph.
+
+Looking up the component of an edge with nx.connected_components walks the components one
+after the other (building a subgraph of each one to test it) until one of them contains the
+edge, so looking up the components of many edges (the walls next to every room text) costs
+O(lookups x graph). A ComponentIndex joins the nodes of every edge in a union-find once:
+
+    1. The component of a node is the root of its set. The roots are the smallest members,
+       so the id of a component is the rank of its first node in the node order of the graph.
+    2. The subgraph of a component is built the first time it is asked for and cached.
+       It is built from the same node set (a BFS from the first node of the component) as
+       the sets yielded by nx.connected_components, so it is the very same graph.
+
+The index is not updated when the graph changes, build a new one instead.
+"""
+from typing import Dict, List
+
+import networkx as nx
+
+from pillarplus.segment_cleaning import UnionFind
+
+
+class ComponentIndex:
+    """This class maps the nodes and the edges of a graph onto its connected components.
+
+    Attributes:
+        graph (nx.Graph): The indexed graph.
+    """
+
+    def __init__(self, graph: nx.Graph):
+        self.graph = graph
+        self._nodes: List[tuple] = list(graph)
+        self._ranks: Dict[tuple, int] = {node: rank for rank, node in enumerate(self._nodes)}
+        components = UnionFind(len(self._nodes))
+        for u, v in graph.edges:
+            components.union(self._ranks[u], self._ranks[v])
+        self._component_ids = [components.find(rank) for rank in range(len(self._nodes))]
+        self._subgraphs: Dict[int, nx.Graph] = {}
+
+    def __len__(self) -> int:
+        """The number of the components."""
+        return len(set(self._component_ids))
+
+    def get_component_id(self, node) -> int:
+        return self._component_ids[self._ranks[node]]
+
+    def get_edge_component_id(self, edge: tuple) -> int:
+        """This function returns the component of the edge.
+
+        Raises:
+            ValueError: When the edge is not in the graph.
+        """
+        if not self.graph.has_edge(edge[0], edge[1]):
+            raise ValueError(f'The edge is not in the graph: {edge}')
+        return self.get_component_id(edge[0])
+
+    def get_component(self, component_id: int) -> nx.Graph:
+        """This function returns a copy of the subgraph of the component (the same copy on every call)."""
+        if component_id not in self._subgraphs:
+            component = nx.node_connected_component(self.graph, self._nodes[component_id])
+            self._subgraphs[component_id] = self.graph.subgraph(component).copy()
+        return self._subgraphs[component_id]
+
+    def get_component_containing_edge(self, edge: tuple) -> nx.Graph:
+        """This function returns a copy of the subgraph of the component which contains the edge."""
+        return self.get_component(self.get_edge_component_id(edge))
@@ -0,0 +1,174 @@
+"""Recorder of debug drawings which costs (almost) nothing while it is disabled.
+
+The wall processing modules used to draw their debug geometry straight into ezdxf documents:
+the documents were created at import time, a circle and an MTEXT were added on every node
+operation and the documents were saved after every cycle, whether anybody looked at the
+files or not. A DebugRecorder replaces those documents:
+
+    1. It is disabled by default and then every add_* call returns immediately. Callers
+       which have to compute their debug geometry first check recorder.enabled.
+    2. When it is enabled, the primitives are only buffered as plain tuples.
+    3. save() hands a snapshot of the buffer to a single background thread, which builds
+       the ezdxf document and writes it, so the stage which is being debugged does not wait
+       for the file. wait_for_debug_files() waits until every file is written.
+
+Example:
+    recorder = DebugRecorder(enabled = True)
+    recorder.add_lines(graph.edges, layer = 'WALL')
+    recorder.add_location(node, name = 'discarded', color = 4)
+    recorder.save('dxfFilesOut/debug_dxf/debug_wall_0.dxf')
+"""
+import logging
+import os
+from concurrent import futures
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DXF_VERSION: str = 'R2010'
+
+# Kinds of the buffered primitives:
+LINE = 'LINE'
+CIRCLE = 'CIRCLE'
+MTEXT = 'MTEXT'
+
+# The writer thread is only started by the first save():
+_writer: Optional[ThreadPoolExecutor] = None
+_pending_writes: List[Future] = []
+
+
+def _finish_writes():
+    """A process is only forked (for a process pool) once the writer thread is idle, as the forked
+    process would inherit the locks which the writer thread holds while it writes."""
+    futures.wait(_pending_writes)
+
+
+def _reset_writer():
+    """A forked process does not inherit the writer thread, so it starts its own."""
+    global _writer, _pending_writes
+    _writer, _pending_writes = None, []
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(before = _finish_writes, after_in_child = _reset_writer)
+
+
+def _get_writer() -> ThreadPoolExecutor:
+    global _writer
+    if _writer is None:
+        # A single thread, so that the files are written in the order in which they were saved.
+        _writer = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = 'debug-dxf')
+    return _writer
+
+
+def _get_dxfattribs(layer: str, color: Optional[int]) -> dict:
+    dxfattribs = {'layer': layer}
+    if color is not None:
+        dxfattribs['color'] = color
+    return dxfattribs
+
+
+def write_dxf_file(filename: str, primitives: Tuple[tuple, ...], dxfversion: str = DEFAULT_DXF_VERSION):
+    """This function draws the buffered primitives into a new ezdxf document and saves it as filename."""
+    import ezdxf
+    dwg = ezdxf.new(dxfversion)
+    msp = dwg.modelspace()
+    for kind, layer, color, *arguments in primitives:
+        if layer not in dwg.layers:
+            dwg.layers.new(layer)
+        dxfattribs = _get_dxfattribs(layer, color)
+        if kind == LINE:
+            start, end = arguments
+            msp.add_line(start, end, dxfattribs = dxfattribs)
+        elif kind == CIRCLE:
+            center, radius = arguments
+            msp.add_circle(center, radius, dxfattribs = dxfattribs)
+        elif kind == MTEXT:
+            text, location, char_height = arguments
+            mtext = msp.add_mtext(text, dxfattribs = dxfattribs)
+            mtext.set_location(location)
+            if char_height is not None:
+                mtext.dxf.char_height = char_height
+    dwg.saveas(filename)
+    logger.debug(f'saved debug file: {filename}')
+
+
+def wait_for_debug_files():
+    """This function waits until all the saved debug files are written.
+
+    Raises:
+        Exception: The first error which occurred while writing a file.
+    """
+    global _pending_writes
+    pending_writes, _pending_writes = _pending_writes, []
+    for pending_write in pending_writes:
+        pending_write.result()
+
+
+class DebugRecorder:
+    """This class buffers debug primitives and writes them as a DXF file on a background thread.
+
+    Attributes:
+        enabled (bool): Whether anything is recorded at all.
+        dxfversion (str): DXF version of the written files.
+    """
+
+    def __init__(self, enabled: bool = False, dxfversion: str = DEFAULT_DXF_VERSION):
+        self.enabled = enabled
+        self.dxfversion = dxfversion
+        self._primitives: List[tuple] = []
+
+    def __len__(self) -> int:
+        return len(self._primitives)
+
+    def add_line(self, start, end, layer: str = '0', color: int = None):
+        if not self.enabled:
+            return
+        self._primitives.append((LINE, layer, color, tuple(start), tuple(end)))
+
+    def add_lines(self, lines: Iterable, layer: str = '0', color: int = None):
+        """This function adds lines [(x1, y1), (x2, y2)] (graph edges for example)."""
+        if not self.enabled:
+            return
+        self._primitives.extend((LINE, layer, color, tuple(line[0]), tuple(line[1])) for line in lines)
+
+    def add_circle(self, center, radius: float, layer: str = '0', color: int = None):
+        if not self.enabled:
+            return
+        self._primitives.append((CIRCLE, layer, color, tuple(center), radius))
+
+    def add_text(self, text: str, location, layer: str = '0', color: int = None, char_height: float = None):
+        if not self.enabled:
+            return
+        self._primitives.append((MTEXT, layer, color, str(text), tuple(location), char_height))
+
+    def add_location(self, point, name: str = 'debug', radius: float = 2, color: int = 2,
+                     char_height: float = None, layer: str = 'debug'):
+        """This function marks a point with a circle and a label."""
+        if not self.enabled:
+            return
+        self.add_circle(point, radius, layer = layer, color = color)
+        self.add_text(name, point, layer = layer, char_height = char_height)
+
+    def clear(self):
+        self._primitives = []
+
+    def save(self, filename: str, clear: bool = False) -> Optional[Future]:
+        """This function writes the recorded primitives as a DXF file on the background thread.
+
+        Args:
+            filename (str): Path of the DXF file.
+            clear (bool, optional): Whether the buffer is emptied (the next file starts empty). Defaults to False.
+
+        Returns:
+            Optional[Future]: The pending write, or None when the recorder is disabled.
+        """
+        if not self.enabled:
+            return None
+        primitives = tuple(self._primitives)
+        if clear:
+            self.clear()
+        pending_write = _get_writer().submit(write_dxf_file, filename, primitives, self.dxfversion)
+        _pending_writes.append(pending_write)
+        return pending_write
@@ -0,0 +1,105 @@
+"""Degree index of a networkx graph or of a PlanarGraph.
+
+The wall cleaning loop repeatedly asks for the nodes with a given degree and whether a node
+with a degree greater than two is left. Filtering graph.nodes for every such query costs
+O(V). A DegreeIndex wraps the graph and keeps the set of nodes of every degree up to date
+while the graph is modified through it, so a query only costs the size of its answer.
+
+The index exposes the same mutators as nx.Graph (add_edge, add_edges_from, remove_edge,
+remove_edges_from), so it can be passed wherever the graph would be modified. Changes made
+to the graph directly (not through the index) are not seen by the index. The nodes of a
+PlanarGraph are its integer node ids.
+"""
+from typing import Dict, Iterable, List, Set, Union
+
+import networkx as nx
+
+from pillarplus.planar_graph import PlanarGraph
+
+
+class DegreeIndex:
+    """This class keeps the nodes of a graph grouped by their degree.
+
+    Attributes:
+        graph (Union[nx.Graph, PlanarGraph]): The indexed graph.
+    """
+
+    def __init__(self, graph: Union[nx.Graph, PlanarGraph]):
+        self.graph = graph
+        self._is_planar = isinstance(graph, PlanarGraph)
+        # Rank of every node in the node order of the graph, to return the nodes in that order.
+        self._ranks: Dict[tuple, int] = {}
+        self._degrees: Dict[tuple, int] = {}
+        self._nodes_by_degree: Dict[int, Set[tuple]] = {}
+        for node in (range(len(graph)) if self._is_planar else graph.nodes):
+            self._update(node)
+
+    def __len__(self) -> int:
+        return len(self._degrees)
+
+    def _update(self, node):
+        """This function moves the node into the set of its current degree."""
+        if node not in self._ranks:
+            self._ranks[node] = len(self._ranks)
+        old_degree = self._degrees.get(node)
+        # The nodes of a PlanarGraph are never removed:
+        degree = self.graph.degree(node) if self._is_planar or node in self.graph else None
+        if old_degree == degree:
+            return
+        if old_degree is not None:
+            nodes = self._nodes_by_degree[old_degree]
+            nodes.discard(node)
+            if not nodes:
+                del self._nodes_by_degree[old_degree]
+        if degree is None:
+            del self._degrees[node]
+            return
+        self._degrees[node] = degree
+        self._nodes_by_degree.setdefault(degree, set()).add(node)
+
+    # Mutators (same signatures as nx.Graph):
+    def add_edge(self, u, v):
+        self.graph.add_edge(u, v)
+        self._update(u)
+        self._update(v)
+
+    def add_edges_from(self, edges: Iterable):
+        edges = [tuple(edge[:2]) for edge in edges]
+        self.graph.add_edges_from(edges)
+        for u, v in edges:
+            self._update(u)
+            self._update(v)
+
+    def remove_edge(self, u, v):
+        self.graph.remove_edge(u, v)
+        self._update(u)
+        self._update(v)
+
+    def remove_edges_from(self, edges: Iterable):
+        edges = [tuple(edge[:2]) for edge in edges]
+        self.graph.remove_edges_from(edges)
+        for u, v in edges:
+            self._update(u)
+            self._update(v)
+
+    # Queries:
+    def degree(self, node) -> int:
+        return self._degrees[node]
+
+    @property
+    def degrees(self) -> Set[int]:
+        """The degrees which at least one node of the graph has."""
+        return set(self._nodes_by_degree)
+
+    def get_nodes_with_degree(self, degree: int) -> List[tuple]:
+        """This function returns the nodes with the degree, in the node order of the graph."""
+        nodes = self._nodes_by_degree.get(degree, ())
+        return sorted(nodes, key=self._ranks.__getitem__)
+
+    def has_degree_greater_than(self, degree: int) -> bool:
+        """This function returns whether a node with a degree greater than degree exists."""
+        return any(node_degree > degree for node_degree in self._nodes_by_degree)
+
+    def get_node_edge_count(self) -> Dict[int, Set[tuple]]:
+        """This function returns a dict with the set of the nodes of every degree."""
+        return {degree: set(nodes) for degree, nodes in self._nodes_by_degree.items()}
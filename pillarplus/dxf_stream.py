@@ -0,0 +1,228 @@
+"""Streaming extraction of the geometry of a few layers of a DXF file.
+
+Every stage of the pipeline used to load the whole drawing with ezdxf.readfile (the entity
+database of every layer, the blocks, the tables and the objects) only to msp.query the
+LINE and LWPOLYLINE entities of one or two of its layers. The functions of this module read
+the ENTITIES section of the file as a stream of DXF tags (with the same low level loaders
+as ezdxf.addons.iterdxf) and keep only the entities of the layers a stage declares:
+
+    1. The tags of an entity are collected until the next entity starts; entities of other
+       types, of other layers or of the paperspace are dropped without being loaded.
+    2. LINE, LWPOLYLINE and INSERT entities are read straight from their tags into the
+       arrays of a LayerGeometry, so no DXF entity is created for them at all.
+    3. MTEXT entities are loaded by ezdxf (for the decoding of their text), but only the
+       ones on the declared layers.
+
+Only ASCII DXF files are supported, just like by iterdxf.
+
+Example:
+    layer_geometry = read_layers('dxfFilesIn/dxf_files/sample4.dxf', ['PP-WALL'])['PP-WALL']
+    segments = layer_geometry.get_segment_store('PP-WALL')
+"""
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+from pillarplus.segment_store import NO_POLYLINE, SegmentStore, get_oriented_segment, iter_polyline_segments
+
+# Entity types which are read into a LayerGeometry:
+STREAMED_TYPES: Tuple[str, ...] = ('LINE', 'LWPOLYLINE', 'INSERT', 'MTEXT')
+# Value of the flags of a closed LWPOLYLINE (the same check as pillarplus.math.is_polyline_closed):
+CLOSED_POLYLINE_FLAGS: int = 1
+
+
+class LayerGeometry:
+    """This class holds the geometry of the entities of one layer in arrays.
+
+    Attributes:
+        layer (str): Name of the layer.
+        lines (np.ndarray): float64 (N, 4) x1, y1, x2, y2 of every LINE.
+        polyline_points (np.ndarray): float64 (M, 2) the vertices of all the LWPOLYLINEs one after the other.
+        polyline_offsets (np.ndarray): int64 (P + 1,) the vertices of polyline i are polyline_points[offsets[i]:offsets[i + 1]].
+        polyline_flags (np.ndarray): int64 (P,) the flags of every LWPOLYLINE.
+        insert_names (List[str]): Block names of the INSERTs.
+        inserts (np.ndarray): float64 (K, 5) x, y, x_scale, y_scale, rotation (in degrees) of every INSERT.
+        texts (List[str]): Plain texts of the MTEXTs (without the formatting codes).
+        text_points (np.ndarray): float64 (T, 2) insert points of the MTEXTs.
+    """
+
+    def __init__(self, layer: str):
+        self.layer = layer
+        self.lines = np.empty((0, 4), dtype=np.float64)
+        self.polyline_points = np.empty((0, 2), dtype=np.float64)
+        self.polyline_offsets = np.zeros(1, dtype=np.int64)
+        self.polyline_flags = np.empty(0, dtype=np.int64)
+        self.insert_names: List[str] = []
+        self.inserts = np.empty((0, 5), dtype=np.float64)
+        self.texts: List[str] = []
+        self.text_points = np.empty((0, 2), dtype=np.float64)
+
+    def __repr__(self):
+        return f'LayerGeometry<layer:{self.layer}, lines:{len(self.lines)}, polylines:{self.polyline_count}, inserts:{len(self.inserts)}, texts:{len(self.texts)}>'
+
+    @property
+    def polyline_count(self) -> int:
+        return len(self.polyline_flags)
+
+    def get_polyline(self, polyline_id: int) -> np.ndarray:
+        """This function returns the vertices (M, 2) of the polyline."""
+        return self.polyline_points[self.polyline_offsets[polyline_id]:self.polyline_offsets[polyline_id + 1]]
+
+    def is_polyline_closed(self, polyline_id: int) -> bool:
+        return self.polyline_flags[polyline_id] == CLOSED_POLYLINE_FLAGS
+
+    def get_lines(self) -> List[List[tuple]]:
+        """This function returns the LINEs as lines [(x1, y1), (x2, y2)]."""
+        return [[(x1, y1), (x2, y2)] for x1, y1, x2, y2 in self.lines.tolist()]
+
+    def get_segment_store(self, layer_name: str = None) -> SegmentStore:
+        """This function returns the segments of the polylines and of the lines of the layer.
+
+        The segments are added in the same way (and order) as centre_lines.get_lines adds the
+        LWPOLYLINEs and the LINEs of a queried layer, and are sorted on their coordinates.
+        """
+        layer_name = self.layer if layer_name is None else layer_name
+        segments = SegmentStore(len(self.lines) + len(self.polyline_points))
+        for polyline_id in range(self.polyline_count):
+            points = [(x, y) for x, y in self.get_polyline(polyline_id).tolist()]
+            for start, end, _, flags in iter_polyline_segments(points, polyline_id, self.is_polyline_closed(polyline_id)):
+                segments.add(start, end, polyline_id, layer_name, flags)
+        for start, end in self.get_lines():
+            start, end, flags = get_oriented_segment(start, end)
+            segments.add(start, end, NO_POLYLINE, layer_name, flags)
+        segments.sort()
+        return segments
+
+
+class _LayerGeometryBuilder:
+    """Plain lists which the entities are read into before they become the arrays of a LayerGeometry."""
+
+    def __init__(self, layer: str):
+        self.layer = layer
+        self.lines = []
+        self.polyline_points = []
+        self.polyline_offsets = [0]
+        self.polyline_flags = []
+        self.insert_names = []
+        self.inserts = []
+        self.texts = []
+        self.text_points = []
+
+    def add(self, dxftype: str, tags: list):
+        if dxftype == 'LINE':
+            start, end = _get_value(tags, 10, (0, 0)), _get_value(tags, 11, (0, 0))
+            self.lines.append((start[0], start[1], end[0], end[1]))
+        elif dxftype == 'LWPOLYLINE':
+            self.polyline_points.extend((tag.value[0], tag.value[1]) for tag in tags if tag.code == 10)
+            self.polyline_offsets.append(len(self.polyline_points))
+            self.polyline_flags.append(_get_value(tags, 70, 0))
+        elif dxftype == 'INSERT':
+            insert = _get_value(tags, 10, (0, 0))
+            self.insert_names.append(_get_value(tags, 2, ''))
+            self.inserts.append(
+                (insert[0], insert[1], _get_value(tags, 41, 1.0), _get_value(tags, 42, 1.0), _get_value(tags, 50, 0.0)))
+        elif dxftype == 'MTEXT':
+            mtext = _load_entity(tags)
+            self.texts.append(mtext.plain_text())
+            self.text_points.append(tuple(mtext.dxf.insert)[:2])
+
+    def build(self) -> LayerGeometry:
+        layer_geometry = LayerGeometry(self.layer)
+        if self.lines:
+            layer_geometry.lines = np.array(self.lines, dtype=np.float64)
+        if self.polyline_points:
+            layer_geometry.polyline_points = np.array(self.polyline_points, dtype=np.float64)
+        layer_geometry.polyline_offsets = np.array(self.polyline_offsets, dtype=np.int64)
+        layer_geometry.polyline_flags = np.array(self.polyline_flags, dtype=np.int64)
+        layer_geometry.insert_names = self.insert_names
+        if self.inserts:
+            layer_geometry.inserts = np.array(self.inserts, dtype=np.float64)
+        layer_geometry.texts = self.texts
+        if self.text_points:
+            layer_geometry.text_points = np.array(self.text_points, dtype=np.float64)
+        return layer_geometry
+
+
+def _get_value(tags: list, code: int, default=None):
+    """The value of the first tag with the group code (the tags of an entity are short)."""
+    for tag in tags:
+        if tag.code == code:
+            return tag.value
+    return default
+
+
+def _load_entity(tags: list):
+    from ezdxf.entities import factory
+    from ezdxf.lldxf.extendedtags import ExtendedTags
+    return factory.load(ExtendedTags(tags))
+
+
+def iter_entity_tags(filename: str, layers: Iterable[str], types: Iterable[str] = STREAMED_TYPES,
+                     errors: str = 'surrogateescape') -> Iterator[Tuple[str, str, list]]:
+    """This generator yields the modelspace entities of the layers as (dxftype, layer, tags).
+
+    Args:
+        filename (str): Path of an ASCII DXF file.
+        layers (Iterable[str]): Names of the layers whose entities are yielded.
+        types (Iterable[str], optional): DXF types of the yielded entities. Defaults to STREAMED_TYPES.
+        errors (str, optional): Decoding error handler of the file. Defaults to 'surrogateescape'.
+
+    Raises:
+        DXFStructureError: For an invalid DXF file.
+    """
+    from ezdxf.addons.iterdxf import dxf_file_info
+    from ezdxf.lldxf.tagger import ascii_tags_loader, tag_compiler
+
+    layers, types = set(layers), set(types)
+
+    def get_entity(tags: list):
+        """The dxftype and layer of the collected tags, if the entity is requested."""
+        if not tags or tags[0].value not in types:
+            return None
+        layer, paperspace = None, 0
+        for tag in tags:
+            if tag.code == 8:
+                layer = tag.value
+            elif tag.code == 67:
+                paperspace = tag.value
+        if layer not in layers or paperspace != 0:
+            return None
+        return tags[0].value, layer
+
+    info = dxf_file_info(filename)
+    with open(filename, mode='rt', encoding=info.encoding, errors=errors) as fp:
+        in_entities, previous_tag = False, None
+        tags = []
+        for tag in tag_compiler(ascii_tags_loader(fp)):
+            if not in_entities:
+                if tag.code == 2 and previous_tag is not None and previous_tag == (0, 'SECTION'):
+                    in_entities = tag.value == 'ENTITIES'
+                previous_tag = (tag.code, tag.value)
+                continue
+            if tag.code == 0:
+                entity = get_entity(tags)
+                if entity is not None:
+                    yield entity[0], entity[1], tags
+                if tag.value == 'ENDSEC':
+                    return
+                tags = [tag]
+            else:
+                tags.append(tag)
+
+
+def read_layers(filename: str, layers: Iterable[str], types: Iterable[str] = STREAMED_TYPES) -> Dict[str, LayerGeometry]:
+    """This function reads the geometry of the modelspace entities of the layers from a DXF file.
+
+    Args:
+        filename (str): Path of an ASCII DXF file.
+        layers (Iterable[str]): Names of the layers (every layer gets a LayerGeometry, also when it is empty).
+        types (Iterable[str], optional): DXF types which are read. Defaults to STREAMED_TYPES.
+
+    Returns:
+        Dict[str, LayerGeometry]: The geometry of every layer.
+    """
+    layers = list(layers)
+    builders = {layer: _LayerGeometryBuilder(layer) for layer in layers}
+    for dxftype, layer, tags in iter_entity_tags(filename, layers, types):
+        builders[layer].add(dxftype, tags)
+    return {layer: builder.build() for layer, builder in builders.items()}
@@ -0,0 +1,178 @@
+"""On-disk cache of the derived geometry of the pipeline stages.
+
+A drawing is processed again and again while parameters.csv or the identification JSON are
+tweaked, and every run used to detect the centre lines, clean the wall graph and find the
+rooms from scratch, although their inputs did not change. A GeometryCache keeps the output
+of these stages on disk:
+
+    1. The key of an entry is a SHA-256 hash of the stage, of the input geometry of the stage
+       (arrays, with the Python ints kept apart from the floats, as a node (1, 2) is printed
+       and drawn differently from a node (1.0, 2.0)) and of the parameters of the stage.
+    2. An entry is a compressed .npz file of plain arrays (no pickles), so it can be loaded
+       with allow_pickle=False. encode_graph and decode_graph turn a networkx graph into such
+       arrays and back, with the very same node and adjacency order.
+    3. The cache is bounded in size: a hit touches the modification time of its file and
+       after every store the least recently used files are removed until the cache fits.
+
+Example:
+    cache = GeometryCache('dxfFilesOut/geometry_cache')
+    key = cache.get_key('centre_lines', {'segments': coordinates}, {'maximum_distance': 500})
+    arrays = cache.load(key)
+    if arrays is None:
+        cache.save(key, {'start_points': start_points, ...})
+"""
+import hashlib
+import json
+import os
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+
+from pillarplus.planar_graph import PlanarGraph
+
+# Part of every key, so that the entries of an older format are not loaded:
+CACHE_VERSION: int = 2
+DEFAULT_CACHE_DIRECTORY: str = '.geometry_cache'
+DEFAULT_MAXIMUM_SIZE: int = 256 * 1024 * 1024  # bytes
+CACHE_FILE_EXTENSION: str = '.npz'
+
+
+def get_coordinate_arrays(values) -> Tuple[np.ndarray, np.ndarray]:
+    """This function returns the (nested, not ragged) coordinates as float64 values and a mask of the Python ints.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The values and the mask (of the same shape) of the ints among them.
+    """
+    objects = np.empty(np.shape(values), dtype=object) if len(values) == 0 else np.array(values, dtype=object)
+    is_int = np.frompyfunc(lambda value: isinstance(value, int) and not isinstance(value, bool), 1, 1)
+    return np.asarray(values, dtype=np.float64).reshape(objects.shape), is_int(objects).astype(bool)
+
+
+def get_coordinates(values: np.ndarray, integer_mask: np.ndarray) -> list:
+    """This function returns the coordinates of get_coordinate_arrays as nested lists of Python floats and ints."""
+    objects = np.array(values.tolist(), dtype=object).reshape(values.shape)
+    objects[integer_mask] = [int(value) for value in values[integer_mask].tolist()]
+    return objects.tolist()
+
+
+def encode_graph(graph: nx.Graph, prefix: str = 'graph_') -> Dict[str, np.ndarray]:
+    """This function returns the nodes (2D points) and the edges of the graph as arrays.
+
+    The edges are stored in an order which reproduces the adjacency order of every node
+    (PlanarGraph.get_edge_insertion_order). The edge attributes and the graph attributes are not encoded.
+
+    Raises:
+        ValueError: When an edge of the graph has attributes.
+    """
+    if any(data for _, _, data in graph.edges(data = True)):
+        raise ValueError('The edge attributes of the graph are not encoded.')
+    # The node ids of a PlanarGraph are the positions of the nodes in the graph:
+    planar_graph = PlanarGraph.from_networkx(graph)
+    node_values, node_integer_mask = get_coordinate_arrays(planar_graph.nodes)
+    edges = np.array(planar_graph.get_edge_insertion_order(), dtype=np.int64).reshape(-1, 2)
+    return {f'{prefix}nodes': node_values.reshape(-1, 2), f'{prefix}node_integer_mask': node_integer_mask.reshape(-1, 2),
+            f'{prefix}edges': edges}
+
+
+def decode_graph(arrays: Dict[str, np.ndarray], prefix: str = 'graph_', **graph_attributes) -> nx.Graph:
+    """This function returns the graph of encode_graph (with the same node and adjacency order)."""
+    nodes = [tuple(node) for node in get_coordinates(arrays[f'{prefix}nodes'], arrays[f'{prefix}node_integer_mask'])]
+    graph = nx.Graph(**graph_attributes)
+    graph.add_nodes_from(nodes)
+    graph.add_edges_from((nodes[u], nodes[v]) for u, v in arrays[f'{prefix}edges'].tolist())
+    return graph
+
+
+class GeometryCache:
+    """This class stores the arrays of the stage outputs in a size-bounded directory of .npz files.
+
+    Attributes:
+        directory (str): Directory of the cache files.
+        maximum_size (int): Maximum total size of the cache files in bytes.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIRECTORY, maximum_size: int = DEFAULT_MAXIMUM_SIZE):
+        self.directory = directory
+        self.maximum_size = maximum_size
+        os.makedirs(directory, exist_ok = True)
+
+    def __repr__(self):
+        return f'GeometryCache<directory:{self.directory}, maximum_size:{self.maximum_size}>'
+
+    def get_key(self, stage: str, arrays: Dict[str, np.ndarray], parameters: dict = None) -> str:
+        """This function returns the key of the output of the stage for the input arrays and parameters.
+
+        Args:
+            stage (str): Name of the stage.
+            arrays (Dict[str, np.ndarray]): Input geometry of the stage.
+            parameters (dict, optional): Parameters of the stage (JSON serializable). Defaults to None.
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps([CACHE_VERSION, stage, parameters or {}], sort_keys = True, default = str).encode())
+        for name in sorted(arrays):
+            array = np.ascontiguousarray(arrays[name])
+            digest.update(f'{name}:{array.dtype.str}:{array.shape}'.encode())
+            digest.update(array.tobytes())
+        return f'{stage}_{digest.hexdigest()}'
+
+    def get_path(self, key: str) -> str:
+        return os.path.join(self.directory, key + CACHE_FILE_EXTENSION)
+
+    def load(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        """This function returns the arrays stored under the key, or None if there are none."""
+        path = self.get_path(key)
+        try:
+            with np.load(path, allow_pickle = False) as npz_file:
+                arrays = {name: npz_file[name] for name in npz_file.files}
+        except (OSError, ValueError):
+            return None
+        # The entry is now the most recently used one:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return arrays
+
+    def save(self, key: str, arrays: Dict[str, np.ndarray]):
+        """This function stores the arrays under the key and evicts the least recently used entries if needed."""
+        file_descriptor, temporary_path = tempfile.mkstemp(suffix = '.tmp', dir = self.directory)
+        try:
+            with os.fdopen(file_descriptor, 'wb') as npz_file:
+                np.savez_compressed(npz_file, **arrays)
+            # Readers never see a partly written entry:
+            os.replace(temporary_path, self.get_path(key))
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+        self.evict()
+
+    def get_entries(self) -> List[Tuple[float, int, str]]:
+        """This function returns the (last use, size, path) of every entry, the least recently used first."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(CACHE_FILE_EXTENSION):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(entries)
+
+    def get_size(self) -> int:
+        return sum(size for _, size, _ in self.get_entries())
+
+    def evict(self):
+        """This function removes the least recently used entries until the cache is not larger than its maximum size."""
+        entries = self.get_entries()
+        size = sum(size for _, size, _ in entries)
+        for _, entry_size, path in entries:
+            if size <= self.maximum_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+
+    def clear(self):
+        for _, _, path in self.get_entries():
+            os.remove(path)
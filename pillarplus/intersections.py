@@ -0,0 +1,227 @@
+"""All-pairs segment intersection engine.
+
+pillarplus.math only has pairwise predicates (doIntersect, inter, orient), so finding all
+the crossings in a layer needs an O(n^2) double loop. This module reports every pair of
+intersecting segments (and their intersection points) for a whole list of segments.
+
+Algorithm:
+    1. Register every segment in the cells of a uniform grid that its bounding box covers.
+       The cell size is taken from the typical segment size so that every cell holds only
+       a few segments.
+    2. Only segments sharing a cell are candidate pairs. A pair is tested in exactly one
+       cell: the one which contains the lower-left corner of the overlap of their bounding
+       boxes, so no pair is reported twice.
+    3. Candidates are checked with the same orientation test as doIntersect, vectorized
+       with NumPy, and crossing pairs get their point from the closed-form formula of
+       find_intersection_point.
+
+For drawings whose segments are spread over the plan (walls, pipes, ducts) this runs in
+expected O(n log n + k) time where k is the number of intersecting pairs.
+"""
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+
+from pillarplus.batch_math import as_segments
+
+# Modes of get_segment_intersections:
+ALL = 'all'
+COUNT = 'count'
+FIRST = 'first'
+
+# Upper bound of (segment, cell) registrations per segment on average before the cells are grown.
+MAXIMUM_CELLS_PER_SEGMENT: int = 16
+
+
+def _get_cell_size(segments: np.ndarray) -> float:
+    """This function returns the size of a grid cell for the segments.
+
+    The cell size is the median of the larger side of the bounding boxes, so that a typical
+    segment covers only a few cells, but it is never smaller than what is required to fit
+    the whole extent in about n cells.
+    """
+    widths = np.abs(segments[:, 2] - segments[:, 0])
+    heights = np.abs(segments[:, 3] - segments[:, 1])
+    cell_size = float(np.median(np.maximum(widths, heights)))
+    extent_width = segments[:, [0, 2]].max() - segments[:, [0, 2]].min()
+    extent_height = segments[:, [1, 3]].max() - segments[:, [1, 3]].min()
+    minimum_cell_size = max(extent_width, extent_height) / max(np.sqrt(len(segments)), 1.0)
+    cell_size = max(cell_size, minimum_cell_size)
+    return cell_size if cell_size > 0 else 1.0
+
+
+def _orientations(px, py, qx, qy, rx, ry) -> np.ndarray:
+    """Vectorized version of pillarplus.math.orientation: 0 collinear, 1 clockwise, 2 anti-clockwise."""
+    value = (qy - py) * (rx - qx) - (qx - px) * (ry - qy)
+    return np.where(value > 0, 1, np.where(value < 0, 2, 0))
+
+
+def _on_segments(px, py, qx, qy, rx, ry) -> np.ndarray:
+    """Vectorized version of pillarplus.math.onSegment: q lies in the bounding box of p-r."""
+    return ((qx <= np.maximum(px, rx)) & (qx >= np.minimum(px, rx)) &
+            (qy <= np.maximum(py, ry)) & (qy >= np.minimum(py, ry)))
+
+
+def _do_intersect(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """Vectorized version of pillarplus.math.doIntersect for pairs of segments."""
+    p1x, p1y, q1x, q1y = first[:, 0], first[:, 1], first[:, 2], first[:, 3]
+    p2x, p2y, q2x, q2y = second[:, 0], second[:, 1], second[:, 2], second[:, 3]
+    o1 = _orientations(p1x, p1y, q1x, q1y, p2x, p2y)
+    o2 = _orientations(p1x, p1y, q1x, q1y, q2x, q2y)
+    o3 = _orientations(p2x, p2y, q2x, q2y, p1x, p1y)
+    o4 = _orientations(p2x, p2y, q2x, q2y, q1x, q1y)
+    return (((o1 != o2) & (o3 != o4)) |
+            ((o1 == 0) & _on_segments(p1x, p1y, p2x, p2y, q1x, q1y)) |
+            ((o2 == 0) & _on_segments(p1x, p1y, q2x, q2y, q1x, q1y)) |
+            ((o3 == 0) & _on_segments(p2x, p2y, p1x, p1y, q2x, q2y)) |
+            ((o4 == 0) & _on_segments(p2x, p2y, q1x, q1y, q2x, q2y)))
+
+
+def _get_intersection_points(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """Closed-form intersection points for pairs of segments (NaN for parallel pairs)."""
+    x1, y1, x2, y2 = first[:, 0], first[:, 1], first[:, 2], first[:, 3]
+    x3, y3, x4, y4 = second[:, 0], second[:, 1], second[:, 2], second[:, 3]
+    xdiff1, ydiff1 = x1 - x2, y1 - y2
+    xdiff2, ydiff2 = x3 - x4, y3 - y4
+    div = xdiff1 * ydiff2 - ydiff1 * xdiff2
+    d1 = x1 * y2 - y1 * x2
+    d2 = x3 * y4 - y3 * x4
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = np.where(div == 0, np.nan, (d1 * xdiff2 - xdiff1 * d2) / div)
+        y = np.where(div == 0, np.nan, (d1 * ydiff2 - ydiff1 * d2) / div)
+    return np.stack((x, y), axis=1)
+
+
+def _is_touching_only(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """Pairs which are not collinear and only share one of their end points."""
+    shares_end_point = np.zeros(len(first), dtype=bool)
+    for a in (0, 2):
+        for b in (0, 2):
+            shares_end_point |= (first[:, a] == second[:, b]) & (first[:, a + 1] == second[:, b + 1])
+    div = ((first[:, 0] - first[:, 2]) * (second[:, 1] - second[:, 3]) -
+           (first[:, 1] - first[:, 3]) * (second[:, 0] - second[:, 2]))
+    return shares_end_point & (div != 0)
+
+
+def _iterate_candidate_pairs(segments: np.ndarray):
+    """This generator yields arrays (i, j) of candidate pairs, cell-offset by cell-offset.
+
+    Every candidate pair is yielded exactly once with i < j, and its bounding boxes overlap.
+    """
+    minimum_x = np.minimum(segments[:, 0], segments[:, 2])
+    maximum_x = np.maximum(segments[:, 0], segments[:, 2])
+    minimum_y = np.minimum(segments[:, 1], segments[:, 3])
+    maximum_y = np.maximum(segments[:, 1], segments[:, 3])
+    origin_x, origin_y = minimum_x.min(), minimum_y.min()
+
+    cell_size = _get_cell_size(segments)
+    while True:
+        column_start = ((minimum_x - origin_x) // cell_size).astype(np.int64)
+        column_end = ((maximum_x - origin_x) // cell_size).astype(np.int64)
+        row_start = ((minimum_y - origin_y) // cell_size).astype(np.int64)
+        row_end = ((maximum_y - origin_y) // cell_size).astype(np.int64)
+        columns = column_end - column_start + 1
+        rows = row_end - row_start + 1
+        cell_counts = columns * rows
+        if cell_counts.sum() <= MAXIMUM_CELLS_PER_SEGMENT * len(segments):
+            break
+        cell_size *= 2
+
+    # 1. Register every segment in all the cells of its bounding box.
+    segment_ids = np.repeat(np.arange(len(segments)), cell_counts)
+    offsets = np.arange(cell_counts.sum()) - np.repeat(np.cumsum(cell_counts) - cell_counts, cell_counts)
+    cell_columns = column_start[segment_ids] + offsets // rows[segment_ids]
+    cell_rows = row_start[segment_ids] + offsets % rows[segment_ids]
+    number_of_rows = int(row_end.max()) + 1
+    cell_keys = cell_columns * number_of_rows + cell_rows
+
+    order = np.lexsort((segment_ids, cell_keys))
+    cell_keys, segment_ids = cell_keys[order], segment_ids[order]
+
+    # Position of each registration inside its cell and the size of its cell
+    group_starts = np.flatnonzero(np.r_[True, cell_keys[1:] != cell_keys[:-1]])
+    group_sizes = np.diff(np.r_[group_starts, len(cell_keys)])
+    positions = np.arange(len(cell_keys)) - np.repeat(group_starts, group_sizes)
+    sizes = np.repeat(group_sizes, group_sizes)
+
+    # 2. Pair every registration with the ones after it in the same cell.
+    candidates = np.flatnonzero(sizes > 1)
+    offset = 1
+    while len(candidates) > 0:
+        candidates = candidates[positions[candidates] + offset < sizes[candidates]]
+        if len(candidates) == 0:
+            break
+        i, j = segment_ids[candidates], segment_ids[candidates + offset]
+        offset += 1
+
+        # The bounding boxes should overlap:
+        overlap = ((minimum_x[i] <= maximum_x[j]) & (minimum_x[j] <= maximum_x[i]) &
+                   (minimum_y[i] <= maximum_y[j]) & (minimum_y[j] <= maximum_y[i]))
+        # and the pair is only tested in the cell of the lower-left corner of the overlap:
+        keys = cell_keys[candidates]
+        reference_column = ((np.maximum(minimum_x[i], minimum_x[j]) - origin_x) // cell_size).astype(np.int64)
+        reference_row = ((np.maximum(minimum_y[i], minimum_y[j]) - origin_y) // cell_size).astype(np.int64)
+        is_reference_cell = reference_column * number_of_rows + reference_row == keys
+        selected = overlap & is_reference_cell
+        if selected.any():
+            yield i[selected], j[selected]
+
+
+def get_segment_intersections(segments, mode: str = ALL, include_touching: bool = True
+                              ) -> Union[List[Tuple[int, int, Optional[tuple]]], int, Optional[Tuple[int, int, Optional[tuple]]]]:
+    """This function finds all the pairs of intersecting segments.
+
+    Segments intersect just like in pillarplus.math.doIntersect, which means that segments
+    touching at an end point or overlapping collinear segments are reported as well.
+
+    Args:
+        segments: List of lines [(x1, y1), (x2, y2)] or an array of shape (N, 4).
+        mode (str, optional): One of:
+            ALL: return all the intersecting pairs.
+            COUNT: return only the number of intersecting pairs.
+            FIRST: return the first intersecting pair found (for clash checks) or None.
+            Defaults to ALL.
+        include_touching (bool, optional): Whether the pairs which only share an end point
+            (like two walls meeting at a corner) are reported. Defaults to True.
+
+    Returns:
+        ALL: List of (i, j, point) sorted on (i, j) where i < j are indices of the segments and
+            point is the (x, y) intersection point, or None for collinear overlapping segments.
+        COUNT: int
+        FIRST: (i, j, point) or None.
+    """
+    if mode not in (ALL, COUNT, FIRST):
+        raise ValueError(f'mode should be one of {(ALL, COUNT, FIRST)} but got: {mode}.')
+
+    segments = as_segments(segments) if len(segments) > 0 else np.empty((0, 4))
+    first_indices, second_indices, count = [], [], 0
+    if len(segments) > 1:
+        for i, j in _iterate_candidate_pairs(segments):
+            intersecting = _do_intersect(segments[i], segments[j])
+            if not include_touching:
+                intersecting &= ~_is_touching_only(segments[i], segments[j])
+            i, j = i[intersecting], j[intersecting]
+            if len(i) == 0:
+                continue
+            if mode == FIRST:
+                first_indices, second_indices = [i[:1]], [j[:1]]
+                break
+            count += len(i)
+            if mode == ALL:
+                first_indices.append(i)
+                second_indices.append(j)
+
+    if mode == COUNT:
+        return count
+    if len(first_indices) == 0:
+        return None if mode == FIRST else []
+
+    first_indices, second_indices = np.concatenate(first_indices), np.concatenate(second_indices)
+    order = np.lexsort((second_indices, first_indices))
+    first_indices, second_indices = first_indices[order], second_indices[order]
+    points = _get_intersection_points(segments[first_indices], segments[second_indices])
+
+    intersections = [
+        (int(i), int(j), None if np.isnan(point[0]) else (float(point[0]), float(point[1])))
+        for i, j, point in zip(first_indices, second_indices, points)]
+    return intersections[0] if mode == FIRST else intersections
@@ -3,12 +3,12 @@
 # Remove * import
 
 from math import *
-import sympy as sp
 from ezdxf.math import Vector
 from typing import List
 import ezdxf
 from ezdxf.math.vector import Vec2
 import shapely.geometry
+from pillarplus.spatial_index import LineIndex, PointIndex
 
 # angle in radians
 
@@ -25,6 +25,18 @@ def is_between(point, line_start, line_end):
     return round(find_distance(line_start, point) + find_distance(point, line_end), 5) == round(find_distance(line_start, line_end), 5)
 
 
+def get_on_line_distance(line_length: float) -> float:
+    """This function returns the distance from a line within which is_between can accept a point.
+
+    is_between rounds to 5 decimals, so a point at the distance h from the middle of a line of the
+    length L (which adds about 2 * h**2 / L to the sum of the distances) can still be on it.
+
+    Args:
+        line_length (float): Length of the longest line which is checked.
+    """
+    return (line_length * 1e-5)**0.5 + 1e-5
+
+
 def find_distance(p1, p2):
     distance = ((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)**0.5
     return distance
@@ -63,34 +75,62 @@ def find_perpendicular_point(center, line_start, line_end):
     return(x4, y4)
 
 
-def find_intersection_point(s1, e1, s2, e2):
-    p1, p2, p3, p4 = sp.Point(s1), sp.Point(e1), sp.Point(s2), sp.Point(e2)
-    l1 = sp.Line(p1, p2)
-    l2 = sp.Line(p3, p4)
-    intersection_point = l1.intersection(l2)
-    return (intersection_point[0].x, intersection_point[0].y)
+def find_intersection_point(s1, e1, s2, e2, exact: bool = False, tolerance: float = 1e-9):
+    """This function returns the intersection point of the (infinite) lines s1-e1 and s2-e2.
 
-# returns tan(theta) value
-def find_intersection_point_1(s1,e1,s2,e2):
-    # find intersection forcefully 
-    line1 = (s1,e1)
-    line2 = (s2,e2)
-    xdiff = (line1[0][0] - line1[1][0], line2[0][0] - line2[1][0])
-    ydiff = (line1[0][1] - line1[1][1], line2[0][1] - line2[1][1])
+    The point is found with the closed-form determinant formula in floats. Only when the
+    lines are parallel or nearly parallel (the determinant is within tolerance relative to
+    the lengths of both lines) and exact is True, the intersection is recomputed in exact
+    rational arithmetic with sympy, which is imported only in that case.
 
-    def det(a, b):
-        return a[0] * b[1] - a[1] * b[0]
+    Args:
+        s1, e1 (tuple): Start and end points of the first line.
+        s2, e2 (tuple): Start and end points of the second line.
+        exact (bool, optional): Resolve near-parallel lines exactly. Defaults to False.
+        tolerance (float, optional): Relative tolerance for near-parallel lines. Defaults to 1e-9.
 
-    div = det(xdiff, ydiff)
+    Returns:
+        tuple: Intersection point (x, y) or None if the lines are parallel or coincident.
+    """
+    x1, y1, x2, y2 = s1[0], s1[1], e1[0], e1[1]
+    x3, y3, x4, y4 = s2[0], s2[1], e2[0], e2[1]
+    xdiff1, ydiff1 = x1 - x2, y1 - y2
+    xdiff2, ydiff2 = x3 - x4, y3 - y4
+    div = xdiff1 * ydiff2 - ydiff1 * xdiff2
+
+    # |div| is |line1| * |line2| * sin(angle), so the tolerance is on the sine of the angle between the lines:
+    near_parallel = abs(div) <= tolerance * hypot(xdiff1, ydiff1) * hypot(xdiff2, ydiff2)
+    if near_parallel and exact:
+        return _find_exact_intersection_point(s1, e1, s2, e2)
     if div == 0:
-        return False
+        return None
 
-    d = (det(*line1), det(*line2))
-    x = det(d, xdiff) / div
-    y = det(d, ydiff) / div
+    d1 = x1 * y2 - y1 * x2
+    d2 = x3 * y4 - y3 * x4
+    x = (d1 * xdiff2 - xdiff1 * d2) / div
+    y = (d1 * ydiff2 - ydiff1 * d2) / div
     return (x, y)
 
 
+def _find_exact_intersection_point(s1, e1, s2, e2):
+    """Exact rational version of find_intersection_point for degenerate or near-parallel lines."""
+    import sympy as sp
+    p1, p2, p3, p4 = (sp.Point(sp.Rational(point[0]), sp.Rational(point[1])) for point in (s1, e1, s2, e2))
+    if p1 == p2 or p3 == p4:
+        return None
+    intersection = sp.Line(p1, p2).intersection(sp.Line(p3, p4))
+    if len(intersection) != 1 or not isinstance(intersection[0], sp.Point):
+        return None
+    return (float(intersection[0].x), float(intersection[0].y))
+
+# returns tan(theta) value
+def find_intersection_point_1(s1,e1,s2,e2):
+    # find intersection forcefully 
+    intersection_point = find_intersection_point(s1, e1, s2, e2)
+    if intersection_point is None:
+        return False
+    return intersection_point
+
 
 def find_slope(start, end):
     x1, y1 = start[0], start[1]
@@ -391,6 +431,9 @@ def check_unnecessary_points_on_polyline(rooms_dict_list):
 def get_nearest_points_from_a_point(point: tuple, points: List[tuple]) -> List[tuple]:
     """This function takes in a point and a list of points as input and returns the nearest points sorted.
 
+    NOTE: This is a thin wrapper which builds a PointIndex for a single query. Callers that query
+    the same points many times should build a pillarplus.spatial_index.PointIndex once instead.
+
     Complexity:
         O(nlog(n)) where is n is the number of points.
 
@@ -401,23 +444,15 @@ def get_nearest_points_from_a_point(point: tuple, points: List[tuple]) -> List[t
     Returns:
         List[tuple]: Returns a list of point sorted in that order of nearest euclidean distance.
     """
-    import copy
-    list_of_points = copy.deepcopy(points)
-        
-    distance_cache = {}
-    def point_comparator(p):
-        if p in distance_cache.keys():
-            return distance_cache[p]
-        distance_cache[p] = find_distance(point, p)
-        return distance_cache[p]
-
-    list_of_points.sort(key = point_comparator)
-    
-    return list_of_points
+    point_index = PointIndex(points)
+    return point_index.nearest(point, k=len(point_index))
 
 def get_nearest_lines_from_a_point(point: tuple, lines: List[tuple]) -> List[tuple]:
     """This function takes in a point and a list of lines as input and returns the nearest lines sorted.
 
+    NOTE: This is a thin wrapper which builds a LineIndex for a single query. Callers that query
+    the same lines many times should build a pillarplus.spatial_index.LineIndex once instead.
+
     Complexity:
         O(nlog(n)) where is n is the number of lines.
 
@@ -428,22 +463,8 @@ def get_nearest_lines_from_a_point(point: tuple, lines: List[tuple]) -> List[tup
     Returns:
         List[tuple]: Returns a list of point sorted in that order of nearest euclidean distance.
     """
-    import copy
-    list_of_lines = copy.deepcopy(lines)
-    
-    point_object = shapely.geometry.Point(point)
-        
-    distance_cache = {}
-    def line_comparator(line):
-        if line in distance_cache.keys():
-            return distance_cache[line]
-        line_object = shapely.geometry.LineString(line)
-        distance_cache[line] = point_object.distance(line_object)
-        return distance_cache[line]
-
-    list_of_lines.sort(key = line_comparator)
-    
-    return list_of_lines
+    line_index = LineIndex(lines)
+    return line_index.nearest(point, k=len(line_index))
 
 
 def is_points_close(point1, point2, conversion_factor: float = 1.0):
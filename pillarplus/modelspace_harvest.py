@@ -0,0 +1,107 @@
+"""Entities of a modelspace sorted into per-layer, per-type buckets in a single walk.
+
+A run used to query the same modelspace once for every stage: the LWPOLYLINEs and the LINEs
+of the centre line layer, the LINEs of the wall layer, the LWPOLYLINEs of the column layer,
+the MTEXTs of the room text layer and the INSERTs of the blocks. Every msp.query walks all
+the entities of the modelspace. A ModelspaceHarvest walks them once:
+
+    1. Every entity of a harvested type (and layer) is appended to the bucket of its
+       (layer, dxftype), in the order of the modelspace, so a bucket holds the same
+       entities in the same order as msp.query(f'{dxftype}[layer=="{layer}"]').
+    2. In the same pass the LWPOLYLINEs and the LINEs are exploded into segments, the
+       closing segment of a closed polyline included, exactly as centre_lines.get_lines
+       does. get_segments builds a new SegmentStore of a layer from them on every call,
+       so a stage can sort or modify its store without affecting the other stages.
+
+Example:
+    harvest = ModelspaceHarvest(msp)
+    segments = harvest.get_segments('PP-WALL')
+    room_texts = harvest.get_entities('MTEXT', 'PP-ROOM Text')
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from pillarplus.math import is_polyline_closed
+from pillarplus.segment_store import NO_POLYLINE, SegmentStore, get_oriented_segment, iter_polyline_segments
+
+# Entity types which are harvested by default:
+HARVESTED_TYPES: Tuple[str, ...] = ('LINE', 'LWPOLYLINE', 'MTEXT', 'INSERT')
+
+
+class ModelspaceHarvest:
+    """This class holds the entities of a modelspace in per-layer, per-type buckets.
+
+    Attributes:
+        layers (set): Harvested layers, or None for all of them.
+        types (set): Harvested entity types.
+    """
+
+    def __init__(self, msp, layers: Iterable[str] = None, types: Iterable[str] = HARVESTED_TYPES):
+        self.layers = None if layers is None else set(layers)
+        self.types = set(types)
+        self._entities: Dict[Tuple[str, str], list] = defaultdict(list)
+        # Segments (start, end, polyline_id, flags) of the polylines and of the lines of every layer:
+        self._polyline_segments: Dict[str, List[tuple]] = defaultdict(list)
+        self._line_segments: Dict[str, List[tuple]] = defaultdict(list)
+        self._harvest(msp)
+
+    def __repr__(self):
+        return f'ModelspaceHarvest<buckets:{len(self._entities)}, entities:{sum(map(len, self._entities.values()))}>'
+
+    def _harvest(self, msp):
+        for entity in msp:
+            dxftype = entity.dxftype()
+            if dxftype not in self.types:
+                continue
+            layer = entity.dxf.layer
+            if self.layers is not None and layer not in self.layers:
+                continue
+            self._entities[(layer, dxftype)].append(entity)
+            if dxftype == 'LWPOLYLINE':
+                self._add_polyline_segments(entity, layer)
+            elif dxftype == 'LINE':
+                self._add_line_segment(entity, layer)
+
+    def _add_polyline_segments(self, polyline, layer: str):
+        # The polylines of a layer are numbered in the order of the modelspace, as in get_lines:
+        polyline_id = len(self._entities[(layer, 'LWPOLYLINE')]) - 1
+        points = [(point[0], point[1]) for point in polyline]
+        self._polyline_segments[layer].extend(iter_polyline_segments(points, polyline_id, is_polyline_closed(polyline)))
+
+    def _add_line_segment(self, line, layer: str):
+        try:
+            x1, y1, z1 = line.dxf.start
+            x2, y2, z2 = line.dxf.end
+        except Exception as e:
+            print(f'Exception occured while reading line: {e}')
+            return
+        start, end, flags = get_oriented_segment((x1, y1), (x2, y2))
+        self._line_segments[layer].append((start, end, NO_POLYLINE, flags))
+
+    def get_entities(self, dxftype: str, layer: str) -> list:
+        """This function returns the entities of the type on the layer, in the order of the modelspace.
+
+        Raises:
+            ValueError: When the type or the layer was not harvested.
+        """
+        if dxftype not in self.types or (self.layers is not None and layer not in self.layers):
+            raise ValueError(f'{dxftype} entities of the layer {layer} were not harvested.')
+        return self._entities.get((layer, dxftype), [])
+
+    def get_segments(self, layer: str) -> SegmentStore:
+        """This function returns a new store of the segments of the LWPOLYLINEs and of the LINEs of the layer.
+
+        The store holds the same segments as centre_lines.get_lines returns for the layer (the
+        segments of the polylines first, then the lines) and is sorted on their coordinates.
+
+        Raises:
+            ValueError: When the LINEs and the LWPOLYLINEs of the layer were not harvested.
+        """
+        self.get_entities('LINE', layer)
+        self.get_entities('LWPOLYLINE', layer)
+        polyline_segments, line_segments = self._polyline_segments.get(layer, []), self._line_segments.get(layer, [])
+        segments = SegmentStore(len(polyline_segments) + len(line_segments))
+        for start, end, polyline_id, flags in polyline_segments + line_segments:
+            segments.add(start, end, polyline_id, layer, flags)
+        segments.sort()
+        return segments
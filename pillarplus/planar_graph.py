@@ -0,0 +1,299 @@
+"""Compact graph of wall lines with integer node ids.
+
+The wall graph used to be a networkx graph keyed on the end points (float tuples) of the
+lines. Every degree query, edges(node) call and subgraph copy of it hashes tuples and
+allocates a dict per node and per edge. A PlanarGraph keeps the same graph in a few flat
+containers and refers to every node by its integer id (its position in nodes):
+
+    nodes        List[tuple]       the original node keys (end points), indexed by id
+    coordinates  float64 (N, D)    coordinates of every node
+    adjacency    List[List[int]]   neighbours of every node, in the order they were connected
+
+The degree of a node is the length of its adjacency list, so it is an O(1) lookup. The
+graph is converted from and to networkx at the boundaries (from_networkx, to_networkx),
+keeping the order of the nodes and of every adjacency, so the algorithms which depend on
+the iteration order of the networkx graph get exactly the same graph back.
+
+The wall cleaning of clean_wall_lines runs on a PlanarGraph: the degree index, the nearest
+node queries, the breaking and the merging of edges and the cleaning cycles all work on the
+node ids, and the networkx graph is only built from and written back to at the start and
+the end of the cleaning. The groups of components which are cleaned in the process pool are
+sent as PlanarGraph subgraphs. The room and wall extension code of test_shapely still works
+on the networkx graph.
+"""
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import networkx as nx
+import numpy as np
+
+INITIAL_CAPACITY: int = 64
+
+
+class PlanarGraph:
+    """This class is an undirected graph (without parallel edges) of points with integer node ids.
+
+    Attributes:
+        nodes (List[tuple]): The node keys (points), indexed by the node ids.
+        adjacency (List[List[int]]): The ids of the neighbours of every node (a self-loop is listed once).
+    """
+
+    def __init__(self, dimensions: int = 2, capacity: int = INITIAL_CAPACITY):
+        self.nodes: List[tuple] = []
+        self.adjacency: List[List[int]] = []
+        self._node_ids: Dict[tuple, int] = {}
+        self._coordinates = np.empty((max(int(capacity), 1), dimensions), dtype=np.float64)
+        self._edge_count = 0
+        # Nodes with a self-loop (it counts twice in the degree of the node, like in networkx):
+        self._self_loops = set()
+
+    @classmethod
+    def from_lines(cls, lines: Iterable) -> 'PlanarGraph':
+        """This function creates a graph from lines [(x1, y1), (x2, y2)] just like nx.Graph().add_edges_from(lines)."""
+        lines = [(tuple(start), tuple(end)) for start, end in lines]
+        dimensions = len(lines[0][0]) if lines else 2
+        graph = cls(dimensions, 2 * len(lines))
+        for start, end in lines:
+            graph.add_edge(graph.add_node(start), graph.add_node(end))
+        return graph
+
+    @classmethod
+    def from_adjacency(cls, nodes: List[tuple], adjacency: List[List[int]]) -> 'PlanarGraph':
+        """This function creates a graph from its nodes and the ids of the neighbours of every node (in their order).
+
+        A self-loop is listed once in the adjacency list of its node, like in networkx.
+        """
+        dimensions = len(nodes[0]) if nodes else 2
+        graph = cls(dimensions, len(nodes))
+        for node in nodes:
+            graph.add_node(node)
+        graph.adjacency = adjacency
+        graph._self_loops = {node_id for node_id, neighbours in enumerate(adjacency) if node_id in neighbours}
+        graph._edge_count = (sum(map(len, adjacency)) + len(graph._self_loops)) // 2
+        return graph
+
+    @classmethod
+    def from_networkx(cls, graph: nx.Graph) -> 'PlanarGraph':
+        """This function creates a graph from a networkx graph whose nodes are points.
+
+        The nodes get their ids in the node order of the networkx graph and every adjacency list
+        keeps the order of graph[node].
+        """
+        nodes = list(graph)
+        dimensions = len(nodes[0]) if nodes else 2
+        planar_graph = cls(dimensions, len(nodes))
+        for node in nodes:
+            planar_graph.add_node(node)
+        node_ids = planar_graph._node_ids
+        planar_graph.adjacency = [[node_ids[neighbour] for neighbour in graph[node]] for node in nodes]
+        planar_graph._edge_count = graph.number_of_edges()
+        planar_graph._self_loops = {node_ids[node] for node, _ in nx.selfloop_edges(graph)}
+        return planar_graph
+
+    def to_networkx(self, **attributes) -> nx.Graph:
+        """This function returns the graph as a networkx graph (with the graph attributes given).
+
+        The nodes are added in the order of their ids and the edges in an order which gives every
+        node its neighbours in the order of its adjacency list (see get_edge_insertion_order).
+        """
+        graph = nx.Graph(**attributes)
+        graph.add_nodes_from(self.nodes)
+        nodes = self.nodes
+        graph.add_edges_from((nodes[u], nodes[v]) for u, v in self.get_edge_insertion_order())
+        return graph
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __contains__(self, point) -> bool:
+        return tuple(point) in self._node_ids
+
+    @property
+    def coordinates(self) -> np.ndarray:
+        """Array of shape (N, D) with the coordinates of every node."""
+        return self._coordinates[:len(self.nodes)]
+
+    def number_of_edges(self) -> int:
+        return self._edge_count
+
+    def _grow(self):
+        grown = np.empty((2 * len(self._coordinates),) + self._coordinates.shape[1:], dtype=np.float64)
+        grown[:len(self.nodes)] = self.coordinates
+        self._coordinates = grown
+
+    def add_node(self, point) -> int:
+        """This function returns the id of the point, adding it as a new node if it is not in the graph yet."""
+        point = tuple(point)
+        node_id = self._node_ids.get(point)
+        if node_id is not None:
+            return node_id
+        node_id = len(self.nodes)
+        if node_id == len(self._coordinates):
+            self._grow()
+        self._coordinates[node_id] = point
+        self._node_ids[point] = node_id
+        self.nodes.append(point)
+        self.adjacency.append([])
+        return node_id
+
+    def get_node_id(self, point) -> int:
+        return self._node_ids[tuple(point)]
+
+    def add_edge(self, u: int, v: int):
+        """This function connects the nodes u and v (nothing happens if they are connected already)."""
+        if v in self.adjacency[u]:
+            return
+        self.adjacency[u].append(v)
+        if u != v:
+            self.adjacency[v].append(u)
+        else:
+            self._self_loops.add(u)
+        self._edge_count += 1
+
+    def add_edges_from(self, edges: Iterable[Tuple[int, int]]):
+        """This function connects the nodes of every edge, like nx.Graph.add_edges_from (existing edges keep their place)."""
+        for u, v in edges:
+            self.add_edge(u, v)
+
+    def remove_edge(self, u: int, v: int):
+        """This function disconnects the nodes u and v.
+
+        Raises:
+            ValueError: When u and v are not connected.
+        """
+        self.adjacency[u].remove(v)
+        if u != v:
+            self.adjacency[v].remove(u)
+        else:
+            self._self_loops.discard(u)
+        self._edge_count -= 1
+
+    def remove_edges_from(self, edges: Iterable[Tuple[int, int]]):
+        """This function disconnects the nodes of every edge, like nx.Graph.remove_edges_from (missing edges are skipped)."""
+        for u, v in edges:
+            if self.has_edge(u, v):
+                self.remove_edge(u, v)
+
+    def has_edge(self, u: int, v: int) -> bool:
+        return v in self.adjacency[u]
+
+    def degree(self, node_id: int) -> int:
+        """This function returns the degree of the node (a self-loop counts twice, like in networkx)."""
+        return len(self.adjacency[node_id]) + (node_id in self._self_loops)
+
+    def get_nodes_with_degree(self, degree: int) -> List[int]:
+        """This function returns the ids of the nodes with the degree (in the order of the ids)."""
+        return [node_id for node_id in range(len(self.nodes)) if self.degree(node_id) == degree]
+
+    def edges(self) -> Iterator[Tuple[int, int]]:
+        """This generator yields every edge (u, v) once, in the same order as nx.Graph.edges."""
+        seen = set()
+        for u, neighbours in enumerate(self.adjacency):
+            for v in neighbours:
+                if v not in seen:
+                    yield u, v
+            seen.add(u)
+
+    def get_lines(self) -> List[Tuple[tuple, tuple]]:
+        """This function returns the edges as lines (start, end) of the node keys, just like nx.Graph.edges."""
+        nodes = self.nodes
+        return [(nodes[u], nodes[v]) for u, v in self.edges()]
+
+    def get_edge_insertion_order(self) -> List[Tuple[int, int]]:
+        """This function returns the edges in an order in which connecting them gives every node its
+        neighbours in the order of its adjacency list.
+
+        An edge can be connected once it is the first remaining edge of both its nodes. When the
+        adjacency lists come from connecting edges one after the other, such an order always exists.
+        Otherwise (edges were removed in between) the remaining edges are taken in the order of edges().
+        """
+        positions = [0] * len(self.nodes)
+        adjacency = self.adjacency
+
+        def is_ready(u: int, v: int) -> bool:
+            return (positions[u] < len(adjacency[u]) and adjacency[u][positions[u]] == v
+                    and positions[v] < len(adjacency[v]) and adjacency[v][positions[v]] == u)
+
+        ordered_edges = []
+        ready_edges = deque(edge for edge in self.edges() if is_ready(*edge))
+        while ready_edges:
+            u, v = ready_edges.popleft()
+            ordered_edges.append((u, v))
+            for node_id in ((u, v) if u != v else (u,)):
+                positions[node_id] += 1
+            for node_id in ((u, v) if u != v else (u,)):
+                if positions[node_id] < len(adjacency[node_id]):
+                    neighbour = adjacency[node_id][positions[node_id]]
+                    if is_ready(node_id, neighbour):
+                        ready_edges.append((node_id, neighbour))
+
+        if len(ordered_edges) < self._edge_count:
+            connected = {frozenset(edge) for edge in ordered_edges}
+            ordered_edges.extend(edge for edge in self.edges() if frozenset(edge) not in connected)
+        return ordered_edges
+
+    def get_component_labels(self) -> np.ndarray:
+        """This function returns the connected component of every node.
+
+        The components are numbered in the order of their first node, which is the order in
+        which nx.connected_components yields them.
+        """
+        labels = np.full(len(self.nodes), -1, dtype=np.int64)
+        adjacency = self.adjacency
+        label = 0
+        for start in range(len(self.nodes)):
+            if labels[start] != -1:
+                continue
+            labels[start] = label
+            stack = [start]
+            while stack:
+                for neighbour in adjacency[stack.pop()]:
+                    if labels[neighbour] == -1:
+                        labels[neighbour] = label
+                        stack.append(neighbour)
+            label += 1
+        return labels
+
+    def connected_components(self) -> Iterator[set]:
+        """This generator yields the sets of the node keys of the connected components, just like nx.connected_components.
+
+        The sets are built by the same breadth first search, so their keys are added in the same order and
+        every set iterates in the same order as the set of networkx (see get_component_node_order of
+        clean_wall_lines, which depends on it).
+        """
+        nodes, adjacency = self.nodes, self.adjacency
+        seen = set()
+        for start in range(len(nodes)):
+            if nodes[start] in seen:
+                continue
+            component = {nodes[start]}
+            next_level = [start]
+            while next_level:
+                this_level, next_level = next_level, []
+                for node_id in this_level:
+                    for neighbour in adjacency[node_id]:
+                        if nodes[neighbour] not in component:
+                            component.add(nodes[neighbour])
+                            next_level.append(neighbour)
+            seen.update(component)
+            yield component
+
+    def copy(self) -> 'PlanarGraph':
+        """This function returns a copy of the graph with the same node ids."""
+        return self.subgraph(range(len(self.nodes)))
+
+    def subgraph(self, node_ids: Iterable[int]) -> 'PlanarGraph':
+        """This function returns a new graph of the given nodes and the edges between them.
+
+        The new id of a node is its position in node_ids and every adjacency list keeps its order.
+        """
+        node_ids = list(node_ids)
+        subgraph = PlanarGraph(self._coordinates.shape[1], len(node_ids))
+        for node_id in node_ids:
+            subgraph.add_node(self.nodes[node_id])
+        new_ids = {node_id: new_id for new_id, node_id in enumerate(node_ids)}
+        subgraph.adjacency = [[new_ids[neighbour] for neighbour in self.adjacency[node_id] if neighbour in new_ids]
+                              for node_id in node_ids]
+        subgraph._edge_count = sum(1 for _ in subgraph.edges())
+        subgraph._self_loops = {new_ids[node_id] for node_id in self._self_loops if node_id in new_ids}
+        return subgraph
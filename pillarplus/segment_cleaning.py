@@ -0,0 +1,279 @@
+"""Cleaning passes over line segments [(x1, y1), (x2, y2)] before they are turned into a graph.
+
+Drafters often leave the end points of two walls which should meet a few units apart. When
+the wall graph is built straight from the end points, every such pair becomes two nodes and
+the nearest-node and degree-fixing loops of clean_wall_lines have to reconcile them later.
+snap_end_points merges those points beforehand:
+
+    1. Every end point is hashed into a uniform grid whose cells are as large as the tolerance,
+       so the points within the tolerance of a point are in its own or a neighbouring cell.
+    2. The points within the tolerance of each other are joined in a union-find. Joining is
+       transitive, so a chain of close points is snapped to a single point.
+    3. Every group of points is snapped to the point of the group which came first.
+
+Drafters also draw a wall twice or as overlapping pieces. Every such piece becomes an edge of
+its own in the wall graph and a line of its own for the centre line pairing.
+merge_collinear_segments merges them in O(n log n):
+
+    1. The segments are grouped on their direction: the sorted angles are cut into windows
+       which are at most the angle tolerance wide.
+    2. The segments of a direction are grouped on their carrier line: the sorted normal offsets
+       are cut into windows which are at most the offset tolerance wide.
+    3. The segments of a carrier line are sorted along the direction and their overlapping or
+       touching intervals are merged. A merged segment runs between the outermost end points
+       of its pieces, so no new points are created.
+"""
+import math
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from pillarplus.segment_store import CLOSING_FLAG, NO_POLYLINE, POLYLINE_FLAG, SegmentStore
+
+# Default snapping tolerance in mm (multiply it by the conversion factor of the drawing).
+SNAP_TOLERANCE: float = 1.5
+# Default tolerances of the collinear segments (the offset in mm, multiply it by the conversion factor):
+COLLINEAR_TOLERANCE: float = 1.0
+COLLINEAR_ANGLE_TOLERANCE: float = 0.5  # degrees
+
+
+def get_snap_tolerance(conversion_factor: float = 1.0, tolerance: float = SNAP_TOLERANCE) -> float:
+    """This function returns the snapping tolerance (given in mm) in the units of the drawing."""
+    return tolerance * conversion_factor
+
+
+class UnionFind:
+    """This class keeps disjoint sets of the integers 0 ... size - 1.
+
+    The root of a set is always its smallest member.
+    """
+
+    def __init__(self, size: int):
+        self.parents = list(range(size))
+
+    def find(self, item: int) -> int:
+        parents = self.parents
+        while parents[item] != item:
+            parents[item] = parents[parents[item]]
+            item = parents[item]
+        return item
+
+    def union(self, item1: int, item2: int) -> int:
+        root1, root2 = self.find(item1), self.find(item2)
+        if root1 > root2:
+            root1, root2 = root2, root1
+        self.parents[root2] = root1
+        return root1
+
+
+def get_grid_cell(point: tuple, cell_size: float) -> Tuple[int, int]:
+    """This function returns the cell of the uniform grid the point falls in."""
+    return math.floor(point[0] / cell_size), math.floor(point[1] / cell_size)
+
+
+def get_snapped_points(points: List[tuple], tolerance: float) -> Dict[tuple, tuple]:
+    """This function finds the points which are to be snapped together.
+
+    Args:
+        points (List[tuple]): Distinct points (x, y).
+        tolerance (float): Points within this distance of each other are snapped together.
+
+    Returns:
+        Dict[tuple, tuple]: The point every moved point is snapped to (the first point of its group).
+    """
+    if tolerance <= 0:
+        return {}
+    groups = UnionFind(len(points))
+    grid: Dict[Tuple[int, int], List[int]] = {}
+    for index, point in enumerate(points):
+        cell_x, cell_y = get_grid_cell(point, tolerance)
+        for neighbour_cell in ((cell_x + dx, cell_y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)):
+            for other_index in grid.get(neighbour_cell, ()):
+                other_point = points[other_index]
+                if math.hypot(point[0] - other_point[0], point[1] - other_point[1]) <= tolerance:
+                    groups.union(index, other_index)
+        grid.setdefault((cell_x, cell_y), []).append(index)
+
+    snapped_points = {}
+    for index, point in enumerate(points):
+        root = groups.find(index)
+        if root != index:
+            snapped_points[point] = points[root]
+    return snapped_points
+
+
+def snap_end_points(lines: Iterable, tolerance: float) -> Tuple[List[List[tuple]], Dict[tuple, tuple]]:
+    """This function snaps the end points of the lines which are within the tolerance of each other.
+
+    Args:
+        lines (Iterable): Lines [(x1, y1), (x2, y2)].
+        tolerance (float): Maximum distance between the points which are snapped together
+            (see get_snap_tolerance).
+
+    Returns:
+        Tuple[List[List[tuple]], Dict[tuple, tuple]]: The snapped lines (without the lines which
+            collapsed into a point) and the remap table: the point every moved end point was
+            snapped to.
+    """
+    lines = [(tuple(start), tuple(end)) for start, end in lines]
+    points = list(dict.fromkeys(point for line in lines for point in line))
+    snapped_points = get_snapped_points(points, tolerance)
+
+    snapped_lines = []
+    for start, end in lines:
+        start, end = snapped_points.get(start, start), snapped_points.get(end, end)
+        if start != end:
+            snapped_lines.append([start, end])
+    return snapped_lines, snapped_points
+
+
+def get_windows(values: np.ndarray, width: float) -> np.ndarray:
+    """This function cuts the sorted values into windows which are at most width wide.
+
+    Every window starts at the first value which is not in the previous window, so a chain of
+    close values does not grow into a window which is wider than width.
+
+    Returns:
+        np.ndarray: The window of every value.
+    """
+    windows = np.empty(len(values), dtype=np.int64)
+    start, window = 0, 0
+    while start < len(values):
+        end = int(np.searchsorted(values, values[start] + width, side='right'))
+        windows[start:end] = window
+        start, window = end, window + 1
+    return windows
+
+
+def split_on_windows(ids: np.ndarray, windows: np.ndarray) -> List[np.ndarray]:
+    """This function splits the ids (sorted on their windows) into the ids of every window."""
+    return np.split(ids, np.flatnonzero(np.diff(windows)) + 1)
+
+
+def get_collinear_groups(coordinates: np.ndarray, offset_tolerance: float,
+                         angle_tolerance: float = COLLINEAR_ANGLE_TOLERANCE, merge_touching: bool = True) -> np.ndarray:
+    """This function finds the segments which overlap or touch on the same carrier line.
+
+    Args:
+        coordinates (np.ndarray): Array of shape (N, 4) with the coordinates x1, y1, x2, y2 of every segment.
+        offset_tolerance (float): Maximum normal distance between the segments of a carrier line.
+        angle_tolerance (float, optional): Maximum angle in degrees between the segments of a carrier line.
+            Defaults to COLLINEAR_ANGLE_TOLERANCE.
+        merge_touching (bool, optional): Whether the segments which only touch (end to end) are merged too,
+            not only the overlapping ones. Defaults to True.
+
+    Returns:
+        np.ndarray: The group of every segment, which is the smallest id of the segments it is merged with.
+            Segments without a length are never merged.
+    """
+    coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 4)
+    groups = np.arange(len(coordinates))
+    dx, dy = coordinates[:, 2] - coordinates[:, 0], coordinates[:, 3] - coordinates[:, 1]
+    lengths = np.hypot(dx, dy)
+    segment_ids = np.flatnonzero(lengths > 0)
+
+    # 1. Direction windows. The angles are in [-angle_tolerance / 2, 180 - angle_tolerance / 2), so the
+    #    almost horizontal segments on both the sides of 0 degrees end up in the same window.
+    angles = np.degrees(np.arctan2(dy[segment_ids], dx[segment_ids])) % 180.0
+    angles[angles >= 180.0 - angle_tolerance / 2] -= 180.0
+    order = np.argsort(angles, kind='stable')
+    segment_ids, angles = segment_ids[order], angles[order]
+
+    for direction_ids in split_on_windows(segment_ids, get_windows(angles, angle_tolerance)):
+        if len(direction_ids) < 2:
+            continue
+        # 2. Carrier line windows, on the normal offsets from the direction of the longest segment:
+        longest_id = direction_ids[np.argmax(lengths[direction_ids])]
+        ux, uy = dx[longest_id] / lengths[longest_id], dy[longest_id] / lengths[longest_id]
+        x1, y1, x2, y2 = coordinates[direction_ids].T
+        offsets = (y1 + y2) / 2 * ux - (x1 + x2) / 2 * uy
+        order = np.argsort(offsets, kind='stable')
+        direction_ids, offsets = direction_ids[order], offsets[order]
+
+        for carrier_ids in split_on_windows(direction_ids, get_windows(offsets, offset_tolerance)):
+            if len(carrier_ids) < 2:
+                continue
+            # 3. Merge the overlapping (or touching) intervals along the direction:
+            x1, y1, x2, y2 = coordinates[carrier_ids].T
+            starts, ends = x1 * ux + y1 * uy, x2 * ux + y2 * uy
+            interval_starts, interval_ends = np.minimum(starts, ends), np.maximum(starts, ends)
+            order = np.lexsort((carrier_ids, interval_starts))
+            carrier_ids, interval_starts = carrier_ids[order], interval_starts[order]
+            reaches = np.maximum.accumulate(interval_ends[order])
+            is_new_interval = (interval_starts[1:] > reaches[:-1]) if merge_touching else (interval_starts[1:] >= reaches[:-1])
+            for interval_ids in np.split(carrier_ids, np.flatnonzero(is_new_interval) + 1):
+                groups[interval_ids] = interval_ids.min()
+    return groups
+
+
+def get_merged_line(lines: List[list]) -> List[tuple]:
+    """This function returns the line between the outermost end points of the (collinear) lines.
+
+    The merged line has the orientation of the first line.
+    """
+    (x1, y1), (x2, y2) = (point[:2] for point in lines[0])
+    points = [point for line in lines for point in line]
+    projections = [(point[0] - x1) * (x2 - x1) + (point[1] - y1) * (y2 - y1) for point in points]
+    return [points[int(np.argmin(projections))], points[int(np.argmax(projections))]]
+
+
+def get_group_members(groups: np.ndarray) -> Dict[int, List[int]]:
+    """This function returns the ids of the segments of every group of more than one segment."""
+    group_members = {}
+    for segment_id in np.flatnonzero(groups != np.arange(len(groups))).tolist():
+        group = int(groups[segment_id])
+        group_members.setdefault(group, [group]).append(segment_id)
+    return group_members
+
+
+def merge_collinear_segments(lines: Iterable, tolerance: float, angle_tolerance: float = COLLINEAR_ANGLE_TOLERANCE,
+                             merge_touching: bool = True) -> Tuple[List[list], int]:
+    """This function merges the lines which overlap or touch on the same carrier line.
+
+    Args:
+        lines (Iterable): Lines [(x1, y1), (x2, y2)].
+        tolerance (float): Maximum normal distance between the lines of a carrier line (see get_snap_tolerance).
+        angle_tolerance (float, optional): Maximum angle in degrees between the lines of a carrier line.
+            Defaults to COLLINEAR_ANGLE_TOLERANCE.
+        merge_touching (bool, optional): Whether the lines which only touch (end to end) are merged too.
+            Defaults to True.
+
+    Returns:
+        Tuple[List[list], int]: The lines (a merged line takes the place of its first piece, the other lines
+            are kept as they are) and the number of the lines which were removed by merging.
+    """
+    lines = [[tuple(start), tuple(end)] for start, end in lines]
+    coordinates = np.array([start[:2] + end[:2] for start, end in lines], dtype=np.float64)
+    groups = get_collinear_groups(coordinates, tolerance, angle_tolerance, merge_touching)
+
+    merged_lines = list(lines)
+    for group, member_ids in get_group_members(groups).items():
+        merged_lines[group] = get_merged_line([lines[member_id] for member_id in member_ids])
+    merged_lines = [line for line_id, (line, group) in enumerate(zip(merged_lines, groups.tolist())) if group == line_id]
+    return merged_lines, len(lines) - len(merged_lines)
+
+
+def merge_collinear_segment_store(segments: SegmentStore, tolerance: float,
+                                  angle_tolerance: float = COLLINEAR_ANGLE_TOLERANCE,
+                                  merge_touching: bool = True) -> Tuple[SegmentStore, int]:
+    """This function merges the segments of a store which overlap or touch on the same carrier line.
+
+    A merged segment keeps the layer and the flags of its first piece, and its polyline id if all its
+    pieces come from the same polyline (otherwise it does not belong to any polyline).
+
+    Returns:
+        Tuple[SegmentStore, int]: A new store (in the order of the first pieces) and the number of the
+            segments which were removed by merging.
+    """
+    groups = get_collinear_groups(segments.coordinates, tolerance, angle_tolerance, merge_touching)
+    first_ids = np.flatnonzero(groups == np.arange(len(groups)))
+    merged_segments = segments.subset(first_ids)
+    new_ids = dict(zip(first_ids.tolist(), range(len(first_ids))))
+    for group, member_ids in get_group_members(groups).items():
+        new_id = new_ids[group]
+        start, end = get_merged_line(segments.get_lines(member_ids))
+        merged_segments.coordinates[new_id] = (start[0], start[1], end[0], end[1])
+        if len(set(segments.polyline_ids[member_ids].tolist())) > 1:
+            merged_segments.polyline_ids[new_id] = NO_POLYLINE
+            merged_segments.flags[new_id] = int(merged_segments.flags[new_id]) & ~(POLYLINE_FLAG | CLOSING_FLAG)
+    return merged_segments, len(groups) - len(first_ids)
@@ -0,0 +1,197 @@
+"""Array-backed store of line segments.
+
+The line pipelines (centre lines, beams) used to keep every line as a list of tuples
+[(x1, y1), (x2, y2)] and attached metadata to it through dicts keyed on str(line), so
+every lookup had to format four floats into a string. A SegmentStore keeps the same
+information in a few contiguous NumPy arrays and every segment is referred to by its
+integer id (its row in the arrays):
+
+    coordinates   float64 (N, 4)  x1, y1, x2, y2
+    polyline_ids  int64   (N,)    id of the source polyline or NO_POLYLINE
+    layer_ids     int32   (N,)    index into SegmentStore.layers
+    flags         uint8   (N,)    combination of the *_FLAG constants
+"""
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from pillarplus.math import is_line_decreasing_on_x_2d
+
+# Polyline id of the segments which were not a part of any polyline.
+NO_POLYLINE: int = -1
+
+# Flags of a segment:
+POLYLINE_FLAG: int = 1  # segment comes from a polyline
+CLOSING_FLAG: int = 2  # segment is the closing segment of a closed polyline
+REVERSED_FLAG: int = 4  # end points were swapped so that x1 <= x2
+
+INITIAL_CAPACITY: int = 64
+
+
+def get_oriented_segment(start: tuple, end: tuple) -> Tuple[tuple, tuple, int]:
+    """The segment with its end points swapped (and the REVERSED_FLAG set) if it is decreasing on x."""
+    if is_line_decreasing_on_x_2d([start, end]):
+        return end, start, REVERSED_FLAG
+    return start, end, 0
+
+
+def iter_polyline_segments(points: List[tuple], polyline_id: int, is_closed: bool) -> Iterator[Tuple[tuple, tuple, int, int]]:
+    """This function yields the segments (start, end, polyline_id, flags) of a polyline, as centre_lines.get_lines explodes it.
+
+    Args:
+        points (List[tuple]): Points (x, y) of the polyline.
+        polyline_id (int): Id of the polyline.
+        is_closed (bool): Whether the polyline is closed, so its last point connects to its first one.
+    """
+    for start, end in zip(points, points[1:]):
+        start, end, flags = get_oriented_segment(start, end)
+        yield start, end, polyline_id, flags
+    if points and is_closed:
+        # Connecting the first and last points also:
+        yield points[-1], points[0], polyline_id, CLOSING_FLAG
+
+
+class SegmentStore:
+    """This class stores line segments and their metadata in parallel arrays.
+
+    Attributes:
+        layers (List[str]): Names of the layers, indexed by the layer ids.
+    """
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        capacity = max(int(capacity), 1)
+        self._coordinates = np.empty((capacity, 4), dtype=np.float64)
+        self._polyline_ids = np.empty(capacity, dtype=np.int64)
+        self._layer_ids = np.empty(capacity, dtype=np.int32)
+        self._flags = np.empty(capacity, dtype=np.uint8)
+        self._size = 0
+        self._layer_index = {}
+        self.layers: List[str] = []
+
+    @classmethod
+    def from_lines(cls, lines: Iterable, layer: str = '') -> 'SegmentStore':
+        """This function creates a store from lines [(x1, y1), (x2, y2)] which do not belong to any polyline."""
+        lines = list(lines)
+        segments = cls(len(lines))
+        for line in lines:
+            segments.add(line[0], line[1], layer=layer)
+        return segments
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self):
+        return iter(range(self._size))
+
+    @property
+    def coordinates(self) -> np.ndarray:
+        """Array of shape (N, 4) with the coordinates x1, y1, x2, y2 of every segment."""
+        return self._coordinates[:self._size]
+
+    @property
+    def polyline_ids(self) -> np.ndarray:
+        return self._polyline_ids[:self._size]
+
+    @property
+    def layer_ids(self) -> np.ndarray:
+        return self._layer_ids[:self._size]
+
+    @property
+    def flags(self) -> np.ndarray:
+        return self._flags[:self._size]
+
+    def _grow(self):
+        capacity = 2 * len(self._coordinates)
+        for name in ('_coordinates', '_polyline_ids', '_layer_ids', '_flags'):
+            array = getattr(self, name)
+            grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            setattr(self, name, grown)
+
+    def get_layer_id(self, layer: str) -> int:
+        """This function returns the id of the layer, registering the layer if it is new."""
+        if layer not in self._layer_index:
+            self._layer_index[layer] = len(self.layers)
+            self.layers.append(layer)
+        return self._layer_index[layer]
+
+    def add(self, start, end, polyline_id: int = NO_POLYLINE, layer: str = '', flags: int = 0) -> int:
+        """This function adds a segment to the store.
+
+        Args:
+            start (tuple): Start point of the segment.
+            end (tuple): End point of the segment.
+            polyline_id (int, optional): Id of the polyline the segment comes from. Defaults to NO_POLYLINE.
+            layer (str, optional): Name of the layer of the segment. Defaults to ''.
+            flags (int, optional): Combination of the *_FLAG constants. Defaults to 0.
+
+        Returns:
+            int: Id of the new segment.
+        """
+        if self._size == len(self._coordinates):
+            self._grow()
+        segment_id = self._size
+        self._coordinates[segment_id] = (start[0], start[1], end[0], end[1])
+        self._polyline_ids[segment_id] = polyline_id
+        self._layer_ids[segment_id] = self.get_layer_id(layer)
+        if polyline_id != NO_POLYLINE:
+            flags |= POLYLINE_FLAG
+        self._flags[segment_id] = flags
+        self._size += 1
+        return segment_id
+
+    def get_line(self, segment_id: int) -> List[tuple]:
+        """This function returns the segment as a line [(x1, y1), (x2, y2)] for the pillarplus.math helpers."""
+        x1, y1, x2, y2 = self._coordinates[segment_id].tolist()
+        return [(x1, y1), (x2, y2)]
+
+    def get_lines(self, segment_ids: Optional[Iterable[int]] = None) -> List[List[tuple]]:
+        """This function returns the segments (all of them by default) as lines [(x1, y1), (x2, y2)]."""
+        coordinates = self.coordinates if segment_ids is None else self._coordinates[list(segment_ids)]
+        return [[(x1, y1), (x2, y2)] for x1, y1, x2, y2 in coordinates.tolist()]
+
+    def subset(self, segment_ids: Iterable[int]) -> 'SegmentStore':
+        """This function returns a new store with only the given segments (the new id of a segment is its position in segment_ids)."""
+        segment_ids = np.asarray(list(segment_ids), dtype=np.int64)
+        segments = SegmentStore(len(segment_ids))
+        segments._coordinates[:len(segment_ids)] = self._coordinates[segment_ids]
+        segments._polyline_ids[:len(segment_ids)] = self._polyline_ids[segment_ids]
+        segments._layer_ids[:len(segment_ids)] = self._layer_ids[segment_ids]
+        segments._flags[:len(segment_ids)] = self._flags[segment_ids]
+        segments._size = len(segment_ids)
+        segments._layer_index = dict(self._layer_index)
+        segments.layers = list(self.layers)
+        return segments
+
+    def get_layer(self, segment_id: int) -> str:
+        return self.layers[self._layer_ids[segment_id]]
+
+    def has_flag(self, segment_id: int, flag: int) -> bool:
+        return bool(self._flags[segment_id] & flag)
+
+    def are_from_same_polyline(self, segment_id1: int, segment_id2: int) -> bool:
+        """This function returns whether both the segments come from one and the same polyline."""
+        polyline_id = self._polyline_ids[segment_id1]
+        return polyline_id != NO_POLYLINE and polyline_id == self._polyline_ids[segment_id2]
+
+    def orient_on_x(self):
+        """This function swaps the end points of the segments which are decreasing on x (x1 > x2)."""
+        coordinates = self.coordinates
+        decreasing = coordinates[:, 0] > coordinates[:, 2]
+        coordinates[decreasing] = coordinates[decreasing][:, [2, 3, 0, 1]]
+        self.flags[decreasing] ^= REVERSED_FLAG
+
+    def sort(self) -> np.ndarray:
+        """This function sorts the segments on (x1, y1, x2, y2) just like sorting lists of lines.
+
+        The sort is stable and the ids are reassigned in the sorted order.
+
+        Returns:
+            np.ndarray: The old id of every segment in the new order.
+        """
+        coordinates = self.coordinates
+        order = np.lexsort((coordinates[:, 3], coordinates[:, 2], coordinates[:, 1], coordinates[:, 0]))
+        for name in ('_coordinates', '_polyline_ids', '_layer_ids', '_flags'):
+            array = getattr(self, name)
+            array[:self._size] = array[:self._size][order]
+        return order
@@ -0,0 +1,470 @@
+"""Spatial indexes which can be built once and queried many times.
+
+The helpers get_nearest_points_from_a_point and get_nearest_lines_from_a_point in
+pillarplus.math copy and sort the whole input on every call. When they are called once
+per node (or per room, door or window) that makes the callers quadratic. The indexes in
+this module are built once, answer the same questions in logarithmic time and can be
+kept in sync while the underlying graph changes.
+
+    PointIndex: KD-tree of points with k-nearest, radius queries and insert/delete.
+    LineIndex: STRtree of lines with k-nearest (optionally skipping the closest lines),
+        within-distance queries and insert/delete.
+    PolygonIndex: STRtree of polygons with prepared point-in-polygon queries.
+"""
+import heapq
+from typing import Iterable, Iterator, List
+
+import shapely.geometry
+import shapely.prepared
+from shapely.strtree import STRtree
+
+# Number of points stored in a leaf of the KD-tree.
+LEAF_SIZE: int = 8
+# Minimum number of pending inserts/deletes before the KD-tree is rebuilt.
+MINIMUM_REBUILD_SIZE: int = 32
+
+
+def _distance(x1, y1, x2, y2) -> float:
+    """Same formula as pillarplus.math.find_distance, so the orders of both the APIs agree."""
+    return ((x1 - x2)**2 + (y1 - y2)**2)**0.5
+
+
+def _box_distance(box, x, y) -> float:
+    """Lower bound of the distance from (x, y) to any point inside the box."""
+    minimum_x, minimum_y, maximum_x, maximum_y = box
+    dx = minimum_x - x if x < minimum_x else (x - maximum_x if x > maximum_x else 0)
+    dy = minimum_y - y if y < minimum_y else (y - maximum_y if y > maximum_y else 0)
+    return (dx**2 + dy**2)**0.5
+
+
+class _KDNode:
+    """A node of the KD-tree. Leaves hold ids of points, inner nodes hold their two children."""
+    __slots__ = ('box', 'left', 'right', 'ids')
+
+    def __init__(self, box, left=None, right=None, ids=None):
+        self.box = box
+        self.left = left
+        self.right = right
+        self.ids = ids
+
+
+class PointIndex:
+    """This class is a KD-tree backed index of 2D points.
+
+    Points can be any tuple-like object (the nodes of the wall graph are (x, y) tuples) and
+    are returned as they were inserted. The same point may be inserted more than once.
+
+    The tree itself is static; inserted points are kept in a small pending list and deleted
+    points are marked, and the tree is rebuilt once either of them grows too large, so
+    inserts and deletes cost amortized O(log n).
+
+    Ties in distance are returned in the order in which the points were inserted, which is
+    the same order a stable sort of the inserted list would give.
+
+    Example:
+        point_index = PointIndex(graph.nodes)
+        nearest_nodes = point_index.nearest(node, k=2, exclude={node})
+    """
+
+    def __init__(self, points: Iterable[tuple] = ()):
+        self._points = {}       # id -> point
+        self._ids = {}          # point -> list of ids (in insertion order)
+        self._next_id = 0
+        self._root = None
+        self._tree_size = 0
+        self._pending = []      # ids inserted after the last rebuild
+        self._deleted = set()   # ids deleted from the tree after the last rebuild
+        for point in points:
+            self._add(point)
+        self._rebuild()
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def __contains__(self, point) -> bool:
+        return point in self._ids
+
+    def __iter__(self) -> Iterator[tuple]:
+        return iter(self._points[point_id] for point_id in sorted(self._points))
+
+    # Updates:
+    def _add(self, point) -> int:
+        point_id = self._next_id
+        self._next_id += 1
+        self._points[point_id] = point
+        self._ids.setdefault(point, []).append(point_id)
+        return point_id
+
+    def insert(self, point: tuple):
+        """This function inserts a point into the index."""
+        self._pending.append(self._add(point))
+        if len(self._pending) > max(MINIMUM_REBUILD_SIZE, self._tree_size // 4):
+            self._rebuild()
+
+    def delete(self, point: tuple):
+        """This function deletes a point (its earliest inserted copy) from the index.
+
+        Raises:
+            KeyError: If the point is not present in the index.
+        """
+        point_ids = self._ids[point]
+        point_id = point_ids.pop(0)
+        if len(point_ids) == 0:
+            del self._ids[point]
+        del self._points[point_id]
+        if point_id in self._pending:
+            self._pending.remove(point_id)
+        else:
+            self._deleted.add(point_id)
+            if len(self._deleted) > max(MINIMUM_REBUILD_SIZE, self._tree_size // 2):
+                self._rebuild()
+
+    def discard(self, point: tuple):
+        """This function deletes a point from the index if it is present."""
+        if point in self._ids:
+            self.delete(point)
+
+    # Building:
+    def _rebuild(self):
+        ids = sorted(self._points)
+        self._root = self._build(ids) if ids else None
+        self._tree_size = len(ids)
+        self._pending = []
+        self._deleted = set()
+
+    def _build(self, ids: List[int]) -> _KDNode:
+        xs = [self._points[point_id][0] for point_id in ids]
+        ys = [self._points[point_id][1] for point_id in ids]
+        box = (min(xs), min(ys), max(xs), max(ys))
+        if len(ids) <= LEAF_SIZE:
+            return _KDNode(box, ids=ids)
+        # Split on the wider side of the box at the median:
+        axis = 0 if (box[2] - box[0]) >= (box[3] - box[1]) else 1
+        ids = sorted(ids, key=lambda point_id: self._points[point_id][axis])
+        middle = len(ids) // 2
+        return _KDNode(box, left=self._build(ids[:middle]), right=self._build(ids[middle:]))
+
+    # Queries:
+    def iter_nearest(self, point: tuple, exclude: Iterable[tuple] = ()) -> Iterator[tuple]:
+        """This generator yields the points of the index in the order of their distance to point.
+
+        Points are found lazily (best-first search), so taking only the first few of them
+        costs O(log n) each.
+
+        Args:
+            point (tuple): Query point.
+            exclude (Iterable[tuple], optional): Points which should be skipped (one copy per occurence).
+
+        Yields:
+            tuple: Points sorted on their distance to the query point.
+        """
+        x, y = point[0], point[1]
+        excluded = {}
+        for excluded_point in exclude:
+            excluded[excluded_point] = excluded.get(excluded_point, 0) + 1
+
+        # Heap entries: (distance, 0, counter, node) for nodes and (distance, 1, id) for points.
+        # Nodes are expanded before points at the same distance, so ties come out in id order.
+        heap, counter = [], 0
+        if self._root is not None:
+            heap.append((_box_distance(self._root.box, x, y), 0, counter, self._root))
+        for point_id in self._pending:
+            candidate = self._points[point_id]
+            heap.append((_distance(candidate[0], candidate[1], x, y), 1, point_id))
+        heapq.heapify(heap)
+
+        while heap:
+            entry = heapq.heappop(heap)
+            if entry[1] == 1:
+                candidate = self._points[entry[2]]
+                if excluded.get(candidate, 0) > 0:
+                    excluded[candidate] -= 1
+                    continue
+                yield candidate
+                continue
+            node = entry[3]
+            if node.ids is not None:
+                for point_id in node.ids:
+                    if point_id in self._deleted:
+                        continue
+                    candidate = self._points[point_id]
+                    heapq.heappush(heap, (_distance(candidate[0], candidate[1], x, y), 1, point_id))
+            else:
+                for child in (node.left, node.right):
+                    counter += 1
+                    heapq.heappush(heap, (_box_distance(child.box, x, y), 0, counter, child))
+
+    def nearest(self, point: tuple, k: int = 1, exclude: Iterable[tuple] = ()) -> List[tuple]:
+        """This function returns the k nearest points sorted on their distance to point."""
+        nearest_points = []
+        if k <= 0:
+            return nearest_points
+        for candidate in self.iter_nearest(point, exclude):
+            nearest_points.append(candidate)
+            if len(nearest_points) == k:
+                break
+        return nearest_points
+
+    def within(self, point: tuple, radius: float) -> List[tuple]:
+        """This function returns all the points within radius of point, sorted on their distance."""
+        x, y = point[0], point[1]
+        points_within = []
+        for candidate in self.iter_nearest(point):
+            if _distance(candidate[0], candidate[1], x, y) > radius:
+                break
+            points_within.append(candidate)
+        return points_within
+
+
+def query_tree(tree: STRtree, geometry, geometry_ids: dict) -> List[int]:
+    """This function returns the ids of the geometries of the tree whose envelope intersects geometry.
+
+    shapely < 2.0 returns the geometries themselves from STRtree.query while shapely >= 2.0
+    returns their indices, so both are mapped to the positions of the geometries in the tree.
+
+    Args:
+        tree (STRtree): Tree built on a list of geometries.
+        geometry: Query geometry.
+        geometry_ids (dict): id(geometry) -> position of the geometry in the list of the tree.
+
+    Returns:
+        List[int]: Positions of the geometries in the list of the tree.
+    """
+    result = tree.query(geometry)
+    if len(result) > 0 and not hasattr(result[0], 'geom_type'):
+        return [int(position) for position in result]
+    return [geometry_ids[id(result_geometry)] for result_geometry in result]
+
+
+class LineIndex:
+    """This class is a STRtree backed index of lines.
+
+    Lines are given like everywhere else in the repository as [(x1, y1), (x2, y2)] (graph edges
+    and the keys of centre lines are tuples) and are returned as they were inserted. The shapely
+    geometries and the tree are built only once; inserted lines are kept in a small pending list
+    and deleted lines are marked until the tree is rebuilt.
+
+    Distances are shapely's Point.distance(LineString) and ties are returned in the order in
+    which the lines were inserted, just like the stable sort of get_nearest_lines_from_a_point.
+
+    Example:
+        edge_index = LineIndex(graph.edges)
+        nearest_edge = edge_index.nearest(room_coordinate)[0]
+    """
+
+    def __init__(self, lines: Iterable[tuple] = ()):
+        self._lines = {}        # id -> line
+        self._geometries = {}   # id -> LineString
+        self._ids = {}          # line -> list of ids (in insertion order)
+        self._next_id = 0
+        self._tree = None
+        self._tree_ids = []     # position in the tree -> id
+        self._geometry_ids = {}
+        self._pending = []
+        self._deleted = set()
+        self._initial_radius = None
+        for line in lines:
+            self._add(line)
+        self.rebuild()
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def __contains__(self, line) -> bool:
+        return line in self._ids
+
+    def __iter__(self) -> Iterator[tuple]:
+        return iter(self._lines[line_id] for line_id in sorted(self._lines))
+
+    # Updates:
+    def _add(self, line) -> int:
+        line_id = self._next_id
+        self._next_id += 1
+        self._lines[line_id] = line
+        self._geometries[line_id] = shapely.geometry.LineString([line[0], line[1]])
+        self._ids.setdefault(line, []).append(line_id)
+        return line_id
+
+    def insert(self, line: tuple):
+        """This function inserts a line into the index."""
+        self._pending.append(self._add(line))
+        if len(self._pending) > max(MINIMUM_REBUILD_SIZE, len(self._tree_ids) // 4):
+            self.rebuild()
+
+    def delete(self, line: tuple):
+        """This function deletes a line (its earliest inserted copy) from the index.
+
+        Raises:
+            KeyError: If the line is not present in the index.
+        """
+        line_ids = self._ids[line]
+        line_id = line_ids.pop(0)
+        if len(line_ids) == 0:
+            del self._ids[line]
+        del self._lines[line_id]
+        del self._geometries[line_id]
+        if line_id in self._pending:
+            self._pending.remove(line_id)
+        else:
+            self._deleted.add(line_id)
+            if len(self._deleted) > max(MINIMUM_REBUILD_SIZE, len(self._tree_ids) // 2):
+                self.rebuild()
+
+    def discard(self, line: tuple):
+        """This function deletes a line from the index if it is present."""
+        if line in self._ids:
+            self.delete(line)
+
+    def update(self, added_lines: Iterable[tuple] = (), removed_lines: Iterable[tuple] = ()):
+        """This function updates the index after the graph has changed.
+
+        Args:
+            added_lines (Iterable[tuple], optional): Lines (edges) which were added.
+            removed_lines (Iterable[tuple], optional): Lines (edges) which were removed.
+        """
+        for line in removed_lines:
+            self.discard(line)
+        for line in added_lines:
+            self.insert(line)
+
+    def rebuild(self, lines: Iterable[tuple] = None):
+        """This function rebuilds the tree, optionally from a new set of lines.
+
+        Args:
+            lines (Iterable[tuple], optional): New lines of the index (the graph edges after a change).
+                If not given, the tree is rebuilt from the current lines.
+        """
+        if lines is not None:
+            self._lines, self._geometries, self._ids = {}, {}, {}
+            for line in lines:
+                self._add(line)
+        self._tree_ids = sorted(self._lines)
+        geometries = [self._geometries[line_id] for line_id in self._tree_ids]
+        self._tree = STRtree(geometries) if geometries else None
+        self._geometry_ids = {id(geometry): position for position, geometry in enumerate(geometries)}
+        self._pending = []
+        self._deleted = set()
+        self._initial_radius = None
+
+    # Queries:
+    def _get_candidates(self, point_object, radius: float) -> List[int]:
+        """Ids of the lines whose envelope is within the square of half side radius around the point."""
+        candidates = list(self._pending)
+        if self._tree is not None:
+            query_box = shapely.geometry.box(
+                point_object.x - radius, point_object.y - radius, point_object.x + radius, point_object.y + radius)
+            for position in query_tree(self._tree, query_box, self._geometry_ids):
+                line_id = self._tree_ids[position]
+                if line_id not in self._deleted:
+                    candidates.append(line_id)
+        return candidates
+
+    def _get_initial_radius(self) -> float:
+        """Radius of the first query window: the size of the area that holds about one line on average."""
+        bounds = [self._geometries[line_id].bounds for line_id in self._lines]
+        width = max(bound[2] for bound in bounds) - min(bound[0] for bound in bounds)
+        height = max(bound[3] for bound in bounds) - min(bound[1] for bound in bounds)
+        radius = max(width, height) / len(bounds) ** 0.5
+        return radius if radius > 0 else 1.0
+
+    def iter_nearest(self, point: tuple, minimum_distance: float = None) -> Iterator[tuple]:
+        """This generator yields the lines of the index in the order of their distance to point.
+
+        The tree is queried with a square window around the point which is doubled until it
+        holds enough lines, so taking only the first few lines does not touch the rest.
+
+        Args:
+            point (tuple): The query point.
+            minimum_distance (float, optional): Lines within this distance of point are skipped. Defaults to None.
+
+        Yields:
+            tuple: Lines sorted on their distance to the point.
+        """
+        if len(self._lines) == 0:
+            return
+        point_object = shapely.geometry.Point(point[0], point[1])
+        if self._initial_radius is None:
+            self._initial_radius = self._get_initial_radius()
+        radius = self._initial_radius
+        if minimum_distance is not None:
+            # Every skipped line intersects the first window, so they are all left out in one go:
+            radius = max(radius, minimum_distance)
+        yielded = set()
+        while len(yielded) < len(self._lines):
+            distances = []
+            for line_id in self._get_candidates(point_object, radius):
+                if line_id in yielded:
+                    continue
+                distance = point_object.distance(self._geometries[line_id])
+                if minimum_distance is not None and distance <= minimum_distance:
+                    yielded.add(line_id)
+                # Every line within radius intersects the window, so these are complete:
+                elif distance <= radius:
+                    distances.append((distance, line_id))
+            distances.sort()
+            for distance, line_id in distances:
+                yielded.add(line_id)
+                yield self._lines[line_id]
+            radius *= 2
+
+    def nearest(self, point: tuple, k: int = 1, minimum_distance: float = None) -> List[tuple]:
+        """This function returns the k nearest lines sorted on their distance to point.
+
+        Lines within minimum_distance of point (when it is given) are skipped without sorting them.
+        """
+        nearest_lines = []
+        if k <= 0:
+            return nearest_lines
+        for line in self.iter_nearest(point, minimum_distance):
+            nearest_lines.append(line)
+            if len(nearest_lines) == k:
+                break
+        return nearest_lines
+
+    def within(self, point: tuple, distance: float) -> List[tuple]:
+        """This function returns all the lines within distance of point, sorted on their distance."""
+        point_object = shapely.geometry.Point(point[0], point[1])
+        distances = []
+        for line_id in self._get_candidates(point_object, distance):
+            line_distance = point_object.distance(self._geometries[line_id])
+            if line_distance <= distance:
+                distances.append((line_distance, line_id))
+        distances.sort()
+        return [self._lines[line_id] for _, line_id in distances]
+
+
+class PolygonIndex:
+    """This class is a STRtree backed index of polygons for point-in-polygon queries.
+
+    The tree only narrows a query down to the polygons whose envelope holds the point; those
+    are then tested with prepared geometries, which are built once per polygon. The index is
+    static, build a new one when the polygons change.
+
+    Example:
+        face_index = PolygonIndex(polygonize(graph.edges))
+        room_face = face_index.locate(room_coordinate)
+    """
+
+    def __init__(self, polygons: Iterable):
+        self.polygons = list(polygons)
+        self._prepared = [shapely.prepared.prep(polygon) for polygon in self.polygons]
+        self._tree = STRtree(self.polygons) if self.polygons else None
+        self._geometry_ids = {id(polygon): position for position, polygon in enumerate(self.polygons)}
+
+    def __len__(self) -> int:
+        return len(self.polygons)
+
+    def containing(self, point: tuple) -> list:
+        """This function returns the polygons which contain point, in the order in which they were given."""
+        if self._tree is None:
+            return []
+        point_object = shapely.geometry.Point(point[0], point[1])
+        positions = sorted(query_tree(self._tree, point_object, self._geometry_ids))
+        return [self.polygons[position] for position in positions if self._prepared[position].contains(point_object)]
+
+    def locate(self, point: tuple):
+        """This function returns the smallest polygon which contains point (the innermost face), or None."""
+        polygons = self.containing(point)
+        if not polygons:
+            return None
+        return min(polygons, key=lambda polygon: polygon.area)
@@ -0,0 +1,398 @@
+"""Groups of components of a wall graph which is cleaned group by group.
+
+clean_wall_graph_in_processes of clean_wall_lines cleans the connected components of the wall
+graph in groups: every group is cleaned on its own and the cleaned groups are stitched into the
+cleaned graph. A WallGroups keeps everything that is needed to update the cleaned graph after
+a few wall lines were added or removed, without looking at the groups the edit does not reach:
+
+    lines        the wall lines in their order, and the lines of every node and of every edge
+                 (the node and adjacency order of the graph follow from them)
+    indexes      a PointIndex of the nodes and a LineIndex of the edges, to find the nodes and
+                 the edges near an edit
+    groups       the group of every node and the result of every group, with a PointIndex of the
+                 nodes which looked for a node to connect to (and how far) while their group was
+                 cleaned, to find the groups a new node is near enough to change
+    cycles       the groups which are not clean and the groups which touch another group at every
+                 cycle, from which the cycle at which the whole graph is clean follows
+    graph        the cleaned graph and the edges of every group in it, so that a group which is
+                 cleaned again is spliced into it
+"""
+import bisect
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import networkx as nx
+
+from pillarplus.math import find_distance, find_mid_point, get_on_line_distance, is_between
+from pillarplus.planar_graph import PlanarGraph
+from pillarplus.spatial_index import LineIndex, PointIndex
+
+# The result of cleaning a group (see clean_wall_line_group of clean_wall_lines): whether the group has no node with
+# degree > 2 and its edges, before the first cycle and after every cycle; the node of another group which the group
+# would have reached in the next cycle, or None; and how far every node looked for a node to connect to.
+GroupResult = Tuple[List[Tuple[bool, list]], Optional[tuple], Dict[tuple, float]]
+
+
+class WallGroups:
+    """This class keeps the wall lines of a wall graph, its groups of components and its cleaned graph.
+
+    The graph before cleaning is not stored as a graph: the lines (sequence numbers) of every node and of every
+    edge give the node order (by the first line of a node) and the adjacency order (by the first line of an
+    edge) which nx.Graph().add_edges_from(wall_lines) has, so the graph of the edited wall lines is known as
+    soon as the lines are edited.
+
+    Attributes:
+        maximum_cycles (int): Number of cycles after which the cleaning terminates.
+        graph (nx.Graph): The cleaned graph.
+        group_ids (Dict[tuple, int]): The group of every node.
+        group_results (dict): group key -> (foreign nodes, result) of every group (see clean_wall_graph_in_processes).
+        clean_cycle (int): The cycle at which no node of any group has a degree > 2 (None before the first cleaning).
+
+    Example:
+        wall_groups = WallGroups(wall_lines, maximum_cycles, cleaned_graph)
+        touched_nodes, new_nodes, deleted_nodes, new_edges, is_node_order_changed = wall_groups.edit(added_wall_lines)
+    """
+
+    def __init__(self, wall_lines: Iterable, maximum_cycles: int, graph: nx.Graph):
+        self.maximum_cycles = maximum_cycles
+        self.graph = graph
+        # Lines: sequence number -> line, in the order of the wall lines.
+        self._lines: Dict[int, list] = {}
+        self._next_sequence = 0
+        # The sequence numbers of the lines of every node and of every edge (the set of its nodes):
+        self._node_lines: Dict[tuple, List[int]] = {}
+        self._edge_lines: Dict[frozenset, List[int]] = {}
+        # The line of every edge in the edge index:
+        self._edges: Dict[frozenset, tuple] = {}
+        # Only grows, so that the search radius of the nodes on an edge always covers the longest edge:
+        self._longest_edge = 0.0
+        for start, end in wall_lines:
+            self._add_line(tuple(start), tuple(end))
+        self.point_index = PointIndex(self._node_lines)
+        self.edge_index = LineIndex(self._edges.values())
+
+        self.group_ids: Dict[tuple, int] = {}
+        self.group_results = {}
+        self.clean_cycle = None
+        self._next_group = 0
+        self._group_nodes: Dict[int, List[tuple]] = {}
+        self._results: Dict[int, GroupResult] = {}
+        self._group_keys: Dict[int, tuple] = {}
+        self._group_sizes: List[Tuple[int, int]] = []
+        # Groups by the number of their states, to find the groups which change between two cycles:
+        self._state_counts: Dict[int, Set[int]] = {}
+        # The groups which touch every node:
+        self._touching_groups: Dict[tuple, Set[int]] = {}
+        # How far every node looked for a node to connect to:
+        self._reach: Dict[tuple, float] = {}
+        self._reach_index = PointIndex()
+        # Only grows, like the longest edge:
+        self._maximum_reach = 0.0
+        self._unclean_groups_of_cycles = [set() for _ in range(maximum_cycles + 1)]
+        self._touching_groups_of_cycles = [set() for _ in range(maximum_cycles + 1)]
+        # The edges of every group in the cleaned graph:
+        self._spliced_edges: Dict[int, list] = {}
+
+    def __len__(self) -> int:
+        return len(self._node_lines)
+
+    def __contains__(self, node) -> bool:
+        return node in self._node_lines
+
+    @property
+    def wall_lines(self) -> list:
+        """The wall lines, in their order."""
+        return list(self._lines.values())
+
+    # Lines:
+    def _add_line(self, start: tuple, end: tuple) -> Tuple[List[tuple], Optional[tuple]]:
+        """This function adds a line after the others and returns the nodes and the edge which are new to the graph."""
+        sequence = self._next_sequence
+        self._next_sequence += 1
+        self._lines[sequence] = [start, end]
+        new_nodes = []
+        for node in ((start, end) if start != end else (start,)):
+            if node not in self._node_lines:
+                self._node_lines[node] = []
+                new_nodes.append(node)
+            self._node_lines[node].append(sequence)
+        edge = frozenset((start, end))
+        new_edge = None
+        if edge not in self._edge_lines:
+            self._edge_lines[edge] = []
+            new_edge = self._edges[edge] = (start, end)
+            self._longest_edge = max(self._longest_edge, find_distance(start, end))
+        self._edge_lines[edge].append(sequence)
+        return new_nodes, new_edge
+
+    def edit(self, added_lines: Iterable = (), removed_lines: Iterable = ()
+             ) -> Tuple[Set[tuple], List[tuple], List[tuple], List[tuple], bool]:
+        """This function removes the removed_lines and adds the added_lines after the others.
+
+        A removed line is the first of the equal lines (in either direction), like in get_edited_wall_lines of
+        clean_wall_lines, so the graph is the graph of the edited wall lines. The node and edge indexes are
+        updated, the groups and the cleaned graph are not.
+
+        Raises:
+            ValueError: When a removed line (in either direction) is not one of the wall lines (nothing is edited).
+
+        Returns:
+            Tuple[Set[tuple], List[tuple], List[tuple], List[tuple], bool]: The end points of the edited lines,
+                the nodes which are new to the graph (in the node order), the nodes which were deleted from it,
+                the edges which are new to it, and whether a node which was kept moved in the node order (its
+                first line was removed).
+        """
+        removed_sequences, taken_counts = [], {}
+        for start, end in removed_lines:
+            edge = frozenset((tuple(start), tuple(end)))
+            edge_lines, taken_count = self._edge_lines.get(edge, ()), taken_counts.get(edge, 0)
+            if taken_count >= len(edge_lines):
+                raise ValueError(f'The removed line is not a wall line: {[start, end]}')
+            removed_sequences.append(edge_lines[taken_count])
+            taken_counts[edge] = taken_count + 1
+
+        touched_nodes, deleted_nodes, is_node_order_changed = set(), [], False
+        for sequence in removed_sequences:
+            start, end = self._lines.pop(sequence)
+            edge = frozenset((start, end))
+            self._edge_lines[edge].remove(sequence)
+            if not self._edge_lines[edge]:
+                del self._edge_lines[edge]
+                self.edge_index.delete(self._edges.pop(edge))
+            for node in ((start, end) if start != end else (start,)):
+                node_lines = self._node_lines[node]
+                is_first_line = node_lines[0] == sequence
+                node_lines.remove(sequence)
+                touched_nodes.add(node)
+                if not node_lines:
+                    del self._node_lines[node]
+                    self.point_index.delete(node)
+                    deleted_nodes.append(node)
+                elif is_first_line:
+                    is_node_order_changed = True
+
+        new_nodes, new_edges = [], []
+        for start, end in added_lines:
+            start, end = tuple(start), tuple(end)
+            line_nodes, new_edge = self._add_line(start, end)
+            touched_nodes.update((start, end))
+            for node in line_nodes:
+                self.point_index.insert(node)
+            new_nodes.extend(line_nodes)
+            if new_edge is not None:
+                self.edge_index.insert(new_edge)
+                new_edges.append(new_edge)
+        return touched_nodes, new_nodes, deleted_nodes, new_edges, is_node_order_changed
+
+    # Graph:
+    def get_node_order_key(self, node: tuple) -> Tuple[int, int]:
+        """This function returns the key of the node in the node order of the graph (its first line, then its end)."""
+        sequence = self._node_lines[node][0]
+        return sequence, 0 if self._lines[sequence][0] == node else 1
+
+    def get_nodes(self) -> List[tuple]:
+        """This function returns the nodes of the graph in their order."""
+        nodes = {}
+        for start, end in self._lines.values():
+            nodes.setdefault(start)
+            nodes.setdefault(end)
+        return list(nodes)
+
+    def get_neighbours(self, node: tuple) -> List[tuple]:
+        """This function returns the neighbours of the node in the order of their edges (a self-loop counts once)."""
+        neighbours = {}
+        for sequence in self._node_lines[node]:
+            start, end = self._lines[sequence]
+            neighbours.setdefault(end if start == node else start)
+        return list(neighbours)
+
+    def get_degree(self, node: tuple) -> int:
+        """This function returns the degree of the node (a self-loop counts twice, like in networkx)."""
+        neighbours = self.get_neighbours(node)
+        return len(neighbours) + (node in neighbours)
+
+    def get_subgraph(self, nodes: Iterable[tuple]) -> PlanarGraph:
+        """This function returns the graph of the nodes (which are a union of components) in the node order of the graph."""
+        nodes = sorted(nodes, key = self.get_node_order_key)
+        node_ids = {node: node_id for node_id, node in enumerate(nodes)}
+        return PlanarGraph.from_adjacency(
+            nodes, [[node_ids[neighbour] for neighbour in self.get_neighbours(node)] for node in nodes])
+
+    def get_components(self, nodes: Iterable[tuple]) -> List[List[tuple]]:
+        """This function returns the connected components of the nodes (which are a union of components),
+        in the order of their first node."""
+        components, seen = [], set()
+        for node in sorted(nodes, key = self.get_node_order_key):
+            if node in seen:
+                continue
+            seen.add(node)
+            component, stack = [node], [node]
+            while stack:
+                for neighbour in self.get_neighbours(stack.pop()):
+                    if neighbour not in seen:
+                        seen.add(neighbour)
+                        component.append(neighbour)
+                        stack.append(neighbour)
+            components.append(component)
+        return components
+
+    def get_edges_through(self, node: tuple) -> List[tuple]:
+        """This function returns the edges which the node is on (is_between), its own edges included."""
+        # is_between rounds to 5 decimals, so a node within this distance of an edge can be on it:
+        on_line_distance = get_on_line_distance(self._longest_edge)
+        return [edge for edge in self.edge_index.within(node, on_line_distance) if is_between(node, edge[0], edge[1])]
+
+    def get_nodes_on(self, edge: tuple) -> List[tuple]:
+        """This function returns the nodes which are on the edge (is_between), its own nodes included."""
+        radius = find_distance(edge[0], edge[1]) / 2 + get_on_line_distance(self._longest_edge)
+        return [node for node in self.point_index.within(find_mid_point(edge[0], edge[1]), radius)
+                if is_between(node, edge[0], edge[1])]
+
+    # Groups:
+    def get_new_group(self) -> int:
+        """This function returns a group id which was not used before."""
+        group = self._next_group
+        self._next_group += 1
+        return group
+
+    def get_group_nodes(self, group: int) -> List[tuple]:
+        return self._group_nodes[group]
+
+    def get_result(self, group: int) -> GroupResult:
+        return self._results[group]
+
+    def get_state(self, group: int, cycle: int) -> Optional[Tuple[bool, list]]:
+        """This function returns the state of the group at the cycle, or None when the group touches another group before it."""
+        states, touched_node, _ = self._results[group]
+        if touched_node is not None and cycle >= len(states):
+            return None
+        # the group does not change anymore after its last state:
+        return states[min(cycle, len(states) - 1)]
+
+    def add_group(self, group: int, nodes: List[tuple], result: GroupResult, group_key: tuple, foreign_nodes: dict):
+        """This function adds a cleaned group (it is spliced into the cleaned graph by set_clean_cycle).
+
+        Args:
+            group (int): Id of the group (see get_new_group).
+            nodes (List[tuple]): Nodes of the group.
+            result (GroupResult): Result of cleaning the group.
+            group_key (tuple): Everything the cleaning of the group depends on, apart from its foreign nodes.
+            foreign_nodes (dict): The nearest node of another group for every node of the group.
+        """
+        states, touched_node, reach = result
+        self._group_nodes[group] = nodes
+        for node in nodes:
+            self.group_ids[node] = group
+        self._results[group] = result
+        self._group_keys[group] = group_key
+        self.group_results[group_key] = (foreign_nodes, result)
+        bisect.insort(self._group_sizes, (len(nodes), group))
+        self._state_counts.setdefault(len(states), set()).add(group)
+        if touched_node is not None:
+            self._touching_groups.setdefault(touched_node, set()).add(group)
+        for node, distance in reach.items():
+            self._reach[node] = distance
+            self._reach_index.insert(node)
+            self._maximum_reach = max(self._maximum_reach, distance)
+        for cycle in range(self.maximum_cycles + 1):
+            state = self.get_state(group, cycle)
+            if state is None:
+                self._touching_groups_of_cycles[cycle].add(group)
+            elif not state[0]:
+                self._unclean_groups_of_cycles[cycle].add(group)
+
+    def remove_group(self, group: int) -> List[tuple]:
+        """This function removes a group (and its edges from the cleaned graph) and returns its nodes.
+
+        The nodes keep their group id until they are added to another group.
+        """
+        states, touched_node, reach = self._results.pop(group)
+        for cycle in range(self.maximum_cycles + 1):
+            self._touching_groups_of_cycles[cycle].discard(group)
+            self._unclean_groups_of_cycles[cycle].discard(group)
+        for node in reach:
+            del self._reach[node]
+            self._reach_index.delete(node)
+        if touched_node is not None:
+            self._touching_groups[touched_node].discard(group)
+            if not self._touching_groups[touched_node]:
+                del self._touching_groups[touched_node]
+        self._state_counts[len(states)].discard(group)
+        nodes = self._group_nodes.pop(group)
+        del self._group_sizes[bisect.bisect_left(self._group_sizes, (len(nodes), group))]
+        del self.group_results[self._group_keys.pop(group)]
+        spliced_edges = self._spliced_edges.pop(group, None)
+        if spliced_edges is not None:
+            self.graph.remove_edges_from(spliced_edges)
+        return nodes
+
+    def get_groups_touching(self, node: tuple) -> Set[int]:
+        """This function returns the groups which would have reached the node (as their nearest node of another group)."""
+        return set(self._touching_groups.get(node, ()))
+
+    def get_groups_reaching(self, node: tuple) -> Set[int]:
+        """This function returns the groups which a node new to the graph could change: those with a node which
+        looked for a node to connect to at least as far as the new node is from it."""
+        groups = set()
+        for reaching_node in self._reach_index.iter_nearest(node):
+            distance = find_distance(node, reaching_node)
+            if distance > self._maximum_reach:
+                break
+            if distance <= self._reach[reaching_node]:
+                groups.add(self.group_ids[reaching_node])
+        return groups
+
+    def get_large_groups(self, graph_size: int) -> List[int]:
+        """This function returns the groups which are at least half of a graph of graph_size nodes
+        (their cleaning depends on the size of the graph, see get_group_key of clean_wall_lines)."""
+        return [group for _, group in self._group_sizes[bisect.bisect_left(self._group_sizes, ((graph_size + 1) // 2, -1)):]]
+
+    def get_clean_cycle(self) -> Tuple[Optional[int], List[int]]:
+        """This function looks up the first cycle at which either a group touches another group or no node
+        of any group has a degree > 2.
+
+        Returns:
+            Tuple[Optional[int], List[int]]: The cycle at which the graph is clean (None if a group touches
+                another group before it or if there is no such cycle) and the groups which touch another group.
+        """
+        for cycle in range(self.maximum_cycles + 1):
+            if self._touching_groups_of_cycles[cycle]:
+                return None, sorted(self._touching_groups_of_cycles[cycle])
+            if not self._unclean_groups_of_cycles[cycle]:
+                return cycle, []
+        return None, []
+
+    # Cleaned graph:
+    def set_clean_cycle(self, clean_cycle: int):
+        """This function splices the groups which are not in the cleaned graph yet, and the groups whose state
+        changed with the clean cycle, into the cleaned graph at the clean cycle.
+
+        The groups do not share nodes, so removing the edges of a group and adding its new edges in their
+        insertion order gives every node of the group its neighbours in their order.
+        """
+        groups = set(self._results) - set(self._spliced_edges)
+        if self.clean_cycle is not None and clean_cycle != self.clean_cycle:
+            # Only a group with more states than the earlier of both the cycles changes in between:
+            first_cycle = min(self.clean_cycle, clean_cycle)
+            for state_count, state_count_groups in self._state_counts.items():
+                if state_count > first_cycle + 1:
+                    groups.update(state_count_groups)
+        self.clean_cycle = clean_cycle
+        for group in sorted(groups):
+            edges = self.get_state(group, clean_cycle)[1]
+            if self._spliced_edges.get(group) is edges:
+                continue
+            if group in self._spliced_edges:
+                self.graph.remove_edges_from(self._spliced_edges[group])
+            self.graph.add_edges_from(edges)
+            self._spliced_edges[group] = edges
+
+    def sort_graph_nodes(self):
+        """This function puts the nodes of the cleaned graph back in the node order of the graph (after a node moved
+        in it), rebuilding the cleaned graph from the edges of the groups (which are not cleaned again)."""
+        nodes = self.get_nodes()
+        if nodes == list(self.graph):
+            return
+        self.graph.remove_nodes_from(nodes)
+        self.graph.add_nodes_from(nodes)
+        for group in sorted(self._spliced_edges):
+            self.graph.add_edges_from(self._spliced_edges[group])
@@ -5,6 +5,9 @@ import ezdxf
 from clean_wall_lines import get_cleaned_wall_lines
 from test_components import draw_components
 from centre_lines import get_centre_lines
+from pillarplus.geometry_cache import GeometryCache
+from pillarplus.modelspace_harvest import ModelspaceHarvest
+from pillarplus.dxf_stream import read_layers
 
 # Wall line test-case:
 # TC1:
@@ -50,6 +53,13 @@ input_files = {
 }
 input_key = 'p20_ground_floor'
 input_file = input_files[input_key]
+# Write the debug dxf files of the cleaning and of the extension of the walls (DEBUG=1 in the environment).
+# A debug run does not reuse the cached cleaned walls:
+DEBUG = os.environ.get('DEBUG') == '1'
+# Extend the walls for all the openings at once (BATCH=0 in the environment extends and draws them one by one):
+BATCH = os.environ.get('BATCH', '1') == '1'
+# Reuse the cleaned walls, the centre lines and the rooms of an earlier run with the same inputs:
+geometry_cache = GeometryCache('dxfFilesOut/geometry_cache')
 
 base_output_file_path = f'dxfFilesOut/{input_key}/'
 output_file_path = f'dxfFilesOut/{input_key}/debug_dxf/'
@@ -83,6 +93,10 @@ except ezdxf.DXFStructureError:
 msp = dwg.modelspace()
 print(f'File read success from {file_path}.')
 
+# Walk the modelspace once for the room texts (the wall lines are streamed from the file):
+harvest = ModelspaceHarvest(msp, types=('MTEXT',))
+print(harvest)
+
 
 wall_layers = {'main': 'WALL', 'sample': 'WALLS',
                'sample2': 'WALLS', 'sample3': 'WALLS',
@@ -102,16 +116,12 @@ wall_layers = {'main': 'WALL', 'sample': 'WALLS',
 
 def get_wall_lines():
     wall_layer = wall_layers[input_key]
-    dxf_wall_lines = msp.query(f'LINE[layer=="{wall_layer}"]')
+    # Only the LINEs of the wall layer are read from the tags of the file:
+    wall_geometry = read_layers(file_path + input_file, [wall_layer], types=('LINE',))[wall_layer]
+    print(wall_geometry)
     wall_lines = []
     # cleaning lines
-    for line in dxf_wall_lines:
-        try:
-            x1, y1, z1 = line.dxf.start
-            x2, y2, z2 = line.dxf.end
-        except Exception as e:
-            print(f'Exception occured while reading line: {e}')
-            continue
+    for x1, y1, x2, y2 in wall_geometry.lines.tolist():
         # lambda num: round(num, ndigits=4)
         x1, y1, x2, y2 = map(int, (x1, y1, x2, y2))
 
@@ -126,7 +136,7 @@ print('wall_lines: ', len(wall_lines))
 
 # Operations:
 cleaned_wall_lines, graph = get_cleaned_wall_lines(
-    wall_lines, filepath=output_file_path)
+    wall_lines, filepath=output_file_path, debug=DEBUG, cache=geometry_cache)
 pprint(cleaned_wall_lines)
 print('edges: ', list(graph.edges))
 print(len(graph.edges))
@@ -138,11 +148,11 @@ conversion_factor = {
 }
 centre_lines = get_centre_lines(
     msp, dwg, "", conversion_factor=conversion_factor['inch'],
-    lines = cleaned_wall_lines)
+    lines = cleaned_wall_lines, cache=geometry_cache)
 # pprint([centre_line.__dict__ for centre_line in centre_lines])
 
 #### POC OPERATIONS:
-from test_shapely import extend_wall_lines_for_entity, get_area_from_the_room_texts, fill_str_tree, plot_room_areas
+from test_shapely import extend_wall_lines_for_entity, extend_wall_lines_for_entities, get_area_from_the_room_texts, fill_str_tree, plot_room_areas
 import json
 
 try:
@@ -162,6 +172,15 @@ def test_shapely():
 
     fill_str_tree(centre_lines=centre_lines)
 
+    if BATCH:
+        # Extend the walls for all the windows and doors at once (without the drawings of every entity):
+        entities = [window for window_counter, window in enumerate(windows) if not (input_key == 'sample3' and window_counter in [6])] + doors
+        failed_entities = extend_wall_lines_for_entities(entities, centre_lines=centre_lines, graph=graph, input_key=input_key, counter=0, debug=DEBUG)
+        if failed_entities:
+            raise failed_entities[0][1]
+        print('Success in EXTENDING.')
+        return
+
     global counter
     for counter, current_entity in enumerate(windows):
         # DEBUG
@@ -170,7 +189,7 @@ def test_shapely():
         if input_key == 'sample3' and counter in [6]:
             continue
         
-        extend_wall_lines_for_entity(entity=current_entity, centre_lines=centre_lines, graph=graph, input_key=input_key, counter=counter)
+        extend_wall_lines_for_entity(entity=current_entity, centre_lines=centre_lines, graph=graph, input_key=input_key, counter=counter, debug=DEBUG)
 
         print('Now plotting on msp', counter)
         dwg = ezdxf.new()
@@ -192,7 +211,7 @@ def test_shapely():
         print('COUNTER', counter)
         
         try:
-            extend_wall_lines_for_entity(entity=current_entity, centre_lines=centre_lines, graph=graph, input_key=input_key, counter=counter)
+            extend_wall_lines_for_entity(entity=current_entity, centre_lines=centre_lines, graph=graph, input_key=input_key, counter=counter, debug=DEBUG)
         except Exception as e:
             raise e;
             # continue
@@ -228,6 +247,8 @@ rooms_information = get_area_from_the_room_texts(
     msp=msp,
     graph=graph,
     ROOM_TEXT_LAYER=ROOMS_TEXT_LAYERS[input_key],
+    harvest=harvest,
+    cache=geometry_cache,
 )
 
 windows = list(filter(lambda entity: entity['type']=='window' and entity['category'] == 'p', identification_json['entities']))